@@ -0,0 +1,125 @@
+"""
+On-disk directories of NumPy arrays shared by the local indexes.
+
+Each save writes a new version subdirectory (`.npy` files next to a
+`meta.json`) and then points the `CURRENT` file at it with one
+`os.replace`, so a reader sees either the old or the new set and never a
+missing or half-written one. The version before the current one is kept
+until the next save, for readers that were opening it during the swap.
+Readers open the arrays with `mmap_mode="r"`, so every worker process maps
+the same page-cache copy instead of holding its own. A running process
+keeps the version it opened; see `Resources.reload_indexes`.
+"""
+
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+POINTER_FILE = "CURRENT"
+VERSION_PREFIX = "v"
+
+
+def current_version(directory: str) -> Optional[str]:
+    """Returns the version subdirectory `CURRENT` points at, or None for an unversioned (or missing) directory."""
+    try:
+        with open(os.path.join(directory, POINTER_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _data_dir(directory: str) -> str:
+    version = current_version(directory)
+    # Directories written before versioning hold the arrays at the top level.
+    return os.path.join(directory, version) if version else directory
+
+
+def save_arrays(directory: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+    """
+    Writes `arrays` and `meta` as a new version of `directory` and makes it current.
+
+    The previous version is kept for readers that were opening it; older ones
+    (and arrays of the unversioned layout) are removed.
+    """
+    directory = directory.rstrip(os.sep)
+    os.makedirs(directory, exist_ok=True)
+    previous = current_version(directory)
+    version = f"{VERSION_PREFIX}{time.time_ns()}"
+    version_dir = os.path.join(directory, version)
+    os.makedirs(version_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(version_dir, name + ".npy"), np.ascontiguousarray(array))
+    with open(os.path.join(version_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    pointer_tmp = os.path.join(directory, POINTER_FILE + ".tmp")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(directory, POINTER_FILE))
+
+    for entry in os.listdir(directory):
+        path = os.path.join(directory, entry)
+        if entry in (version, previous, POINTER_FILE):
+            continue
+        if os.path.isdir(path) and entry.startswith(VERSION_PREFIX):
+            shutil.rmtree(path, ignore_errors=True)
+        elif entry.endswith(".npy") or entry == "meta.json":
+            os.remove(path)
+
+
+def load_arrays(directory: str, names: Iterable[str], mmap: bool = True) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Opens arrays written by `save_arrays`.
+
+    Args:
+        directory (str): The array directory.
+        names (Iterable[str]): Arrays to open.
+        mmap (bool): Memory-map the arrays instead of reading them into memory.
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Dict[str, Any]]: The arrays and the metadata.
+    """
+    data_dir = _data_dir(directory)
+    meta = load_meta(directory)
+    mmap_mode = "r" if mmap else None
+    arrays = {name: np.load(os.path.join(data_dir, name + ".npy"), mmap_mode=mmap_mode) for name in names}
+    return arrays, meta
+
+
+def load_meta(directory: str) -> Dict[str, Any]:
+    """Returns the metadata of the current version without opening any array."""
+    with open(os.path.join(_data_dir(directory), "meta.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def exists(directory: str) -> bool:
+    return os.path.isfile(os.path.join(_data_dir(directory), "meta.json"))
+
+
+def encode_strings(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Packs strings into UTF-8 `(offsets, blob)` arrays; string i is `blob[offsets[i]:offsets[i + 1]]`."""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.cumsum([0] + [len(b) for b in encoded], dtype=np.int64)
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def decode_string(offsets: np.ndarray, blob: np.ndarray, index: int) -> str:
+    start, end = int(offsets[index]), int(offsets[index + 1])
+    return bytes(blob[start:end]).decode("utf-8")
+
+
+def decode_strings(offsets: np.ndarray, blob: np.ndarray) -> List[str]:
+    """Unpacks every string of an `encode_strings` pair at once."""
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+
+
+def fixed_width(values: Sequence[str]) -> np.ndarray:
+    """Packs short strings (names, terms) into a fixed-width byte array."""
+    encoded: List[bytes] = [value.encode("utf-8") for value in values]
+    return np.array(encoded, dtype=f"S{max(map(len, encoded), default=1)}")
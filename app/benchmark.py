@@ -0,0 +1,464 @@
+"""
+Offline latency and retrieval benchmark for the LangGraph pipeline.
+
+Ingests the scraped restaurants into an in-process collection
+(`retrieval.InMemoryCollection`, or with --vector-backend local the
+memory-mapped `vector_store.LocalVectorStore`), replaces the Gemini clients
+with stub chat models, then replays generated questions through `graph` and scores
+`search_knowledge_base` (the search behind `call_db`) against answers
+labeled from each restaurant's structured_data.json. No Milvus server, API
+key or network access is needed with the default hashing embedder.
+
+Reported: p50/p95/p99 latency per graph node and per turn, embeddings/sec,
+searches/sec, LLM calls and tokens sent per turn, router decisions, LLM
+admission/retry counts and recall@k / MRR. --llm-error-rate makes the stub
+models fail a share of calls with 429/503 errors to exercise the retries,
+fallback and backpressure in `llm_client.LLMClient`. Results are written as JSON; pass an earlier results file
+as --baseline to print the change in the headline numbers.
+
+Usage:
+    python app/benchmark.py [--queries N] [--concurrency C] [--embedder hash|torch|onnx]
+                            [--vector-backend memory|local] [--nlist N] [--no-lexical]
+                            [--llm-error-rate R] [--llm-concurrency N]
+                            [--output PATH] [--baseline PATH]
+"""
+
+import argparse
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from cache import SemanticCache
+from context import estimate_tokens
+from embedding import EmbeddingService
+from ingest import EMBEDDING_DIM, ingest
+from lexical import BM25Index
+from llm_client import LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLMClient, LLMOverloaded, LLMUnavailable
+from menu_index import DATA_DIR, MenuIndex
+from prefetch import PrefetchCache
+from retrieval import InMemoryCollection, MilvusSearchBatcher
+from vector_store import LocalVectorStore, LocalVectorWriter
+
+RECALL_KS = (1, 3, 5, 10)
+PERCENTILES = (50, 95, 99)
+BENCHMARKED_NODES = ("route_query", "chatbot", "call_db", "menu_query", "generate_response")
+HEADLINE_METRICS = (
+    ("turn_latency_ms", "p95"),
+    ("embeddings_per_sec",),
+    ("searches_per_sec",),
+    ("tokens_per_turn", "mean"),
+    ("retrieval", "recall@5"),
+    ("retrieval", "mrr"),
+)
+
+# Token counts of the turn currently running in this task; see `run_turn`.
+_turn_usage: contextvars.ContextVar[Optional[Dict[str, int]]] = contextvars.ContextVar("turn_usage", default=None)
+
+
+def hashing_embed_fn(dim: int = EMBEDDING_DIM):
+    """
+    Returns a deterministic bag-of-words embedding function that needs no model download.
+
+    Each lower-cased word (and word bigram) is hashed to a signed bucket and
+    the vector is L2-normalized, so lexical overlap drives the inner product.
+    """
+    def embed_batch(texts: Sequence[str]) -> List[List[float]]:
+        vectors = np.zeros((len(texts), dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            words = re.findall(r"[a-z0-9]+", text.lower())
+            for token in words + [a + " " + b for a, b in zip(words, words[1:])]:
+                digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "big")
+                vectors[i, digest % dim] += 1.0 if digest >> 63 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return (vectors / np.maximum(norms, 1e-12)).tolist()
+
+    return embed_batch
+
+
+class StubLLMError(Exception):
+    """A provider-style error carrying an HTTP status, as raised by the stub on injected failures."""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"stub LLM error {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class StubChatModel:
+    """
+    Stand-in for the Gemini chat model.
+
+    When tools are bound it plans one `call_db_tool` call for the latest user
+    message; otherwise it returns a short fixed answer. Every call records an
+    estimate of the tokens sent and produced against the running turn.
+
+    Latency varies uniformly by +/-50% around `latency_ms`, and a share
+    `error_rate` of calls fails with a 429 or 503 `StubLLMError`.
+    """
+
+    def __init__(self, latency_ms: float = 0.0, tool_names: Sequence[str] = (), error_rate: float = 0.0, seed: int = 0):
+        self.latency = latency_ms / 1000.0
+        self.tool_names = list(tool_names)
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+    def bind_tools(self, tools) -> "StubChatModel":
+        bound = StubChatModel(self.latency * 1000.0, [t.name for t in tools], self.error_rate)
+        bound.rng = self.rng
+        return bound
+
+    async def ainvoke(self, messages: Sequence[BaseMessage], *args, **kwargs) -> AIMessage:
+        if self.latency:
+            await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        if self.error_rate and self.rng.random() < self.error_rate:
+            if self.rng.random() < 0.5:
+                raise StubLLMError(429, retry_after=self.latency)
+            raise StubLLMError(503)
+        prompt_tokens = sum(estimate_tokens(m.content) for m in messages if isinstance(m.content, str))
+        if "call_db_tool" in self.tool_names:
+            query = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+            tool_call = {"name": "call_db_tool", "args": {"query": query}, "id": f"stub_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+            response = AIMessage(content="", tool_calls=[tool_call])
+        else:
+            response = AIMessage(content="Here is what I found in the restaurant data.")
+        usage = _turn_usage.get()
+        if usage is not None:
+            usage["llm_calls"] += 1
+            usage["prompt_tokens"] += prompt_tokens
+            usage["completion_tokens"] += estimate_tokens(response.content)
+        return response
+
+
+def _encoded_forms(text: str) -> List[str]:
+    """Lower-cased forms a value can take inside a chunk: raw and JSON-escaped."""
+    forms = {text.lower(), json.dumps(text)[1:-1].lower()}
+    return [form for form in forms if form]
+
+
+def build_labeled_queries(menu_index: MenuIndex, per_restaurant: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    Generates questions whose answer text is known from structured_data.json.
+
+    Per restaurant: dish price questions naming the restaurant, one telephone
+    question, and dish questions that do not name any restaurant.
+
+    Args:
+        menu_index (MenuIndex): Index built from the scraped data.
+        per_restaurant (int): Dish questions per restaurant.
+        seed (int): Sampling seed.
+
+    Returns:
+        List[Dict[str, Any]]: Queries with the restaurant folder and the answer text.
+    """
+    rng = random.Random(seed)
+    queries = []
+    for rid, info in enumerate(menu_index.restaurants):
+        rows = [row for row in menu_index.row_ranges[rid] if len(menu_index.names[row]) >= 4]
+        for row in rng.sample(rows, min(per_restaurant, len(rows))):
+            dish = menu_index.names[row]
+            queries.append({
+                "query": f"How much does {dish} cost at {info['name']}?",
+                "restaurant": info["source"], "answer": dish, "kind": "dish_price",
+            })
+        if rows:
+            dish = menu_index.names[rng.choice(rows)]
+            queries.append({"query": f"Where can I get {dish}?", "restaurant": None, "answer": dish, "kind": "dish_lookup"})
+        if info.get("telephone"):
+            queries.append({
+                "query": f"What is the phone number of {info['name']}?",
+                "restaurant": info["source"], "answer": str(info["telephone"]), "kind": "telephone",
+            })
+    rng.shuffle(queries)
+    return queries
+
+
+def label_relevant_ids(collection: InMemoryCollection, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Attaches the ids of the chunks containing each answer, dropping queries no chunk answers.
+
+    Args:
+        collection (InMemoryCollection): Ingested collection.
+        queries (List[Dict[str, Any]]): Output of `build_labeled_queries`.
+
+    Returns:
+        List[Dict[str, Any]]: Answerable queries with a `relevant` id list.
+    """
+    rows = collection.query(output_fields=["id", "content", "restaurant"])
+    labeled = []
+    for query in queries:
+        forms = _encoded_forms(query["answer"])
+        relevant = [
+            row["id"] for row in rows
+            if (query["restaurant"] is None or row.get("restaurant") == query["restaurant"])
+            and any(form in row["content"].lower() for form in forms)
+        ]
+        if relevant:
+            labeled.append({**query, "relevant": relevant})
+    return labeled
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    data = np.asarray(values, dtype=np.float64)
+    summary = {"count": int(data.size), "mean": round(float(data.mean()), 3)}
+    for p in PERCENTILES:
+        summary[f"p{p}"] = round(float(np.percentile(data, p)), 3)
+    summary["max"] = round(float(data.max()), 3)
+    return summary
+
+
+async def run_turn(graph, query: str, node_ms: Dict[str, List[float]]) -> Dict[str, Any]:
+    """
+    Runs one single-turn conversation through the graph in a fresh session.
+
+    Args:
+        graph: Compiled LangGraph graph.
+        query (str): User message.
+        node_ms (Dict[str, List[float]]): Per-node latency samples, appended to.
+
+    Returns:
+        Dict[str, Any]: Turn latency, LLM usage and the HTTP status the server
+        would answer with (429/503 when the LLM client gives up).
+    """
+    usage = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    _turn_usage.set(usage)
+    config = {"configurable": {"thread_id": f"bench_{uuid.uuid4().hex}"}}
+    starts: Dict[str, float] = {}
+    started = time.perf_counter()
+    status = 200
+    try:
+        async for event in graph.astream_events({"messages": query}, config=config, version="v2"):
+            name = event["name"]
+            if name not in BENCHMARKED_NODES or event.get("metadata", {}).get("langgraph_node") != name:
+                continue
+            if event["event"] == "on_chain_start":
+                starts[event["run_id"]] = time.perf_counter()
+            elif event["event"] == "on_chain_end" and event["run_id"] in starts:
+                node_ms.setdefault(name, []).append((time.perf_counter() - starts.pop(event["run_id"])) * 1000.0)
+    except LLMOverloaded:
+        status = 429
+    except LLMUnavailable:
+        status = 503
+    return {"latency_ms": (time.perf_counter() - started) * 1000.0, "status": status, **usage}
+
+
+async def replay(graph, queries: Sequence[str], concurrency: int) -> Dict[str, Any]:
+    """Replays the queries through the graph with at most `concurrency` turns in flight."""
+    node_ms: Dict[str, List[float]] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(query: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await run_turn(graph, query, node_ms)
+
+    started = time.perf_counter()
+    turns = await asyncio.gather(*(one(q) for q in queries))
+    elapsed = time.perf_counter() - started
+    return {
+        "turns": len(turns),
+        "seconds": round(elapsed, 3),
+        "turns_per_sec": round(len(turns) / elapsed, 3) if elapsed else 0.0,
+        "turn_status": {str(code): sum(t["status"] == code for t in turns) for code in sorted({t["status"] for t in turns})},
+        "turn_latency_ms": summarize([t["latency_ms"] for t in turns]),
+        "node_latency_ms": {name: summarize(node_ms[name]) for name in BENCHMARKED_NODES if name in node_ms},
+        "llm_calls_per_turn": summarize([t["llm_calls"] for t in turns]),
+        "tokens_per_turn": summarize([t["prompt_tokens"] + t["completion_tokens"] for t in turns]),
+        "prompt_tokens_per_turn": summarize([t["prompt_tokens"] for t in turns]),
+    }
+
+
+async def evaluate_retrieval(search, embedder: EmbeddingService, labeled: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Scores recall@k and MRR of `search` over the labeled queries.
+
+    A query counts as recalled at k when any chunk containing its answer is
+    among the first k hits.
+
+    Args:
+        search (Callable): `graph.search_knowledge_base`.
+        embedder (EmbeddingService): Query embedder.
+        labeled (Sequence[Dict[str, Any]]): Output of `label_relevant_ids`.
+
+    Returns:
+        Dict[str, Any]: Overall and per-question-kind recall@k and MRR.
+    """
+    ranks_by_kind: Dict[str, List[Optional[int]]] = {}
+    for item in labeled:
+        hits = await search(item["query"], await embedder.aembed(item["query"]), limit=max(RECALL_KS))
+        relevant = set(item["relevant"])
+        rank = next((i + 1 for i, hit in enumerate(hits) if hit["id"] in relevant), None)
+        ranks_by_kind.setdefault(item["kind"], []).append(rank)
+
+    def score(ranks: List[Optional[int]]) -> Dict[str, float]:
+        result = {"queries": len(ranks)}
+        for k in RECALL_KS:
+            result[f"recall@{k}"] = round(sum(1 for r in ranks if r and r <= k) / len(ranks), 4)
+        result["mrr"] = round(sum(1.0 / r for r in ranks if r) / len(ranks), 4)
+        return result
+
+    all_ranks = [rank for ranks in ranks_by_kind.values() for rank in ranks]
+    report = score(all_ranks) if all_ranks else {"queries": 0}
+    report["by_kind"] = {kind: score(ranks) for kind, ranks in sorted(ranks_by_kind.items())}
+    return report
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Formats the change in the headline metrics relative to an earlier run."""
+    lines = []
+    for path in HEADLINE_METRICS:
+        now, before = current, baseline
+        for key in path:
+            now = now.get(key, {}) if isinstance(now, dict) else None
+            before = before.get(key, {}) if isinstance(before, dict) else None
+        if isinstance(now, (int, float)) and isinstance(before, (int, float)) and before:
+            lines.append(f"{'.'.join(path)}: {before} -> {now} ({(now - before) / before * 100:+.1f}%)")
+    return lines
+
+
+def build_embed_fns(kind: str):
+    """Returns (batch embed function for ingestion, embed function for queries)."""
+    if kind == "hash":
+        embed_fn = hashing_embed_fn()
+        return embed_fn, embed_fn
+    from embedding import load_embedding_model, make_embed_fn
+
+    embed_fn = make_embed_fn(load_embedding_model(kind), normalize=True)
+    return embed_fn, embed_fn
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import graph as graph_module
+    from resources import resources
+
+    ingest_fn, query_fn = build_embed_fns(args.embedder)
+    tmp = tempfile.mkdtemp()
+    lexical_dir = os.path.join(tmp, "lexical")
+    menu_dir = os.path.join(tmp, "menu")
+    if args.vector_backend == "local":
+        vector_dir = os.path.join(tmp, "vectors")
+        writer = LocalVectorWriter(vector_dir, args.vector_dtype, args.nlist)
+        ingest_summary = ingest(writer, ingest_fn, args.data_dir, os.path.join(tmp, "manifest.json"), args.workers,
+                                lexical_dir=lexical_dir, menu_dir=menu_dir, version_path=os.path.join(tmp, "corpus_version.json"))
+        collection = LocalVectorStore.open(vector_dir)
+    else:
+        collection = InMemoryCollection()
+        ingest_summary = ingest(collection, ingest_fn, args.data_dir, os.path.join(tmp, "manifest.json"), args.workers,
+                                lexical_dir=lexical_dir, menu_dir=menu_dir, version_path=os.path.join(tmp, "corpus_version.json"))
+    lexical_index = BM25Index.load(lexical_dir)
+    menu_index = MenuIndex.load(menu_dir)
+
+    embedder = EmbeddingService(query_fn)
+    searcher = MilvusSearchBatcher(collection)
+    # Similarity never exceeds 1.0, so a threshold above it disables the cache.
+    query_cache = SemanticCache() if args.cache else SemanticCache(threshold=1.01)
+    llm = StubChatModel(latency_ms=args.llm_latency_ms, error_rate=args.llm_error_rate, seed=args.seed)
+    llm2 = StubChatModel(latency_ms=args.llm_latency_ms, error_rate=args.llm_error_rate, seed=args.seed + 1)
+    llm_client = LLMClient(llm, fallback=lambda: llm2, max_concurrency=args.llm_concurrency, max_queue=args.llm_max_queue)
+    prefetch_cache = PrefetchCache()
+    for name, value in (
+        ("llm", llm), ("llm2", llm2), ("llm_client", llm_client), ("collection", collection), ("searcher", searcher),
+        ("embedder", embedder), ("query_cache", query_cache), ("menu_index", menu_index),
+        ("lexical_index", lexical_index), ("prefetch_cache", prefetch_cache),
+    ):
+        resources.provide(name, value)
+    graph_module.ROUTER_ENABLED = not args.no_router
+    graph_module.HYBRID_SEARCH = not args.no_lexical
+    graph_module.SPECULATIVE_RETRIEVAL = args.speculative
+
+    labeled = label_relevant_ids(collection, build_labeled_queries(menu_index, args.queries, args.seed))
+    try:
+        replay_report = await replay(graph_module.graph, [q["query"] for q in labeled], args.concurrency)
+        embedding_stats = embedder.stats()
+        search_stats = searcher.stats()
+        retrieval_report = await evaluate_retrieval(graph_module.search_knowledge_base, embedder, labeled)
+    finally:
+        embedder.close()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "embedder": args.embedder,
+            "queries_per_restaurant": args.queries,
+            "concurrency": args.concurrency,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_error_rate": args.llm_error_rate,
+            "llm_concurrency": args.llm_concurrency,
+            "llm_max_queue": args.llm_max_queue,
+            "cache": args.cache,
+            "router": not args.no_router,
+            "hybrid_search": not args.no_lexical,
+            "speculative_retrieval": args.speculative,
+            "vector_backend": args.vector_backend if args.vector_backend == "memory" else f"local:{args.vector_dtype}:nlist={args.nlist}",
+            "retrieval_limit": graph_module.RETRIEVAL_LIMIT,
+            "retrieval_top_k": graph_module.RETRIEVAL_TOP_K,
+            "seed": args.seed,
+        },
+        "ingest": ingest_summary,
+        **replay_report,
+        "embeddings_per_sec": round(embedding_stats["embeddings_per_busy_sec"], 1),
+        "searches_per_sec": round(search_stats["searches"] / search_stats["search_seconds"], 1) if search_stats["search_seconds"] else 0.0,
+        "embedding": embedding_stats,
+        "search": search_stats,
+        "router": resources.get("query_router").stats(),
+        "llm": llm_client.stats(),
+        "prefetch": prefetch_cache.stats(),
+        "retrieval": retrieval_report,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline latency and retrieval benchmark.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--queries", type=int, default=10, help="Dish questions per restaurant.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embedder", choices=("hash", "torch", "onnx"), default="hash")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency of each stub LLM call.")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Share of stub LLM calls that fail with 429/503.")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_MAX_CONCURRENCY, help="LLM calls in flight before queueing.")
+    parser.add_argument("--llm-max-queue", type=int, default=LLM_MAX_QUEUE, help="LLM calls allowed to wait for a slot.")
+    parser.add_argument("--cache", action="store_true", help="Keep the semantic query cache enabled.")
+    parser.add_argument("--no-router", action="store_true", help="Send every turn through the planning LLM.")
+    parser.add_argument("--speculative", action="store_true", help="Prefetch retrieval for the user message during the planning LLM call.")
+    parser.add_argument("--vector-backend", choices=("memory", "local"), default="memory",
+                        help="In-process collection, or the memory-mapped local vector index.")
+    parser.add_argument("--vector-dtype", choices=("float16", "float32"), default="float16")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists for the local vector index.")
+    parser.add_argument("--no-lexical", action="store_true", help="Vector search only, without BM25 fusion or exact-name lookups.")
+    parser.add_argument("--workers", type=int, default=None, help="Ingestion parser processes.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="Earlier results file to compare against.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(json.dumps({key: report[key] for key in ("turn_latency_ms", "node_latency_ms", "tokens_per_turn")}, indent=2))
+    print(f"embeddings/sec: {report['embeddings_per_sec']}  searches/sec: {report['searches_per_sec']}")
+    print(f"turn status: {report['turn_status']}  llm: {json.dumps(report['llm']['counts'])}")
+    print(f"recall@k: " + ", ".join(f"{k}={report['retrieval'].get(f'recall@{k}')}" for k in RECALL_KS)
+          + f"  mrr={report['retrieval'].get('mrr')}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            for line in compare(report, json.load(f)):
+                print(line)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
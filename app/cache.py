@@ -0,0 +1,210 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Written by ingest whenever it finishes; the cache is cleared when the version in it changes.
+CORPUS_VERSION_PATH = os.getenv(
+    "CORPUS_VERSION_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "indexes", "corpus_version.json"),
+)
+
+
+def read_corpus_version(path: str = CORPUS_VERSION_PATH) -> Optional[str]:
+    """Returns the corpus version written by the last ingest run, or None when there is none."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def write_corpus_version(version: str, path: str = CORPUS_VERSION_PATH) -> None:
+    """Atomically records the corpus version for running servers to pick up."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "written_at": time.time()}, f)
+    os.replace(tmp_path, path)
+
+
+class _Entry:
+    __slots__ = ("vector", "value", "created_at", "nbytes")
+
+    def __init__(self, vector: np.ndarray, value: Any, nbytes: int):
+        self.vector = vector
+        self.value = value
+        self.created_at = time.monotonic()
+        self.nbytes = nbytes
+
+
+def _value_size(value: Any) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(repr(value))
+
+
+class SemanticCache:
+    """
+    Similarity-keyed cache.
+
+    Values are stored under the embedding of the query that produced them. A
+    lookup hits when a stored embedding in the same namespace has cosine
+    similarity of at least `threshold` with the new query. Entries are evicted
+    least-recently-used first when `max_entries` or `max_bytes` is exceeded,
+    and expire after `ttl_seconds`. Changing the corpus version via
+    `check_version` drops everything.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600.0,
+        max_bytes: int = 32 * 1024 * 1024,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int], _Entry]" = OrderedDict()
+        self._matrices: Dict[str, Tuple[np.ndarray, list]] = {}
+        self._next_id = 0
+        self._bytes = 0
+        self._version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+        self._evictions = 0
+        self._invalidations = 0
+
+    def get(self, namespace: str, vector: Sequence[float], record: bool = True) -> Optional[Any]:
+        """
+        Looks up the closest cached value for a query embedding.
+
+        Args:
+            namespace (str): Cache partition, e.g. "context" or "answer".
+            vector (Sequence[float]): Query embedding.
+            record (bool): Count the lookup and refresh the entry's recency; False for a peek.
+
+        Returns:
+            Optional[Any]: The cached value, or None on a miss.
+        """
+        query = self._normalize(vector)
+        with self._lock:
+            self._expire()
+            matrix, keys = self._matrix(namespace)
+            if keys:
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key = keys[best]
+                    if record:
+                        self._entries.move_to_end(key)
+                        self._hits[namespace] = self._hits.get(namespace, 0) + 1
+                    return self._entries[key].value
+            if record:
+                self._misses[namespace] = self._misses.get(namespace, 0) + 1
+            return None
+
+    def put(self, namespace: str, vector: Sequence[float], value: Any) -> None:
+        """
+        Stores a value under a query embedding.
+
+        Args:
+            namespace (str): Cache partition.
+            vector (Sequence[float]): Query embedding.
+            value (Any): Value to cache.
+        """
+        normalized = self._normalize(vector)
+        entry = _Entry(normalized, value, normalized.nbytes + _value_size(value))
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            key = (namespace, self._next_id)
+            self._next_id += 1
+            self._entries[key] = entry
+            self._bytes += entry.nbytes
+            self._matrices.pop(namespace, None)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+                self._evictions += 1
+
+    def check_version(self, version: Hashable) -> bool:
+        """
+        Records the current knowledge base version, clearing the cache if it changed.
+
+        Args:
+            version (Hashable): Anything that changes when the collection is re-ingested.
+
+        Returns:
+            bool: True if the cache was invalidated.
+        """
+        with self._lock:
+            if version == self._version:
+                return False
+            first = self._version is None
+            self._version = version
+        if not first:
+            self.clear()
+            self._invalidations += 1
+        return not first
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns hit/miss counters per namespace plus size and eviction counts."""
+        with self._lock:
+            namespaces = set(self._hits) | set(self._misses)
+            per_namespace = {}
+            for ns in sorted(namespaces):
+                hits, misses = self._hits.get(ns, 0), self._misses.get(ns, 0)
+                per_namespace[ns] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                }
+            return {
+                "threshold": self.threshold,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+                "namespaces": per_namespace,
+            }
+
+    @staticmethod
+    def _normalize(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm else array
+
+    def _matrix(self, namespace: str) -> Tuple[np.ndarray, list]:
+        cached = self._matrices.get(namespace)
+        if cached is None:
+            keys = [key for key in self._entries if key[0] == namespace]
+            matrix = np.stack([self._entries[key].vector for key in keys]) if keys else np.empty((0, 0), np.float32)
+            cached = self._matrices[namespace] = (matrix, keys)
+        return cached
+
+    def _evict(self, key: Tuple[str, int]) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.nbytes
+        self._matrices.pop(key[0], None)
+
+    def _expire(self) -> None:
+        if not self.ttl_seconds:
+            return
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Entries are only reordered on access, so scan rather than stop at the first fresh one.
+        expired = [key for key, entry in self._entries.items() if entry.created_at < cutoff]
+        for key in expired:
+            self._evict(key)
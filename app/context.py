@@ -0,0 +1,183 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from menu_index import MenuIndex
+from tracing import METRICS_ENABLED, metrics
+
+# Token budget for the retrieved chunks of each call_db call.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "450"))
+# Share of a chunk's word shingles already present in a kept chunk above which it is dropped.
+CONTEXT_DEDUPE_THRESHOLD = float(os.getenv("CONTEXT_DEDUPE_THRESHOLD", "0.8"))
+SHINGLE_SIZE = 5
+JSON_NAME_PATTERN = re.compile(r'"name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+JSON_FIELD_PATTERN = re.compile(r'"[@\w]+"\s*:')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _containment(a: Set[Tuple[str, ...]], b: Set[Tuple[str, ...]]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def _json_names(content: str) -> List[str]:
+    names = []
+    for raw in JSON_NAME_PATTERN.findall(content):
+        try:
+            names.append(json.loads(f'"{raw}"'))
+        except ValueError:
+            names.append(raw)
+    return names
+
+
+class ContextPacker:
+    """
+    Assembles the tool results of one turn into the context sent to `generate_response`.
+
+    Retrieved chunks are taken best score first. Chunks that list dishes
+    (structured JSON fragments, or menu sections of the page text) are
+    replaced by the matching rows of the menu index, rendered as one compact
+    table per restaurant under the restaurant's summary, so each dish appears
+    once however many overlapping chunks mention it. Other text is kept
+    unless most of its word shingles already appear in a kept chunk.
+
+    Each retrieval call has its own `budget_tokens`, so one call's chunks
+    never crowd out another's in a comparison, and each call keeps at least
+    its best chunk. Chunks left out for budget are counted in a closing
+    "further results omitted" note. Results that are not retrieval hits
+    (e.g. `menu_query` answers) are exact and already compact, so they are
+    kept verbatim, first, and outside the budget.
+    """
+
+    def __init__(
+        self,
+        menu_index: MenuIndex,
+        budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+        dedupe_threshold: float = CONTEXT_DEDUPE_THRESHOLD,
+    ):
+        self.menu_index = menu_index
+        self.budget_tokens = budget_tokens
+        self.dedupe_threshold = dedupe_threshold
+
+    def pack(self, sections: Sequence[str], hit_groups: Sequence[Sequence[Dict[str, Any]]]) -> Tuple[str, Dict[str, int]]:
+        """
+        Builds the context text.
+
+        Args:
+            sections (Sequence[str]): Verbatim tool outputs.
+            hit_groups (Sequence[Sequence[Dict[str, Any]]]): Retrieval hits of each
+                call_db call, with `content`, `score` and, when the collection
+                has it, `restaurant`.
+
+        Returns:
+            Tuple[str, Dict[str, int]]: The context and packing counters.
+        """
+        counts = {"chunks": sum(len(hits) for hits in hit_groups), "packed": 0, "duplicate": 0, "over_budget": 0, "tokens": 0}
+        parts: List[str] = []
+        for section in dict.fromkeys(s.strip() for s in sections if s and s.strip()):
+            parts.append(section)
+            counts["tokens"] += estimate_tokens(section)
+
+        tables: Dict[int, List[int]] = {}
+        included_rows: Set[int] = set()
+        snippets: List[str] = []
+        kept_shingles: List[Set[Tuple[str, ...]]] = []
+        seen: Set[Any] = set()
+        for hits in hit_groups:
+            spent = packed = 0
+            for hit in sorted(hits, key=lambda h: h.get("score") or 0.0, reverse=True):
+                content = (hit.get("content") or "").strip()
+                key = hit.get("id", content)
+                if not content or key in seen:
+                    counts["duplicate"] += 1
+                    continue
+                seen.add(key)
+
+                known_rid = self.menu_index.restaurant_for_source(hit.get("restaurant"))
+                rid, rows = self._menu_rows(content, known_rid)
+                if rid is not None and (rows or JSON_FIELD_PATTERN.search(content)):
+                    new_rows = [row for row in rows if row not in included_rows]
+                    if rid in tables and not new_rows:
+                        counts["duplicate"] += 1
+                        continue
+                    cost = sum(self._row_tokens(row) for row in new_rows)
+                    if rid not in tables:
+                        cost += estimate_tokens(self.menu_index.format_rows([], include_restaurant=False))
+                        cost += estimate_tokens(self.menu_index.summary(rid))
+                    if packed and spent + cost > self.budget_tokens:
+                        counts["over_budget"] += 1
+                        continue
+                    tables.setdefault(rid, []).extend(new_rows)
+                    included_rows.update(new_rows)
+                else:
+                    shingles = _shingles(content)
+                    if any(_containment(shingles, kept) >= self.dedupe_threshold for kept in kept_shingles):
+                        counts["duplicate"] += 1
+                        continue
+                    cost = estimate_tokens(content)
+                    if known_rid is not None and known_rid not in tables:
+                        cost += estimate_tokens(self.menu_index.summary(known_rid))
+                    if packed and spent + cost > self.budget_tokens:
+                        counts["over_budget"] += 1
+                        continue
+                    snippets.append(content)
+                    kept_shingles.append(shingles)
+                    if known_rid is not None:
+                        tables.setdefault(known_rid, [])
+                spent += cost
+                packed += 1
+                counts["tokens"] += cost
+                counts["packed"] += 1
+
+        for rid, rows in tables.items():
+            block = self.menu_index.summary(rid)
+            if rows:
+                block += "\n" + self.menu_index.format_rows(rows, include_restaurant=False)
+            parts.append(block)
+        if snippets:
+            parts.append("Other excerpts:\n" + "\n---\n".join(snippets))
+        if counts["over_budget"]:
+            parts.append(f"({counts['over_budget']} further results omitted to fit the context budget.)")
+
+        if METRICS_ENABLED:
+            for outcome in ("packed", "duplicate", "over_budget"):
+                if counts[outcome]:
+                    metrics.inc("context_chunks_total", counts[outcome], outcome=outcome)
+        return "\n\n".join(parts), counts
+
+    def _row_tokens(self, row: int) -> int:
+        table = self.menu_index.format_rows([row], include_restaurant=False)
+        return estimate_tokens(table.split("\n", 1)[1])
+
+    def _menu_rows(self, content: str, rid: Optional[int]) -> Tuple[Optional[int], List[int]]:
+        """
+        Maps the dish names in a chunk to menu rows.
+
+        Names are the JSON `name` values, or for page text the lines that are
+        exactly a dish name. When the hit carries no restaurant (collections
+        ingested without metadata), the restaurant whose menu contains the
+        most of the names is used.
+        """
+        names = _json_names(content)
+        if not names and rid is not None:
+            names = [line for line in content.split("\n") if 3 <= len(line.strip()) <= 120]
+        candidates = [rid] if rid is not None else range(len(self.menu_index.restaurants))
+        best_rid, best_rows = rid, []
+        for candidate in candidates:
+            rows = [row for row in (self.menu_index.find_item(candidate, name) for name in names) if row is not None]
+            if len(rows) > len(best_rows):
+                best_rid, best_rows = candidate, rows
+        return best_rid, list(dict.fromkeys(best_rows))
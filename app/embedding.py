@@ -0,0 +1,317 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence
+
+from tracing import observe, span
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # "torch" or "onnx"
+ONNX_MODEL_DIR = os.getenv(
+    "ONNX_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "models", "all-MiniLM-L6-v2-onnx"),
+)
+ONNX_MODEL_FILE = os.getenv("ONNX_MODEL_FILE", "model.int8.onnx")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 lets ONNX Runtime pick
+MAX_TOKENS = 512
+
+# Sentinel pushed onto the request queue to stop the dispatcher thread.
+_STOP = object()
+
+
+def make_torch_embed_fn(tokenizer, model, normalize: bool = False) -> Callable[[Sequence[str]], List[List[float]]]:
+    """
+    Builds a batch embedding function around a HuggingFace tokenizer/model pair.
+
+    Padding tokens are excluded from the mean pool so that a text embedded in a
+    batch gets the same vector it would get when embedded on its own.
+
+    Args:
+        tokenizer: HuggingFace tokenizer.
+        model: HuggingFace encoder model.
+        normalize (bool): L2-normalize the pooled vectors.
+
+    Returns:
+        Callable[[Sequence[str]], List[List[float]]]: Function embedding a batch of texts.
+    """
+    import torch
+
+    def embed_batch(texts: Sequence[str]) -> List[List[float]]:
+        with span("embed.tokenize"):
+            inputs = tokenizer(list(texts), return_tensors="pt", truncation=True, padding=True)
+        with span("embed.forward"), torch.no_grad():
+            hidden = model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        if normalize:
+            pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+        return pooled.numpy().tolist()
+
+    return embed_batch
+
+
+def _pool(hidden, attention_mask, normalize: bool):
+    """Masked mean pooling (and optional L2 normalization) of NumPy encoder outputs."""
+    import numpy as np
+
+    mask = attention_mask[..., None].astype(hidden.dtype)
+    pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+    if normalize:
+        pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+    return pooled
+
+
+def make_onnx_embed_fn(tokenizer, session, normalize: bool = False) -> Callable[[Sequence[str]], List[List[float]]]:
+    """
+    Builds a batch embedding function around an ONNX Runtime session.
+
+    Pools exactly like `make_torch_embed_fn`, with NumPy instead of torch, so
+    the int8 model exported by `export_onnx.py` can stand in for the fp32 one.
+
+    Args:
+        tokenizer: `tokenizers.Tokenizer` with padding and truncation enabled.
+        session: `onnxruntime.InferenceSession` returning `last_hidden_state` first.
+        normalize (bool): L2-normalize the pooled vectors.
+
+    Returns:
+        Callable[[Sequence[str]], List[List[float]]]: Function embedding a batch of texts.
+    """
+    import numpy as np
+
+    input_names = {node.name for node in session.get_inputs()}
+
+    def embed_batch(texts: Sequence[str]) -> List[List[float]]:
+        with span("embed.tokenize"):
+            encodings = tokenizer.encode_batch(list(texts))
+            feeds = {
+                "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.asarray([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64),
+            }
+        with span("embed.forward"):
+            hidden = session.run(None, {name: value for name, value in feeds.items() if name in input_names})[0]
+        return _pool(hidden, feeds["attention_mask"], normalize).tolist()
+
+    return embed_batch
+
+
+def load_embedding_model(backend: str = EMBEDDING_BACKEND, model_file: str = ONNX_MODEL_FILE) -> Any:
+    """
+    Loads the tokenizer and weights for an embedding backend.
+
+    "torch" loads the fp32 HuggingFace model. "onnx" loads the tokenizer and
+    resolves the exported model path from ONNX_MODEL_DIR; the Runtime session
+    itself is created by `make_embed_fn` because its thread pool must not be
+    created before a pre-forking server forks.
+
+    Args:
+        backend (str): "torch" or "onnx".
+        model_file (str): ONNX file inside ONNX_MODEL_DIR, e.g. "model.int8.onnx" or "model.onnx".
+
+    Returns:
+        Any: Opaque model handle for `make_embed_fn`.
+    """
+    if backend == "onnx":
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(ONNX_MODEL_DIR, model_file)
+        if not os.path.isfile(model_path):
+            raise FileNotFoundError(f"{model_path} not found; run `python app/export_onnx.py` first.")
+        tokenizer = Tokenizer.from_file(os.path.join(ONNX_MODEL_DIR, "tokenizer.json"))
+        pad_id = tokenizer.token_to_id("[PAD]") or 0
+        tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+        tokenizer.enable_truncation(max_length=MAX_TOKENS)
+        return backend, tokenizer, model_path
+    if backend == "torch":
+        from transformers import AutoModel, AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+        model = AutoModel.from_pretrained(EMBEDDING_MODEL_NAME)
+        model.eval()
+        return backend, tokenizer, model
+    raise ValueError(f"Unknown embedding backend: {backend!r}")
+
+
+def make_embed_fn(loaded: Any, normalize: bool = True) -> Callable[[Sequence[str]], List[List[float]]]:
+    """
+    Builds the batch embedding function for a handle from `load_embedding_model`.
+
+    Args:
+        loaded (Any): Result of `load_embedding_model`.
+        normalize (bool): L2-normalize the pooled vectors (Milvus searches by inner product).
+
+    Returns:
+        Callable[[Sequence[str]], List[List[float]]]: Function embedding a batch of texts.
+    """
+    backend, tokenizer, model = loaded
+    if backend == "onnx":
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = ONNX_THREADS
+        session = ort.InferenceSession(model, options, providers=["CPUExecutionProvider"])
+        return make_onnx_embed_fn(tokenizer, session, normalize)
+    return make_torch_embed_fn(tokenizer, model, normalize)
+
+
+class EmbeddingService:
+    """
+    Micro-batching embedding engine.
+
+    Callers submit single texts and get a future back. A dispatcher thread
+    groups concurrent requests into batches of at most `max_batch_size`,
+    waiting no longer than `max_wait_ms` for a batch to fill, and runs each
+    batch on a worker pool so the asyncio event loop is never blocked by a
+    forward pass.
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[Sequence[str]], List[List[float]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        num_workers: int = 1,
+        executor=None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1.")
+        self.embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        # Any concurrent.futures executor works; a ProcessPoolExecutor needs a picklable embed_fn.
+        self._executor = executor or ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="embed")
+        self._owns_executor = executor is None
+        # One slot per worker: while all workers are busy, requests keep queueing
+        # and are picked up together as the next batch.
+        self._slots = threading.Semaphore(num_workers)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started_at = time.perf_counter()
+        self._requests = 0
+        self._batches = 0
+        self._texts = 0
+        self._busy_seconds = 0.0
+        self._batch_sizes: Dict[int, int] = {}
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="embed-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, text: str) -> Future:
+        """
+        Queues a text for embedding.
+
+        Args:
+            text (str): Text to embed.
+
+        Returns:
+            Future: Resolves to the embedding as a list of floats.
+        """
+        if self._closed:
+            raise RuntimeError("EmbeddingService is closed.")
+        future: Future = Future()
+        with self._lock:
+            self._requests += 1
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        """Embeds a text, blocking the calling thread until the batch completes."""
+        return self.submit(text).result()
+
+    async def aembed(self, text: str) -> List[float]:
+        """Embeds a text without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(text))
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embeds a list of texts, letting the dispatcher split it into batches."""
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns throughput and batching metrics.
+
+        Returns:
+            Dict[str, float]: Counters, mean batch size, embeddings/sec over wall
+            time and over busy (compute) time, and the batch size histogram.
+        """
+        with self._lock:
+            elapsed = time.perf_counter() - self._started_at
+            return {
+                "requests": self._requests,
+                "batches": self._batches,
+                "texts_embedded": self._texts,
+                "pending": self._queue.qsize(),
+                "mean_batch_size": self._texts / self._batches if self._batches else 0.0,
+                "busy_seconds": self._busy_seconds,
+                "embeddings_per_sec": self._texts / elapsed if elapsed else 0.0,
+                "embeddings_per_busy_sec": self._texts / self._busy_seconds if self._busy_seconds else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            }
+
+    def close(self) -> None:
+        """Stops the dispatcher after draining queued requests."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._dispatcher.join()
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            self._slots.acquire()
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._start_batch(batch)
+            if stop:
+                return
+
+    def _start_batch(self, batch) -> None:
+        texts = [text for text, _ in batch]
+        started = time.perf_counter()
+        # Only embed_fn crosses the executor boundary, so process pools work too.
+        try:
+            work = self._executor.submit(self.embed_fn, texts)
+        except Exception as e:
+            self._slots.release()
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        work.add_done_callback(lambda done: self._finish_batch(batch, done, started))
+
+    def _finish_batch(self, batch, done: Future, started: float) -> None:
+        self._slots.release()
+        elapsed = time.perf_counter() - started
+        observe("embed.batch", elapsed)
+        with self._lock:
+            self._batches += 1
+            self._texts += len(batch)
+            self._busy_seconds += elapsed
+            self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+        error = done.exception()
+        if error is not None:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        for (_, future), vector in zip(batch, done.result()):
+            future.set_result(list(vector))
@@ -0,0 +1,164 @@
+"""
+Exports the MiniLM sentence embedder to ONNX, quantizes it to int8 and compares backends.
+
+Writes `model.onnx` (fp32), `model.int8.onnx` (dynamic int8 quantization of
+the weights) and `tokenizer.json` to ONNX_MODEL_DIR. With --compare, each
+backend embeds the same chunks of the scraped data in a fresh process. The
+report gives cosine agreement with the fp32 torch vectors, embeddings/sec
+and peak resident memory.
+
+Usage:
+    python app/export_onnx.py [--output DIR] [--compare] [--texts N] [--batch-size B]
+
+Serve the quantized model with EMBEDDING_BACKEND=onnx.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Sequence
+
+from embedding import EMBEDDING_MODEL_NAME, ONNX_MODEL_DIR
+from menu_index import DATA_DIR
+
+ONNX_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+OPSET_VERSION = 14
+# Minimum acceptable mean cosine between int8 and fp32 vectors.
+PARITY_THRESHOLD = 0.99
+
+
+def export(output_dir: str = ONNX_MODEL_DIR) -> Dict[str, int]:
+    """
+    Exports the fp32 encoder with dynamic batch and sequence axes and writes its int8 variant.
+
+    Args:
+        output_dir (str): Directory for the model files and tokenizer.
+
+    Returns:
+        Dict[str, int]: Size in bytes of each written model file.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+    model = AutoModel.from_pretrained(EMBEDDING_MODEL_NAME)
+    model.eval()
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["a sample sentence", "another one"], return_tensors="pt", padding=True)
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    int8_path = os.path.join(output_dir, "model.int8.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in ONNX_INPUTS),
+            fp32_path,
+            input_names=list(ONNX_INPUTS),
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: {0: "batch", 1: "sequence"} for name in (*ONNX_INPUTS, "last_hidden_state")},
+            opset_version=OPSET_VERSION,
+        )
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return {path: os.path.getsize(path) for path in (fp32_path, int8_path)}
+
+
+def sample_texts(data_dir: str, count: int) -> List[str]:
+    """Returns up to `count` real chunks from the scraped data, as ingestion would produce them."""
+    from ingest import parse_restaurant
+
+    texts: List[str] = []
+    for name in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, name)
+        if os.path.isdir(path):
+            texts.extend(chunk["content"] for chunk in parse_restaurant(path)[1])
+    step = max(1, len(texts) // count) if count else 1
+    return texts[::step][:count]
+
+
+def _measure_backend(backend: str, model_file: str, texts: Sequence[str], batch_size: int) -> Dict[str, Any]:
+    """Embeds `texts` with one backend. Runs in a fresh process so peak RSS belongs to that backend alone."""
+    from embedding import load_embedding_model, make_embed_fn
+
+    started = time.perf_counter()
+    embed_fn = make_embed_fn(load_embedding_model(backend, model_file), normalize=True)
+    load_seconds = time.perf_counter() - started
+    embed_fn(list(texts[:batch_size]))  # warm-up pass
+
+    vectors: List[List[float]] = []
+    started = time.perf_counter()
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embed_fn(list(texts[start:start + batch_size])))
+    seconds = time.perf_counter() - started
+    return {
+        "load_seconds": round(load_seconds, 3),
+        "embeddings_per_sec": round(len(texts) / seconds, 1) if seconds else 0.0,
+        # ru_maxrss is reported in KiB on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "vectors": vectors,
+    }
+
+
+def compare(texts: Sequence[str], batch_size: int) -> Dict[str, Any]:
+    """
+    Measures torch fp32, ONNX fp32 and ONNX int8 on the same texts.
+
+    Args:
+        texts (Sequence[str]): Texts to embed.
+        batch_size (int): Texts per forward pass.
+
+    Returns:
+        Dict[str, Any]: Per-backend throughput, memory and cosine agreement with torch fp32.
+    """
+    import numpy as np
+
+    backends = {"torch_fp32": ("torch", ""), "onnx_fp32": ("onnx", "model.onnx"), "onnx_int8": ("onnx", "model.int8.onnx")}
+    results: Dict[str, Dict[str, Any]] = {}
+    spawn = multiprocessing.get_context("spawn")
+    for label, (backend, model_file) in backends.items():
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            results[label] = pool.submit(_measure_backend, backend, model_file, list(texts), batch_size).result()
+
+    reference = np.asarray(results["torch_fp32"]["vectors"], dtype=np.float32)
+    baseline = results["torch_fp32"]["embeddings_per_sec"]
+    report: Dict[str, Any] = {"texts": len(texts), "batch_size": batch_size, "backends": {}}
+    for label, result in results.items():
+        # Vectors are L2-normalized, so the row-wise dot product is the cosine.
+        cosines = (np.asarray(result.pop("vectors"), dtype=np.float32) * reference).sum(axis=1)
+        result["cosine_vs_torch_fp32"] = {"mean": round(float(cosines.mean()), 5), "min": round(float(cosines.min()), 5)}
+        result["speedup_vs_torch_fp32"] = round(result["embeddings_per_sec"] / baseline, 2) if baseline else 0.0
+        report["backends"][label] = result
+    report["int8_parity_ok"] = report["backends"]["onnx_int8"]["cosine_vs_torch_fp32"]["mean"] >= PARITY_THRESHOLD
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export the embedder to ONNX (fp32 and int8) and compare backends.")
+    parser.add_argument("--output", default=ONNX_MODEL_DIR)
+    parser.add_argument("--skip-export", action="store_true", help="Only run the comparison on existing files.")
+    parser.add_argument("--compare", action="store_true", help="Check parity and throughput against torch fp32.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        for path, size in export(args.output).items():
+            print(f"Wrote {path} ({size / 1e6:.1f} MB)")
+    if args.compare:
+        if os.path.abspath(args.output) != os.path.abspath(ONNX_MODEL_DIR):
+            # Fresh processes find the model through the env var, like the server does.
+            os.environ["ONNX_MODEL_DIR"] = args.output
+        report = compare(sample_texts(args.data_dir, args.texts), args.batch_size)
+        print(json.dumps(report, indent=2))
+        if not report["int8_parity_ok"]:
+            raise SystemExit(f"int8 embeddings fall below the {PARITY_THRESHOLD} mean cosine parity threshold.")
+
+
+if __name__ == "__main__":
+    main()
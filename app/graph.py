@@ -1,63 +1,210 @@
+import asyncio
 import os
-from dotenv import load_dotenv
+import time
+import uuid
+from typing import List, Optional
 
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, MessagesState, START, END
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.types import Send
-from langgraph.prebuilt import ToolNode
-from langchain_core.messages import HumanMessage, ToolMessage,SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage,SystemMessage
 from langchain_core.tools import tool
-from transformers import AutoTokenizer, AutoModel
-from pymilvus import connections, Collection
-import torch
 
 
 # from  import CHATBOT_PROMPT,VECTOR_DB_TOOL_PROMPT
 from prompts import CHATBOT_PROMPT, GENERATE_RESPONSE_PROMPT
+from cache import read_corpus_version
+from context import ContextPacker
+from lexical import reciprocal_rank_fusion, tokenize
+from menu_index import format_menu_answer, normalize_name
+from resources import resources
+from sessions import BoundedMemorySaver, stale_message_removals, window_messages
+from tracing import METRICS_ENABLED, metrics, record_llm_call, record_size, span, traced_node
+
+# Models, the Milvus connection and indexes are created lazily by `resources`
+# (or up front by the server's warmup), so importing this module is cheap.
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "1") == "1"
+CACHE_VERSION_CHECK_SECONDS = float(os.getenv("CACHE_VERSION_CHECK_SECONDS", "60"))
+RETRIEVAL_LIMIT = int(os.getenv("RETRIEVAL_LIMIT", "10"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+# Fuse BM25 hits from the local lexical index with the vector hits.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "1") == "1"
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Answer queries that name a dish verbatim from the lexical index alone.
+EXACT_NAME_SHORTCUT = os.getenv("EXACT_NAME_SHORTCUT", "1") == "1"
+# Search for the raw user message while chatbot's tool-planning LLM call runs.
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "0") == "1"
+_cache_version_checked_at = 0.0
+# Cleared when the lexical index cannot be loaded or built; retrieval is then vector-only.
+_lexical_index_available = True
 
-load_dotenv()
-os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY", "")
-MILVUS_URI = os.getenv("MILVUS_URI")
-MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-preview-04-17", temperature=0.7)
-llm2 = ChatGoogleGenerativeAI(model="gemini-2.5-pro-preview-03-25", temperature=0.7)
+class State(MessagesState):
+    # Embedding of the latest user message when its answer may be cached, i.e. a
+    # self-contained first turn; set by chatbot, cleared by route_query.
+    answer_cache_key: Optional[List[float]]
 
-milvus_uri = MILVUS_URI
-token = MILVUS_TOKEN
-connections.connect("default", uri=milvus_uri, token=token)
+def embed_text(text):
+    """
+    Generates a vector embedding for the given text.
 
-collection_name = "knowledge_base"
-collection = Collection(collection_name)
+    Blocking; async code should await `resources.embedder.aembed` instead.
+    """
+    return resources.embedder.embed(text)
 
-# Create index if not present
-if not collection.has_index():
-    index_params = {
-        "metric_type": "IP",
-        "index_type": "IVF_FLAT",
-        "params": {"nlist": 1024}
-    }
-    collection.create_index(field_name="embedding", index_params=index_params)
+async def refresh_cache_version():
+    """
+    Invalidates the query cache, and reopens the on-disk indexes, when the
+    knowledge base has been re-ingested.
 
-# Load collection
-collection.load()
-print("✅ Milvus collection loaded and ready.")
+    The version is the one `ingest` writes to CORPUS_VERSION_PATH; without that
+    file (Milvus ingested from another host) the collection's entity count
+    stands in for it. Polled at most every CACHE_VERSION_CHECK_SECONDS.
+    """
+    global _cache_version_checked_at
+    now = time.monotonic()
+    if now - _cache_version_checked_at < CACHE_VERSION_CHECK_SECONDS:
+        return
+    _cache_version_checked_at = now
+    try:
+        version = await asyncio.to_thread(read_corpus_version)
+        if version is None:
+            version = await asyncio.to_thread(lambda: resources.collection.num_entities)
+    except Exception as e:
+        print("Cache version check failed:", e)
+        return
+    query_cache = await resources.aget("query_cache")
+    if query_cache.check_version(version):
+        await asyncio.to_thread(resources.reload_indexes)
+
+async def query_restaurant(query):
+    """
+    Returns the data folder of the single restaurant a query names.
 
-tokenizer = AutoTokenizer.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
-model = AutoModel.from_pretrained("sentence-transformers/all-MiniLM-L6-v2")
+    Args:
+        query (str): The retrieval query.
 
-class State(MessagesState):
-    pass 
+    Returns:
+        Optional[str]: The restaurant's `source`, or None when zero or several restaurants match.
+    """
+    menu_index = await resources.aget("menu_index")
+    matches = menu_index.find_restaurants(query)
+    if len(matches) != 1:
+        return None
+    return menu_index.restaurants[matches[0]]["source"]
+
+def restaurant_expr(source):
+    """Returns the Milvus filter expression selecting one restaurant's chunks."""
+    return 'restaurant == "' + source.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+async def get_lexical_index():
+    """Returns the BM25 index, or None when hybrid search is off or the index is unavailable."""
+    global _lexical_index_available
+    if not HYBRID_SEARCH or not _lexical_index_available:
+        return None
+    try:
+        return await resources.aget("lexical_index")
+    except Exception as e:
+        print("Lexical index unavailable, using vector search only:", e)
+        _lexical_index_available = False
+        return None
+
+async def lexical_search(lexical_index, query, source, limit):
+    """
+    BM25 search scoped like the vector search: the named restaurant first, then everything.
 
-def embed_text(text):
+    Within one restaurant its name matches every chunk equally, so the name's
+    words are dropped from the scoped query.
     """
-    Generates a vector embedding for the given text.
+    hits = []
+    if source:
+        menu_index = await resources.aget("menu_index")
+        rid = menu_index.restaurant_for_source(source)
+        name_terms = tokenize(menu_index.restaurants[rid]["name"]) if rid is not None else []
+        with span("lexical.search"):
+            hits = lexical_index.search(query, limit=limit, restaurant=source, ignore_terms=name_terms)
+    if not hits:
+        with span("lexical.search"):
+            hits = lexical_index.search(query, limit=limit)
+    return hits
+
+async def exact_name_hits(query, limit=RETRIEVAL_LIMIT):
     """
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-    with torch.no_grad():
-        embeddings = model(**inputs).last_hidden_state.mean(dim=1).numpy()
-    return embeddings.flatten().tolist()
+    Answers a query that names a dish verbatim from the lexical index, skipping
+    the query embedding and the Milvus round trip.
+
+    Args:
+        query (str): The retrieval query.
+        limit (int): Number of hits to return.
 
+    Returns:
+        Optional[List[Dict]]: BM25 hits, or None when the query names no dish or
+        no lexical hit mentions it.
+    """
+    if not EXACT_NAME_SHORTCUT:
+        return None
+    lexical_index = await get_lexical_index()
+    if lexical_index is None:
+        return None
+    menu_index = await resources.aget("menu_index")
+    source = await query_restaurant(query)
+    rows = menu_index.mentioned_items(query, menu_index.restaurant_for_source(source))
+    if not rows:
+        return None
+    names = {" ".join(normalize_name(menu_index.names[row]).split()) for row in rows}
+    hits = await lexical_search(lexical_index, query, source, limit)
+    for hit in hits:
+        content = " ".join(normalize_name(hit["content"]).split())
+        if any(name in content for name in names):
+            return hits
+    return None
+
+async def search_knowledge_base(query, query_embedding, limit=RETRIEVAL_LIMIT):
+    """
+    Runs the retrieval behind `call_db`.
+
+    When the query names a single restaurant the search is restricted to that
+    restaurant's chunks, otherwise it runs over the whole collection. With
+    HYBRID_SEARCH the vector hits are fused with BM25 hits from the local
+    lexical index by reciprocal rank fusion, so exact tokens (dish names,
+    "veg", prices) that mean-pooled embeddings blur still rank.
+
+    Args:
+        query (str): The retrieval query, used to pick the restaurant scope.
+        query_embedding (List[float]): Normalized query vector.
+        limit (int): Number of hits to fetch from each retriever.
+
+    Returns:
+        List[Dict]: Hits with non-empty, distinct content, best score first.
+    """
+    searcher = await resources.aget("searcher")
+    search_params = {"metric_type": "IP", "params": {"nprobe": 10}}
+    source = await query_restaurant(query)
+    # Collections ingested before chunks carried restaurant metadata can only be searched whole.
+    scoped = searcher.has_field("restaurant")
+    output_fields = ["content", "restaurant"] if scoped else ["content"]
+    hits = []
+    if source is not None and scoped:
+        hits = await searcher.search(query_embedding, limit=limit, param=search_params, output_fields=output_fields, expr=restaurant_expr(source))
+    if METRICS_ENABLED:
+        metrics.inc("retrieval_scope_total", scope="restaurant" if hits else "all")
+    if not hits:
+        hits = await searcher.search(query_embedding, limit=limit, param=search_params, output_fields=output_fields)
+    hits = sorted(hits, key=lambda h: h["score"], reverse=True)
+
+    lexical_index = await get_lexical_index()
+    if lexical_index is not None:
+        lexical_hits = await lexical_search(lexical_index, query, source, limit)
+        if lexical_hits:
+            hits = reciprocal_rank_fusion([hits, lexical_hits], k=RRF_K)
+
+    ranked, seen = [], set()
+    for hit in hits:
+        content = hit.get("content")
+        if content and content not in seen:
+            seen.add(content)
+            ranked.append(hit)
+    return ranked
+
+# Tool schemas for the planning LLM; assign_tool sends their calls to the call_db and menu_query nodes.
 @tool
 async def call_db_tool(query: str) -> str:
     """
@@ -71,25 +218,119 @@ async def call_db_tool(query: str) -> str:
     Return results in a simple, clear, and structured format.
 
     """
-    return """
-        "isBestseller": false,
-            "price": 238,
-            "priceCurrency": "INR",
-            "description": "Delightfully crispy chicken sandwich with a crispy chicken patty topped with mayonnaise and ... read more",
-            "isVeg": "non-veg",
-            "dietary_tags": [],
-            "menu_category": "main_course",
-            "normalized_name": "mcchicken double patty burger",
-            "ingredients": [],
-            "spice_level": null,
-            "processed_at": "2025-04-26T08:42:32.665548+00:00"
-        },
+    raise RuntimeError("handled by the call_db node")
+
+@tool
+async def menu_query_tool(
+    restaurant: str,
+    veg: Optional[str] = None,
+    max_price: Optional[int] = None,
+    category: Optional[str] = None,
+    bestseller_only: bool = False,
+    dish: Optional[str] = None,
+    cheapest_first: bool = False,
+) -> str:
+    """
+    Exact structured lookup over one restaurant's menu.
+
+    Use for price range, veg/non-veg filters, cheapest items, bestsellers,
+    dishes under a budget, menu categories, rating, address, telephone and
+    opening hours. Always returns the restaurant's price range, rating,
+    address, telephone and opening hours along with the matching items.
+
+    Args:
+        restaurant: Restaurant name, e.g. "Punjab Grill".
+        veg: "veg" or "non-veg" to filter on dietary type.
+        max_price: Only items priced at or below this amount in INR.
+        category: One of appetizer, main_course, dessert, beverage, other.
+        bestseller_only: Only bestseller items.
+        dish: Dish name fragment, e.g. "biryani", "burger".
+        cheapest_first: Sort items by ascending price.
+    """
+    raise RuntimeError("handled by the menu_query node")
+
+
+async def answer_menu_query(args):
+    """
+    Runs a menu_query_tool call's arguments against the menu index.
+
+    Args:
+        args (Dict): Arguments of a menu_query_tool call, planned by the LLM or the router.
+
+    Returns:
+        str: The formatted lookup result.
+    """
+    menu_index = await resources.aget("menu_index")
+    return format_menu_answer(
+        menu_index,
+        args.get('restaurant', ''),
+        veg=args.get('veg'),
+        max_price=args.get('max_price'),
+        category=args.get('category'),
+        bestseller_only=bool(args.get('bestseller_only')),
+        dish=args.get('dish'),
+        cheapest_first=bool(args.get('cheapest_first')),
+        include_items=bool(args.get('include_items', True)),
+    )
+
+
+@traced_node("menu_query")
+async def menu_query(input):
+    """
+    Answers a structured menu query from the in-memory menu index.
+
+    Args:
+        input (Dict): Tool call containing 'args' and 'id'.
+
+    Returns:
+        Dict[str, List[ToolMessage]]: Lookup result wrapped in a ToolMessage.
+    """
+    content = await answer_menu_query(input['args'])
+    record_size("menu_answer", len(content))
+    return {"messages": [ToolMessage(content=content, tool_call_id=input['id'])]}
+
+
+async def start_prefetch(user_query, query_embedding):
     """
+    Starts `search_knowledge_base` for the raw user message in the background,
+    so the retrieval overlaps chatbot's tool-planning LLM call.
 
+    Args:
+        user_query (str): The latest user message.
+        query_embedding (List[float]): Its normalized embedding.
 
+    Returns:
+        Optional[Prefetch]: Handle for `PrefetchCache.assign` / `discard`, or None
+        when the message names a dish and call_db would take the exact-name shortcut.
+    """
+    source = await query_restaurant(user_query)
+    if EXACT_NAME_SHORTCUT and _lexical_index_available:
+        menu_index = await resources.aget("menu_index")
+        if menu_index.mentioned_items(user_query, menu_index.restaurant_for_source(source)):
+            return None
+    prefetch_cache = await resources.aget("prefetch_cache")
+    return prefetch_cache.start(user_query, query_embedding, source, search_knowledge_base(user_query, query_embedding))
+
+async def prefetched_hits(tool_call_id, query, query_embedding):
+    """Returns the speculative hits chatbot prefetched for this tool call, or None to search."""
+    if not SPECULATIVE_RETRIEVAL or not resources.is_loaded("prefetch_cache"):
+        return None
+    prefetch_cache = await resources.aget("prefetch_cache")
+    source = await query_restaurant(query)
+    with span("prefetch.wait"):
+        return await prefetch_cache.take(tool_call_id, query, query_embedding, source)
+
+def release_prefetch(tool_call_id):
+    """Drops the speculative search for a tool call that was answered without a vector search."""
+    if SPECULATIVE_RETRIEVAL and resources.is_loaded("prefetch_cache"):
+        resources.prefetch_cache.release(tool_call_id)
+
+@traced_node("call_db")
 async def call_db(input):
     """
-    Searches the Milvus vector database based on query embedding.
+    Searches the knowledge base: the lexical index alone for queries naming a
+    dish verbatim, otherwise Milvus (fused with BM25 hits) by query embedding,
+    reusing chatbot's speculative search when it fits the query.
 
     Args:
         input (Dict): Input containing 'query' and 'id'.
@@ -99,26 +340,30 @@ async def call_db(input):
     """
     query = input['args']['query']
     tool_call_id = input['id']
-    print("query",query)
 
-    query_embedding = embed_text(query)
-    all_retrieved_docs = set()
-    search_params = {"metric_type": "IP", "params": {"nprobe": 10}}
-    
-    for _ in range(1):
-        results = collection.search(
-            [query_embedding],
-            anns_field="embedding",
-            param=search_params,
-            limit=10,
-            output_fields=["content"]
-        )
-        for hits in results:
-            for hit in hits:
-                content = hit.get("content")
-                if content:
-                    all_retrieved_docs.add(content)
-                    
+    query_embedding = None
+    hits = await exact_name_hits(query)
+    if hits is None:
+        embedder = await resources.aget("embedder")
+        query_cache = await resources.aget("query_cache")
+
+        with span("embed.query"):
+            query_embedding = await embedder.aembed(query)
+        await refresh_cache_version()
+        cached = query_cache.get("context", query_embedding)
+        if cached is not None:
+            release_prefetch(tool_call_id)
+            return {"messages": [ToolMessage(content=cached["content"], artifact={"hits": cached["hits"]}, tool_call_id=tool_call_id)]}
+
+        hits = await prefetched_hits(tool_call_id, query, query_embedding)
+        if hits is None:
+            hits = await search_knowledge_base(query, query_embedding)
+    else:
+        release_prefetch(tool_call_id)
+    if METRICS_ENABLED:
+        metrics.inc("retrieval_total", path="vector" if query_embedding is not None else "exact_name")
+    all_retrieved_docs = [hit["content"] for hit in hits]
+
     if not all_retrieved_docs:
     # Return an error-like message for LangGraph (cannot use jsonify)
         return {
@@ -126,14 +371,28 @@ async def call_db(input):
         }
 
     # Cap total docs to avoid overly large context
-    selected_docs = list(all_retrieved_docs)[:4]
+    selected_docs = all_retrieved_docs[:RETRIEVAL_TOP_K]
     
    
     context = "Query : "+ query  + " Respose : "+"\n\n".join(selected_docs)
-    
-    
-    return {"messages": [ToolMessage(content=context, tool_call_id=tool_call_id)]}
+    record_size("context", len(context))
+    # The ranked hits travel as the artifact so generate_response can pack them; the LLM only sees `content`.
+    if query_embedding is not None:
+        query_cache.put("context", query_embedding, {"content": context, "hits": hits})
+
+    return {"messages": [ToolMessage(content=context, artifact={"hits": hits}, tool_call_id=tool_call_id)]}
+
+def is_self_contained(history):
+    """
+    True when the windowed history holds only the latest user message: no
+    earlier turn or recap the message could refer back to, so its answer
+    does not depend on the session.
+    """
+    if any(isinstance(msg, SystemMessage) for msg in history):
+        return False
+    return sum(isinstance(msg, HumanMessage) for msg in history) == 1
 
+@traced_node("chatbot")
 async def chatbot(state: State):
     """
     Main chatbot node. Takes the current conversation and responds.
@@ -144,23 +403,99 @@ async def chatbot(state: State):
     Returns:
         Dict[str, List]: Messages after LLM response.
     """
-    tools=[call_db_tool]
-    
-    finalMessages = [SystemMessage(CHATBOT_PROMPT)] + state['messages']
+    # Drop turns beyond the stored-history limit so checkpoints stay bounded.
+    removals = stale_message_removals(state['messages'])
+
+    history = window_messages(state['messages'])
+    human_message = next((msg for msg in reversed(state['messages']) if isinstance(msg, HumanMessage)), None)
+    prefetch = None
+    answer_cache_key = None
+    if human_message is not None and isinstance(human_message.content, str):
+        embedder = await resources.aget("embedder")
+        query_cache = await resources.aget("query_cache")
+        await refresh_cache_version()
+        with span("embed.query"):
+            query_embedding = await embedder.aembed(human_message.content)
+        # Answers are shared across sessions, so only turns that cannot refer back
+        # to earlier ones ("what about veg options there?") read or fill the cache.
+        if is_self_contained(history):
+            answer_cache_key = query_embedding
+            cached_answer = query_cache.get("answer", query_embedding)
+            if cached_answer is not None:
+                return {"messages": removals + [AIMessage(content=cached_answer)], "answer_cache_key": None}
+        # Only worth it when call_db would not answer this message from the context cache.
+        if SPECULATIVE_RETRIEVAL and query_cache.get("context", query_embedding, record=False) is None:
+            prefetch = await start_prefetch(human_message.content, query_embedding)
+
+    tools=[call_db_tool, menu_query_tool]
+
+    system_prompt = CHATBOT_PROMPT
+    if history and isinstance(history[0], SystemMessage):
+        system_prompt += "\n\n" + history.pop(0).content
+    finalMessages = [SystemMessage(system_prompt)] + history
+
+    llm_client = await resources.aget("llm_client")
+
+    try:
+        with span("llm.chatbot"):
+            response = await llm_client.ainvoke(finalMessages, node="chatbot", tools=tools)
+    except BaseException:
+        if prefetch is not None:
+            resources.prefetch_cache.discard(prefetch)
+        raise
+    if prefetch is not None:
+        resources.prefetch_cache.assign(prefetch, [call["id"] for call in response.tool_calls if call["name"] == "call_db_tool"])
+    record_llm_call("chatbot", sum(len(m.content) for m in finalMessages if isinstance(m.content, str)), response)
+
+    return {"messages": removals + [response], "answer_cache_key": answer_cache_key}
+
+@traced_node("route_query")
+async def route_query(state: State):
+    """
+    Local router in front of chatbot. Answers small talk from templates and turns
+    clear single-restaurant data questions into a synthesized tool call, skipping
+    the tool-planning LLM. Returns no update when the LLM should decide.
 
-    tool_call_llm = llm.bind_tools(tools)
-    
-    response = await tool_call_llm.ainvoke(finalMessages)
+    Args:
+        state (State): Current conversation state.
 
-    return {"messages": [response]}
+    Returns:
+        Dict[str, List]: Messages with the routed reply or tool call, or {} to fall back.
+    """
+    if not ROUTER_ENABLED:
+        return {}
+    last_message = state['messages'][-1]
+    if not isinstance(last_message, HumanMessage) or not isinstance(last_message.content, str):
+        return {}
+
+    router = await resources.aget("query_router")
+    decision = router.route(last_message.content)
+    if decision.kind == "llm":
+        return {}
+
+    removals = stale_message_removals(state['messages'])
+    if decision.kind == "small_talk":
+        return {"messages": removals + [AIMessage(content=decision.reply)], "answer_cache_key": None}
+
+    tool_name = "menu_query_tool" if decision.kind == "menu_query" else "call_db_tool"
+    tool_call = {"name": tool_name, "args": decision.tool_args, "id": f"router_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+    return {"messages": removals + [AIMessage(content="", tool_calls=[tool_call])], "answer_cache_key": None}
+
+def after_route(state: State) -> list[Send] | str:
+    """Sends routed turns straight to their tools (or END) and everything else to chatbot."""
+    if isinstance(state["messages"][-1], AIMessage):
+        return assign_tool(state)
+    return "chatbot"
 
 async def combine_node(state:State):
     return 
 
 
+@traced_node("generate_response")
 async def generate_response(state: State):
     """
-    Post-processes tool outputs and generates the final assistant message.
+    Packs the tool outputs into a token-budgeted context (see `ContextPacker`)
+    and generates the final assistant message.
 
     Args:
         state (State): Current conversation state.
@@ -175,15 +510,21 @@ async def generate_response(state: State):
     if human_message is None:
         raise ValueError("No HumanMessage found.")
 
-    # Find all ToolMessages after the human message
-    tool_messages = []
+    # Collect the ToolMessages after the human message: retrieval hits to pack per call, other results verbatim
+    sections, hit_groups = [], []
     human_index = messages.index(human_message)
     for msg in messages[human_index + 1:]:
         if isinstance(msg, ToolMessage):
-            tool_messages.append(msg.content)
+            if isinstance(msg.artifact, dict) and "hits" in msg.artifact:
+                hit_groups.append(msg.artifact["hits"])
+            else:
+                sections.append(msg.content)
 
     # Prepare the final human content
-    tool_messages_text = "\n".join(tool_messages)  # join all tool messages
+    packer = ContextPacker(await resources.aget("menu_index"))
+    with span("context.pack"):
+        tool_messages_text, _ = packer.pack(sections, hit_groups)
+    record_size("packed_context", len(tool_messages_text))
     final_human_content = tool_messages_text + "\n" + human_message.content
 
 
@@ -192,7 +533,14 @@ async def generate_response(state: State):
         HumanMessage(content=final_human_content)
     ]
 
-    response = await llm.ainvoke(final_messages)
+    llm_client = await resources.aget("llm_client")
+    with span("llm.generate_response"):
+        response = await llm_client.ainvoke(final_messages, node="generate_response")
+    record_llm_call("generate_response", len(GENERATE_RESPONSE_PROMPT) + len(final_human_content), response)
+    answer_cache_key = state.get("answer_cache_key")
+    if answer_cache_key is not None and isinstance(response.content, str):
+        query_cache = await resources.aget("query_cache")
+        query_cache.put("answer", answer_cache_key, response.content)
     return {"messages": [response]}
 
 # Chatbot node router. Based on tool calls, creates the list of the next parallel nodes.
@@ -214,6 +562,8 @@ def assign_tool(state: State) -> list[Send] | str:
         for tool_call in last_message.tool_calls:
             if tool_call["name"] == 'call_db_tool':
                 send_list.append(Send('call_db', tool_call))
+            elif tool_call["name"] == 'menu_query_tool':
+                send_list.append(Send('menu_query', tool_call))
             elif tool_call["name"] == 'create_reminder_tool':
                 send_list.append(Send('reminder', tool_call))
         return send_list if send_list else "__end__"
@@ -224,18 +574,23 @@ builder = StateGraph(State)
 
 
 
+builder.add_node("route_query", route_query)
 builder.add_node("chatbot", chatbot)
 builder.add_node("call_db", call_db)
+builder.add_node("menu_query", menu_query)
 builder.add_node("combine_node", combine_node)
 builder.add_node("generate_response", generate_response)
 
-builder.add_edge(START, "chatbot")
+builder.add_edge(START, "route_query")
+builder.add_conditional_edges("route_query", after_route)
 builder.add_conditional_edges("chatbot", assign_tool)
 builder.add_edge("call_db", "combine_node")
+builder.add_edge("menu_query", "combine_node")
 builder.add_edge("combine_node", "generate_response")
 builder.add_edge("chatbot", END) 
 builder.add_edge("generate_response", END)
 
 
-memory = MemorySaver()
+# The server swaps in the checkpointer chosen by CHECKPOINTER for its lifetime (see sessions.open_checkpointer).
+memory = BoundedMemorySaver()
 graph = builder.compile(checkpointer=memory)
@@ -0,0 +1,433 @@
+"""
+Incremental ingestion of the scraped restaurant data into the Milvus knowledge_base collection
+(or, with --backend local, into the memory-mapped local vector index).
+
+Replaces the ingestion cells of Training.ipynb. Restaurant folders are parsed
+and chunked in a process pool, chunks are embedded in batches and upserted in
+bounded batches, and a content-hash manifest records what has been ingested,
+so a re-run only re-embeds restaurants whose files changed. The BM25 lexical
+index over the same chunks is rebuilt whenever the collection changed, from
+the previous index plus the re-parsed changed restaurants, and the columnar
+menu store (see preprocess.py) whenever the menus changed.
+
+Usage:
+    python app/ingest.py [--data-dir DIR] [--manifest PATH] [--workers N] [--rebuild] [--lexical-dir DIR] [--menu-dir DIR]
+                         [--backend milvus|local] [--vector-dir DIR] [--dtype float16|float32] [--nlist N]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from cache import CORPUS_VERSION_PATH, write_corpus_version
+from embedding import EMBEDDING_BACKEND, EMBEDDING_MODEL_NAME, ONNX_MODEL_FILE
+from arraystore import exists
+from lexical import LEXICAL_INDEX_DIR, BM25Index
+from menu_index import DATA_DIR, MENU_STORE_DIR
+from preprocess import build_menu_store, is_fresh
+from vector_store import VECTOR_BACKEND, VECTOR_INDEX_DIR, VECTOR_INDEX_DTYPE, VECTOR_INDEX_NLIST
+
+COLLECTION_NAME = "knowledge_base"
+EMBEDDING_DIM = 384
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 100
+EMBED_BATCH_SIZE = 64
+UPSERT_BATCH_SIZE = 256
+SOURCE_FILES = ("structured_data.json", "page.html")
+CHUNK_TYPES = {"structured_data.json": "menu_json", "page.html": "page_text"}
+# Restaurants are spread over this many partitions by the `restaurant` partition key.
+NUM_PARTITIONS = int(os.getenv("KB_NUM_PARTITIONS", "64"))
+MANIFEST_PATH = os.getenv("INGEST_MANIFEST", os.path.join(DATA_DIR, "ingest_manifest.json"))
+# The local vector index keeps its own manifest, so switching backends never skips a restaurant.
+LOCAL_MANIFEST_PATH = os.getenv("LOCAL_INGEST_MANIFEST", VECTOR_INDEX_DIR.rstrip(os.sep) + ".manifest.json")
+
+# Changing any of these invalidates every stored chunk.
+PIPELINE_CONFIG = {
+    "model": EMBEDDING_MODEL_NAME,
+    "backend": EMBEDDING_BACKEND if EMBEDDING_BACKEND == "torch" else f"{EMBEDDING_BACKEND}:{ONNX_MODEL_FILE}",
+    "chunk_size": CHUNK_SIZE,
+    "chunk_overlap": CHUNK_OVERLAP,
+    "sources": SOURCE_FILES,
+    "schema": 2,
+}
+
+
+def restaurant_hash(folder_path: str) -> str:
+    """
+    Hashes the source files of one restaurant folder together with the pipeline config.
+
+    Args:
+        folder_path (str): Restaurant folder.
+
+    Returns:
+        str: Hex digest that changes whenever a re-embed is needed.
+    """
+    digest = hashlib.sha256(json.dumps(PIPELINE_CONFIG, sort_keys=True).encode())
+    for name in SOURCE_FILES:
+        path = os.path.join(folder_path, name)
+        if not os.path.isfile(path):
+            continue
+        digest.update(name.encode())
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, index: int, content: str) -> int:
+    """Deterministic positive int64 primary key for a chunk."""
+    digest = hashlib.blake2b(f"{source}\x00{index}\x00{content}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def html_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup
+
+    return BeautifulSoup(html, "html.parser").get_text(separator="\n", strip=True)
+
+
+def parse_restaurant(folder_path: str) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Reads and chunks one restaurant folder. Runs inside a worker process.
+
+    The JSON file is used verbatim and the HTML is reduced to its visible text,
+    as the notebook's `process_folder` did. Each file is split on its own so
+    every chunk carries its restaurant, source file and chunk type.
+
+    Args:
+        folder_path (str): Restaurant folder.
+
+    Returns:
+        Tuple[str, List[Dict[str, str]]]: Folder name and its chunks with metadata.
+    """
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    source = os.path.basename(folder_path)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = []
+    for name in SOURCE_FILES:
+        path = os.path.join(folder_path, name)
+        if not os.path.isfile(path):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+            content = html_to_text(content) if name.endswith(".html") else content.strip()
+        except Exception as e:
+            print(f"Error reading file {path}: {e}")
+            continue
+        if not content:
+            continue
+        for text in splitter.split_text(content):
+            chunks.append({
+                "content": text,
+                "restaurant": source,
+                "source_file": name,
+                "chunk_type": CHUNK_TYPES.get(name, "text"),
+            })
+    return source, chunks
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"restaurants": {}}
+
+
+def save_manifest(manifest: Dict[str, Any], path: str) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def corpus_version(manifest: Dict[str, Any]) -> str:
+    """Digest of the manifest: changes exactly when some restaurant's chunks or the pipeline config changed."""
+    hashes = sorted((name, entry["hash"]) for name, entry in manifest["restaurants"].items())
+    return hashlib.sha256(json.dumps(hashes).encode("utf-8")).hexdigest()[:16]
+
+
+def ensure_collection(name: str = COLLECTION_NAME, rebuild: bool = False):
+    """
+    Returns the knowledge_base collection, creating it (and its index) if missing.
+
+    Primary keys are supplied by the pipeline rather than auto-generated so that
+    chunks can be upserted and deleted per restaurant. `restaurant` is the
+    partition key, so a search filtered on it only scans that restaurant's
+    partition; a key is used instead of one named partition per restaurant
+    because Milvus caps the number of named partitions per collection.
+    """
+    from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+
+    if rebuild and utility.has_collection(name):
+        utility.drop_collection(name)
+    if utility.has_collection(name):
+        collection = Collection(name)
+        if "restaurant" not in {field.name for field in collection.schema.fields}:
+            raise SystemExit(f"Collection '{name}' predates restaurant metadata; re-run with --rebuild.")
+    else:
+        fields = [
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=False),
+            FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=10000),
+            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=EMBEDDING_DIM),
+            FieldSchema(name="restaurant", dtype=DataType.VARCHAR, max_length=256, is_partition_key=True),
+            FieldSchema(name="source_file", dtype=DataType.VARCHAR, max_length=64),
+            FieldSchema(name="chunk_type", dtype=DataType.VARCHAR, max_length=32),
+        ]
+        schema = CollectionSchema(fields, description="Knowledge base embeddings")
+        collection = Collection(name=name, schema=schema, num_partitions=NUM_PARTITIONS)
+        index_params = {"index_type": "AUTOINDEX", "metric_type": "IP", "params": {}}
+        collection.create_index("embedding", index_params)
+    return collection
+
+
+def _checkpoint(collection, manifest: Dict[str, Any], manifest_path: str) -> None:
+    # Collections that only persist on flush (the local vector index) build their
+    # index once at the end of the run; their manifest is saved only after that
+    # flush succeeds, so it never lists chunks the store does not hold.
+    if not getattr(collection, "buffers_writes", False):
+        save_manifest(manifest, manifest_path)
+
+
+def _delete_ids(collection, ids: Sequence[int]) -> None:
+    for start in range(0, len(ids), UPSERT_BATCH_SIZE):
+        batch = list(ids[start:start + UPSERT_BATCH_SIZE])
+        collection.delete(expr=f"id in {batch}")
+
+
+def upsert_chunks(
+    collection,
+    source: str,
+    chunks: Sequence[Dict[str, str]],
+    embed_fn: Callable[[Sequence[str]], List[List[float]]],
+) -> List[int]:
+    """
+    Embeds and upserts one restaurant's chunks in bounded batches.
+
+    Args:
+        collection: Milvus collection (or an in-process stand-in).
+        source (str): Restaurant folder name.
+        chunks (Sequence[Dict[str, str]]): Chunks from `parse_restaurant`.
+        embed_fn (Callable): Batch embedding function.
+
+    Returns:
+        List[int]: Primary keys of the stored chunks.
+    """
+    ids = [chunk_id(source, i, chunk["content"]) for i, chunk in enumerate(chunks)]
+    rows: List[Dict[str, Any]] = []
+    for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+        batch = chunks[start:start + EMBED_BATCH_SIZE]
+        vectors = embed_fn([chunk["content"] for chunk in batch])
+        for offset, (chunk, vector) in enumerate(zip(batch, vectors)):
+            rows.append({"id": ids[start + offset], **chunk, "embedding": list(vector)})
+        while len(rows) >= UPSERT_BATCH_SIZE:
+            collection.upsert(rows[:UPSERT_BATCH_SIZE])
+            rows = rows[UPSERT_BATCH_SIZE:]
+    if rows:
+        collection.upsert(rows)
+    return ids
+
+
+def build_lexical_index(
+    data_dir: str = DATA_DIR,
+    workers: Optional[int] = None,
+    parsed: Optional[Dict[str, List[Dict[str, str]]]] = None,
+    previous: Optional[BM25Index] = None,
+    expected_ids: Optional[Dict[str, Sequence[int]]] = None,
+) -> BM25Index:
+    """
+    Builds the BM25 index over every chunk of the data directory.
+
+    Chunk ids are computed exactly as `upsert_chunks` does, so lexical and
+    vector hits for the same chunk can be fused. A restaurant's chunks are
+    taken from `previous` when their ids there are exactly `expected_ids`
+    (ids hash the chunk content), so only the restaurants that changed are
+    parsed again.
+
+    Args:
+        data_dir (str): Scraped data directory.
+        workers (int): Parser processes; defaults to the CPU count, 1 parses in-process.
+        parsed (Dict[str, List[Dict[str, str]]]): Chunks already parsed in this
+            run, by restaurant folder name; only the other folders are parsed.
+        previous (BM25Index): The index saved by an earlier run, if any.
+        expected_ids (Dict[str, Sequence[int]]): Chunk ids each restaurant
+            should have, from the ingest manifest.
+
+    Returns:
+        BM25Index: The in-memory index.
+    """
+    sources = [name for name in sorted(os.listdir(data_dir)) if os.path.isdir(os.path.join(data_dir, name))]
+    rows_by_source = {source: _lexical_rows(source, chunks) for source, chunks in (parsed or {}).items()}
+    if previous is not None and expected_ids is not None:
+        for source, rows in previous.chunks(exclude=rows_by_source).items():
+            if source in expected_ids and [row["id"] for row in rows] == list(expected_ids[source]):
+                rows_by_source[source] = rows
+    missing = [os.path.join(data_dir, name) for name in sources if name not in rows_by_source]
+    if workers == 1:
+        rows_by_source.update((source, _lexical_rows(source, chunks)) for source, chunks in map(parse_restaurant, missing))
+    elif missing:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rows_by_source.update((source, _lexical_rows(source, chunks)) for source, chunks in pool.map(parse_restaurant, missing))
+    return BM25Index.build(row for source in sources for row in rows_by_source.get(source, ()))
+
+
+def _lexical_rows(source: str, chunks: Sequence[Dict[str, str]]) -> List[Dict[str, Any]]:
+    return [{"id": chunk_id(source, i, chunk["content"]), **chunk} for i, chunk in enumerate(chunks)]
+
+
+def _previous_lexical_index(lexical_dir: str) -> Optional[BM25Index]:
+    if not exists(lexical_dir):
+        return None
+    try:
+        return BM25Index.load(lexical_dir)
+    except (OSError, ValueError) as e:
+        print("Previous lexical index unreadable, rebuilding it from the data:", e)
+        return None
+
+
+def ingest(
+    collection,
+    embed_fn: Callable[[Sequence[str]], List[List[float]]],
+    data_dir: str = DATA_DIR,
+    manifest_path: str = MANIFEST_PATH,
+    workers: Optional[int] = None,
+    force: bool = False,
+    lexical_dir: Optional[str] = LEXICAL_INDEX_DIR,
+    menu_dir: Optional[str] = MENU_STORE_DIR,
+    version_path: Optional[str] = CORPUS_VERSION_PATH,
+) -> Dict[str, Any]:
+    """
+    Brings the collection in line with the scraped data directory.
+
+    Unchanged restaurants are skipped, changed ones are re-chunked in a
+    process pool and re-embedded, and chunks of removed restaurants are
+    deleted. With Milvus the manifest is saved after every restaurant so an
+    interrupted run resumes where it stopped; the local vector index is
+    written once by the final flush and the manifest saved after it. When
+    anything changed (or no lexical index exists yet) the BM25 index is
+    rebuilt and saved to `lexical_dir`; unchanged restaurants' chunks are
+    read back from the previous index rather than parsed again. The menu store in `menu_dir` is
+    rebuilt when it no longer matches the data.
+
+    Args:
+        collection: Milvus collection (or an in-process stand-in).
+        embed_fn (Callable): Batch embedding function producing normalized vectors.
+        data_dir (str): Scraped data directory.
+        manifest_path (str): Where the content-hash manifest is kept.
+        workers (int): Parser processes; defaults to the CPU count.
+        force (bool): Re-ingest every restaurant regardless of the manifest.
+        lexical_dir (str): Where the BM25 index is saved; None to skip it.
+        menu_dir (str): Where the menu store is saved; None to skip it.
+        version_path (str): Where the corpus version that running servers
+            invalidate their query cache on is written; None to skip it.
+
+    Returns:
+        Dict[str, Any]: Run summary.
+    """
+    started = time.perf_counter()
+    manifest = {"restaurants": {}} if force else load_manifest(manifest_path)
+    known = manifest["restaurants"]
+
+    folders = {
+        name: os.path.join(data_dir, name)
+        for name in sorted(os.listdir(data_dir))
+        if os.path.isdir(os.path.join(data_dir, name))
+    }
+    hashes = {name: restaurant_hash(path) for name, path in folders.items()}
+    changed = [name for name in folders if known.get(name, {}).get("hash") != hashes[name]]
+    removed = [name for name in known if name not in folders]
+
+    for name in removed:
+        _delete_ids(collection, known[name]["ids"])
+        del known[name]
+        _checkpoint(collection, manifest, manifest_path)
+
+    chunk_count = 0
+    parsed: Dict[str, List[Dict[str, str]]] = {}
+    if changed:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(parse_restaurant, folders[name]) for name in changed]
+            for future in as_completed(futures):
+                source, chunks = future.result()
+                parsed[source] = chunks
+                ids = upsert_chunks(collection, source, chunks, embed_fn)
+                stale = sorted(set(known.get(source, {}).get("ids", [])) - set(ids))
+                _delete_ids(collection, stale)
+                known[source] = {"hash": hashes[source], "ids": ids}
+                _checkpoint(collection, manifest, manifest_path)
+                chunk_count += len(chunks)
+                print(f"Ingested {len(chunks)} chunks for {source}")
+
+    collection.flush()
+    save_manifest(manifest, manifest_path)
+    version = corpus_version(manifest)
+    if version_path:
+        write_corpus_version(version, version_path)
+
+    lexical_rebuilt = bool(lexical_dir and (changed or removed or not exists(lexical_dir)))
+    if lexical_rebuilt:
+        expected_ids = {name: entry["ids"] for name, entry in known.items()}
+        previous = _previous_lexical_index(lexical_dir)
+        build_lexical_index(data_dir, workers, parsed, previous, expected_ids).save(lexical_dir)
+    menu_rebuilt = bool(menu_dir and (force or not is_fresh(menu_dir, data_dir)))
+    if menu_rebuilt:
+        build_menu_store(data_dir, menu_dir)
+    return {
+        "restaurants": len(folders),
+        "changed": len(changed),
+        "removed": len(removed),
+        "skipped": len(folders) - len(changed),
+        "chunks_embedded": chunk_count,
+        "lexical_index_rebuilt": lexical_rebuilt,
+        "menu_store_rebuilt": menu_rebuilt,
+        "corpus_version": version,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest scraped restaurant data into Milvus or the local vector index.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--backend", choices=("milvus", "local"), default=VECTOR_BACKEND)
+    parser.add_argument("--manifest", default=None, help="Defaults to the backend's own manifest.")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--rebuild", action="store_true", help="Drop the collection and re-ingest everything.")
+    parser.add_argument("--lexical-dir", default=LEXICAL_INDEX_DIR, help="Where the BM25 index is written.")
+    parser.add_argument("--menu-dir", default=MENU_STORE_DIR, help="Where the columnar menu store is written.")
+    parser.add_argument("--vector-dir", default=VECTOR_INDEX_DIR, help="Local backend: where the vector index is written.")
+    parser.add_argument("--dtype", choices=("float16", "float32"), default=VECTOR_INDEX_DTYPE, help="Local backend: vector storage type.")
+    parser.add_argument("--nlist", type=int, default=VECTOR_INDEX_NLIST, help="Local backend: IVF lists, 0 for exact search.")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    from embedding import load_embedding_model, make_embed_fn
+
+    load_dotenv()
+    if args.backend == "local":
+        from vector_store import LocalVectorWriter
+
+        collection = LocalVectorWriter(args.vector_dir, args.dtype, args.nlist, rebuild=args.rebuild)
+        manifest_path = args.manifest or LOCAL_MANIFEST_PATH
+    else:
+        from pymilvus import connections
+
+        connections.connect("default", uri=os.getenv("MILVUS_URI"), token=os.getenv("MILVUS_TOKEN"))
+        collection = ensure_collection(rebuild=args.rebuild)
+        manifest_path = args.manifest or MANIFEST_PATH
+
+    embed_fn = make_embed_fn(load_embedding_model(), normalize=True)
+
+    summary = ingest(collection, embed_fn, args.data_dir, manifest_path, args.workers, force=args.rebuild,
+                     lexical_dir=args.lexical_dir, menu_dir=args.menu_dir)
+    collection.load()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
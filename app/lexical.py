@@ -0,0 +1,265 @@
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from arraystore import decode_string, encode_strings, fixed_width, load_arrays, save_arrays
+
+LEXICAL_INDEX_DIR = os.getenv(
+    "LEXICAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "indexes", "lexical"),
+)
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Longer tokens are truncated so the vocabulary fits a narrow fixed-width array.
+MAX_TERM_LENGTH = 32
+FORMAT_VERSION = 1
+ARRAY_NAMES = (
+    "terms", "idf", "offsets", "doc_ids", "tfs",
+    "length_norm", "chunk_ids", "restaurant_ids", "restaurants", "content_offsets", "content",
+)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "by", "can", "cost", "do", "does", "for", "from", "get",
+    "have", "how", "i", "in", "is", "it", "me", "much", "my", "of", "on", "or", "please", "tell",
+    "that", "the", "their", "there", "they", "this", "to", "what", "where", "which", "with", "you",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercases and splits text into index terms.
+
+    Stopwords are dropped and a trailing plural "s" is stripped, so "burgers"
+    and "burger" share a term.
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall((text or "").lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token[:MAX_TERM_LENGTH])
+    return terms
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the knowledge_base chunks.
+
+    Everything is stored as flat NumPy arrays: the sorted vocabulary as a
+    fixed-width byte array (looked up with `searchsorted`), postings in CSR
+    form (`offsets` into `doc_ids`/`tfs`), per-term IDF and per-document
+    length normalization precomputed at build time, and chunk texts as one
+    UTF-8 byte blob with offsets. Saved indexes are opened with
+    `mmap_mode="r"`, so loading is a few `open` calls and every worker
+    process shares the same page-cache copy.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.k1 = float(meta.get("k1", BM25_K1))
+        self._restaurant_ids_by_source = {
+            source.decode("utf-8"): i for i, source in enumerate(self.restaurants.tolist())
+        }
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.chunk_ids)
+
+    @classmethod
+    def build(cls, rows: Iterable[Dict[str, Any]], k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        """
+        Builds the index in memory.
+
+        Args:
+            rows (Iterable[Dict[str, Any]]): Chunks with `id`, `content` and `restaurant`.
+            k1 (float): Term frequency saturation.
+            b (float): Document length normalization strength.
+
+        Returns:
+            BM25Index: The index.
+        """
+        chunk_ids: List[int] = []
+        restaurants: List[str] = []
+        contents: List[str] = []
+        doc_terms: List[Counter] = []
+        for row in rows:
+            chunk_ids.append(int(row["id"]))
+            restaurants.append(row.get("restaurant") or "")
+            contents.append(row.get("content") or "")
+            doc_terms.append(Counter(tokenize(row.get("content") or "")))
+
+        vocabulary = sorted({term for counts in doc_terms for term in counts})
+        term_ids = {term: i for i, term in enumerate(vocabulary)}
+        postings: List[List[int]] = [[] for _ in vocabulary]
+        frequencies: List[List[int]] = [[] for _ in vocabulary]
+        for doc, counts in enumerate(doc_terms):
+            for term, tf in counts.items():
+                postings[term_ids[term]].append(doc)
+                frequencies[term_ids[term]].append(tf)
+
+        num_docs = len(chunk_ids)
+        doc_lengths = np.array([sum(counts.values()) for counts in doc_terms], dtype=np.float32)
+        avgdl = float(doc_lengths.mean()) if num_docs and doc_lengths.sum() else 1.0
+        df = np.array([len(p) for p in postings], dtype=np.float32)
+        source_names = sorted(set(restaurants))
+        source_ids = {source: i for i, source in enumerate(source_names)}
+        content_offsets, content = encode_strings(contents)
+
+        arrays = {
+            "terms": fixed_width(vocabulary),
+            "idf": np.log1p((num_docs - df + 0.5) / (df + 0.5)).astype(np.float32),
+            "offsets": np.cumsum([0] + [len(p) for p in postings], dtype=np.int64),
+            "doc_ids": np.array([d for p in postings for d in p], dtype=np.int32),
+            "tfs": np.minimum([f for fs in frequencies for f in fs], np.iinfo(np.uint16).max).astype(np.uint16),
+            "length_norm": (k1 * (1 - b + b * doc_lengths / avgdl)).astype(np.float32),
+            "chunk_ids": np.array(chunk_ids, dtype=np.int64),
+            "restaurant_ids": np.array([source_ids[r] for r in restaurants], dtype=np.int32),
+            "restaurants": fixed_width(source_names),
+            "content_offsets": content_offsets,
+            "content": content,
+        }
+        meta = {"version": FORMAT_VERSION, "k1": k1, "b": b, "avgdl": avgdl, "num_docs": num_docs, "num_terms": len(vocabulary)}
+        return cls(arrays, meta)
+
+    def save(self, directory: str = LEXICAL_INDEX_DIR) -> None:
+        """Writes the index to `directory` (see `arraystore.save_arrays`)."""
+        save_arrays(directory, {name: getattr(self, name) for name in ARRAY_NAMES}, self.meta)
+
+    @classmethod
+    def load(cls, directory: str = LEXICAL_INDEX_DIR, mmap: bool = True) -> "BM25Index":
+        """
+        Opens a saved index.
+
+        Args:
+            directory (str): Directory written by `save`.
+            mmap (bool): Memory-map the arrays instead of reading them into memory.
+
+        Returns:
+            BM25Index: The index.
+        """
+        arrays, meta = load_arrays(directory, ARRAY_NAMES, mmap)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Lexical index at {directory} has format {meta.get('version')}, expected {FORMAT_VERSION}.")
+        return cls(arrays, meta)
+
+    def content_of(self, doc: int) -> str:
+        return decode_string(self.content_offsets, self.content, doc)
+
+    def chunks(self, exclude: Iterable[str] = ()) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Returns the indexed chunks by restaurant, in index order, as rows for `build`.
+
+        Args:
+            exclude (Iterable[str]): Restaurants whose chunks are not needed.
+
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: Rows with `id`, `content` and `restaurant`.
+        """
+        sources = [source.decode("utf-8") for source in self.restaurants.tolist()]
+        skipped = set(exclude)
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for doc, (chunk, rid) in enumerate(zip(self.chunk_ids.tolist(), self.restaurant_ids.tolist())):
+            source = sources[rid]
+            if source not in skipped:
+                grouped.setdefault(source, []).append({"id": chunk, "content": self.content_of(doc), "restaurant": source})
+        return grouped
+
+    def search(
+        self,
+        query: str,
+        limit: int = 10,
+        restaurant: Optional[str] = None,
+        ignore_terms: Iterable[str] = (),
+    ) -> List[Dict[str, Any]]:
+        """
+        Ranks chunks against a query with BM25.
+
+        Args:
+            query (str): Free-text query.
+            limit (int): Maximum number of hits.
+            restaurant (str): Only rank chunks of this restaurant (data folder name).
+            ignore_terms (Iterable[str]): Query terms to leave out, e.g. the
+                restaurant's own name once the search is scoped to it.
+
+        Returns:
+            List[Dict[str, Any]]: Hits with `id`, `score`, `content` and
+            `restaurant`, best first, in the same shape as vector search hits.
+        """
+        scores = self.scores(query, restaurant, ignore_terms)
+        if scores is None:
+            return []
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [
+            {
+                "id": int(self.chunk_ids[doc]),
+                "score": float(scores[doc]),
+                "content": self.content_of(doc),
+                "restaurant": self.restaurants[self.restaurant_ids[doc]].decode("utf-8"),
+            }
+            for doc in candidates.tolist()
+        ]
+
+    def scores(self, query: str, restaurant: Optional[str] = None, ignore_terms: Iterable[str] = ()) -> Optional[np.ndarray]:
+        """Returns the BM25 score of every chunk, or None when no query term is in the vocabulary."""
+        ignored = set(ignore_terms)
+        terms = [t for t in dict.fromkeys(tokenize(query)) if t not in ignored and len(t) <= self.terms.dtype.itemsize]
+        if not terms or not len(self.terms):
+            return None
+        keys = np.array([t.encode("ascii") for t in terms], dtype=self.terms.dtype)
+        positions = np.searchsorted(self.terms, keys)
+        found = positions < len(self.terms)
+        found[found] = self.terms[positions[found]] == keys[found]
+        if not found.any():
+            return None
+
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in positions[found].tolist():
+            start, end = int(self.offsets[term]), int(self.offsets[term + 1])
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            # Documents are unique within a posting list, so fancy-index accumulation is safe.
+            scores[docs] += self.idf[term] * tf * (self.k1 + 1) / (tf + self.length_norm[docs])
+        if restaurant is not None:
+            rid = self._restaurant_ids_by_source.get(restaurant)
+            if rid is None:
+                return None
+            scores[self.restaurant_ids != rid] = 0
+        return scores
+
+
+def reciprocal_rank_fusion(result_lists: Iterable[List[Dict[str, Any]]], k: int = 60) -> List[Dict[str, Any]]:
+    """
+    Merges ranked hit lists by reciprocal rank fusion.
+
+    Each hit scores the sum of 1 / (k + rank) over the lists it appears in,
+    so raw BM25 and inner-product scores never need to be calibrated against
+    each other. Hits are matched by `id`, falling back to `content`.
+
+    Args:
+        result_lists (Iterable[List[Dict[str, Any]]]): Ranked hits, best first.
+        k (int): Rank smoothing constant; 60 is the value from the original paper.
+
+    Returns:
+        List[Dict[str, Any]]: Distinct hits with the fused `score`, best first.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for hits in result_lists:
+        for rank, hit in enumerate(hits, start=1):
+            key = hit.get("id", hit.get("content"))
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {**hit, "score": 0.0}
+            elif not entry.get("restaurant") and hit.get("restaurant"):
+                entry["restaurant"] = hit["restaurant"]
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda h: h["score"], reverse=True)
@@ -0,0 +1,269 @@
+import asyncio
+import collections
+import math
+import os
+import random
+import time
+from typing import Any, Callable, Deque, Dict, Optional, Sequence
+
+from tracing import METRICS_ENABLED, metrics
+
+# Gemini calls in flight at once per worker; further calls queue.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Calls allowed to wait for a slot; beyond this new calls (and /agent requests) get a 429.
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "8"))
+# Route calls to `llm2` when the primary is saturated or keeps failing; 0 disables.
+LLM_FALLBACK_CONCURRENCY = int(os.getenv("LLM_FALLBACK_CONCURRENCY", "4"))
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Provider exception types (google.api_core, httpx, openai-style clients) that mean "try again".
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "InternalServerError",
+    "TooManyRequests", "RateLimitError", "APITimeoutError", "APIConnectionError",
+    "ReadTimeout", "ConnectTimeout", "RemoteProtocolError",
+}
+
+
+class LLMOverloaded(Exception):
+    """Raised when the call queue is full; the server answers 429 with `retry_after`."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMUnavailable(Exception):
+    """Raised when every attempt (retries and fallback) failed; the server answers 503 with `retry_after`."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for timeouts, connection errors, rate limits and 5xx responses, looking through wrapped causes."""
+    seen = 0
+    while error is not None and seen < 5:
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+            return True
+        status = getattr(error, "status_code", None) or getattr(error, "code", None)
+        if isinstance(status, int) and status in RETRYABLE_STATUS_CODES:
+            return True
+        if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+            return True
+        error = error.__cause__ or error.__context__
+        seen += 1
+    return False
+
+
+class _Pool:
+    __slots__ = ("name", "model", "limit", "running")
+
+    def __init__(self, name: str, model: Any, limit: int):
+        self.name = name
+        self.model = model
+        self.limit = limit
+        self.running = 0
+
+
+class LLMClient:
+    """
+    Shared front end for the chat models used by the graph nodes.
+
+    Admission: a call runs on the primary model when one of its
+    `max_concurrency` slots is free, otherwise on the fallback model (`llm2`)
+    when that has a free slot, otherwise it waits in a FIFO queue of at most
+    `max_queue` calls for the next released slot of either model. A call
+    that finds the queue full, or waits longer than `queue_timeout`, raises
+    `LLMOverloaded` with a Retry-After estimate from the recent call latency.
+
+    Each attempt is bounded by `timeout`. Timeouts, rate limits and 5xx
+    errors are retried up to `max_retries` times with full-jitter exponential
+    backoff; when the primary still fails the call is tried once on the
+    fallback, then `LLMUnavailable` is raised. A retried streaming call
+    re-streams from the start.
+
+    Slot bookkeeping happens on the event loop without awaits, so no lock is
+    needed; one client serves one worker process.
+    """
+
+    def __init__(
+        self,
+        primary: Any,
+        fallback: Optional[Callable[[], Any]] = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        fallback_concurrency: int = LLM_FALLBACK_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_base: float = LLM_RETRY_BASE_SECONDS,
+        retry_max: float = LLM_RETRY_MAX_SECONDS,
+    ):
+        self._primary = _Pool("primary", primary, max_concurrency)
+        self._fallback_factory = fallback if fallback_concurrency > 0 else None
+        self._fallback: Optional[_Pool] = None
+        self._fallback_concurrency = fallback_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        self._latency = 2.0  # running mean of successful call seconds, seeded with a typical Gemini call
+        self._counts: Dict[str, int] = collections.Counter()
+
+    # Admission ------------------------------------------------------------
+
+    def _fallback_pool(self) -> Optional[_Pool]:
+        if self._fallback is None and self._fallback_factory is not None:
+            try:
+                self._fallback = _Pool("fallback", self._fallback_factory(), self._fallback_concurrency)
+            except Exception as e:
+                print("LLM fallback unavailable:", e)
+                self._fallback_factory = None
+        return self._fallback
+
+    def retry_after(self) -> int:
+        """Seconds until a queued call would likely get a slot."""
+        slots = self._primary.limit + (self._fallback.limit if self._fallback else 0)
+        return max(1, math.ceil(self._latency * (len(self._waiters) / max(slots, 1) + 1)))
+
+    def check_admission(self) -> None:
+        """Raises `LLMOverloaded` when a new call would be rejected; lets the server refuse work up front."""
+        if len(self._waiters) >= self.max_queue:
+            self._count("rejected")
+            raise LLMOverloaded("LLM queue is full", self.retry_after())
+
+    def _try_acquire(self, pool: Optional[_Pool]) -> bool:
+        if pool is not None and pool.running < pool.limit:
+            pool.running += 1
+            return True
+        return False
+
+    async def _acquire(self) -> _Pool:
+        if self._try_acquire(self._primary):
+            self._count("admitted")
+            return self._primary
+        fallback = self._fallback_pool()
+        if self._try_acquire(fallback):
+            self._count("fallback_saturated")
+            return fallback
+        self.check_admission()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._count("queued")
+        try:
+            done, _ = await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not done:
+            self._abandon(waiter)
+            self._count("rejected")
+            raise LLMOverloaded(f"No LLM slot within {self.queue_timeout:.0f}s", self.retry_after())
+        return waiter.result()
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        if waiter.done() and not waiter.cancelled():
+            # The slot was handed over just as the caller gave up; pass it on.
+            self._release(waiter.result())
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _release(self, pool: _Pool) -> None:
+        # Hand the slot straight to the longest waiting call, if any.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(pool)
+                return
+        pool.running -= 1
+
+    # Calls ---------------------------------------------------------------
+
+    async def ainvoke(self, messages: Sequence[Any], node: str = "llm", tools: Optional[Sequence[Any]] = None) -> Any:
+        """
+        Runs one chat completion under admission control, timeouts and retries.
+
+        Args:
+            messages (Sequence): Chat messages.
+            node (str): Calling graph node, for metrics.
+            tools (Sequence): Tools to bind for tool-calling models.
+
+        Returns:
+            The model's response message.
+        """
+        pool = await self._acquire()
+        try:
+            return await self._attempts(pool, messages, node, tools)
+        except LLMUnavailable:
+            fallback = self._fallback_pool() if pool is self._primary else None
+            if not self._try_acquire(fallback):
+                raise
+        finally:
+            self._release(pool)
+
+        # The primary used up its retries: one last attempt on the fallback.
+        self._count("fallback_error")
+        try:
+            return await self._attempts(fallback, messages, node, tools, retries=0)
+        finally:
+            self._release(fallback)
+
+    async def _attempts(self, pool: _Pool, messages, node: str, tools, retries: Optional[int] = None) -> Any:
+        model = pool.model.bind_tools(tools) if tools else pool.model
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(model.ainvoke(messages), self.timeout)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                reason = "timeout" if isinstance(e, (asyncio.TimeoutError, TimeoutError)) else type(e).__name__
+                self._counts["retries"] += 1
+                if METRICS_ENABLED:
+                    metrics.inc("llm_retries_total", node=node, model=pool.name, reason=reason)
+                if attempt == retries:
+                    raise LLMUnavailable(f"LLM call failed after {attempt + 1} attempt(s) on the {pool.name} model: {e}", self.retry_after()) from e
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+            self._latency = 0.9 * self._latency + 0.1 * (time.perf_counter() - started)
+            return response
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        """Full-jitter exponential backoff, never shorter than a Retry-After the provider sent."""
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt))
+        hinted = getattr(error, "retry_after", None)
+        if isinstance(hinted, (int, float)):
+            delay = max(delay, min(float(hinted), self.retry_max))
+        return delay
+
+    def _count(self, outcome: str) -> None:
+        self._counts[outcome] += 1
+        if METRICS_ENABLED:
+            metrics.inc("llm_admission_total", outcome=outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns slot usage, queue length and admission/retry counters."""
+        pools = [self._primary] + ([self._fallback] if self._fallback else [])
+        return {
+            "running": {pool.name: pool.running for pool in pools},
+            "limits": {pool.name: pool.limit for pool in pools},
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "mean_call_seconds": round(self._latency, 3),
+            "counts": dict(self._counts),
+        }
@@ -0,0 +1,618 @@
+import difflib
+import hashlib
+import json
+import os
+import re
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from arraystore import decode_strings, load_arrays
+
+DATA_DIR = os.getenv(
+    "ZOMATO_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "zomato_scraped_data"),
+)
+# Columnar menu store written by preprocess.py.
+MENU_STORE_DIR = os.getenv(
+    "MENU_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "indexes", "menu"),
+)
+MENU_STORE_VERSION = 1
+MENU_STORE_ARRAYS = (
+    "restaurant_ids", "price", "veg", "bestseller", "category", "dietary", "spice_level",
+    "name_offsets", "names", "normalized_name_offsets", "normalized_names",
+    "description_offsets", "descriptions", "ingredient_offsets", "ingredients",
+    "by_price", "by_category",
+    "row_offsets", "min_price", "max_price", "veg_count", "non_veg_count",
+    "info_offsets", "info",
+)
+
+# Words that appear in many restaurant names and say nothing about which one is meant.
+GENERIC_NAME_WORDS = {
+    "cafe", "restaurant", "hotel", "the", "and", "of", "multi", "cuisine", "house",
+    "since", "indo", "arabic", "no", "sugar", "royal", "inn", "grand",
+}
+
+# Misspelled query tokens whose close restaurant-name tokens are remembered.
+MAX_CLOSE_TOKENS = 4096
+
+# Longest dish name, in words, that `mentioned_items` looks for.
+MAX_NAME_WORDS = 6
+
+CATEGORY_ALIASES = {
+    "starter": "appetizer",
+    "starters": "appetizer",
+    "appetizers": "appetizer",
+    "main": "main_course",
+    "mains": "main_course",
+    "main course": "main_course",
+    "desserts": "dessert",
+    "sweets": "dessert",
+    "drinks": "beverage",
+    "beverages": "beverage",
+}
+
+
+def normalize_name(text: str) -> str:
+    return re.sub(r"[^a-z0-9\s]", "", (text or "").lower().replace("&", " and ")).strip()
+
+
+def restaurant_info(source: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """The restaurant-level fields kept from a structured_data.json."""
+    info = data.get("restaurant") or {}
+    address = info.get("address") or {}
+    rating = info.get("aggregateRating") or {}
+    return {
+        "name": info.get("name") or source,
+        "source": source,
+        "address": address.get("streetAddress") if isinstance(address, dict) else address,
+        "telephone": info.get("telephone"),
+        "openingHours": info.get("openingHours"),
+        "servesCuisine": info.get("servesCuisine"),
+        "rating": rating.get("ratingValue") if isinstance(rating, dict) else rating,
+        "ratingCount": rating.get("ratingCount") if isinstance(rating, dict) else None,
+    }
+
+
+def data_fingerprint(data_dir: str = DATA_DIR) -> str:
+    """Hashes the names, sizes and mtimes of every structured_data.json, to tell whether a menu store is stale."""
+    digest = hashlib.sha256()
+    for folder in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, folder, "structured_data.json")
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            digest.update(f"{folder}\x00{stat.st_size}\x00{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _column(typecode: str, values: np.ndarray) -> array:
+    column = array(typecode)
+    column.frombytes(np.ascontiguousarray(values, dtype=np.dtype(typecode)).tobytes())
+    return column
+
+
+class MenuIndex:
+    """
+    In-memory columnar index over every restaurant's `menu.hasMenuItem`.
+
+    Item attributes live in parallel `array` columns (one row per menu item,
+    rows grouped by restaurant), and per-restaurant price bounds, veg counts,
+    category buckets and price-sorted row orders are computed once at build
+    time, so structured lookups never touch the vector database.
+
+    `load` fills the columns straight from the store written by
+    preprocess.py; `from_directory` builds them from the JSON files.
+    """
+
+    def __init__(self):
+        self.restaurants: List[Dict[str, Any]] = []
+        self.categories: List[str] = []
+        self._category_ids: Dict[str, int] = {}
+        # Item columns.
+        self.restaurant_col = array("H")
+        self.price_col = array("i")
+        self.veg_col = array("b")          # 1 veg, 0 non-veg, -1 unknown
+        self.bestseller_col = array("b")
+        self.category_col = array("H")
+        self.names: List[str] = []
+        self.normalized_names: List[str] = []
+        self.descriptions: List[str] = []
+        # Per-restaurant aggregates, indexed by restaurant id.
+        self.row_ranges: List[range] = []
+        self.min_price = array("i")
+        self.max_price = array("i")
+        self.veg_count = array("I")
+        self.non_veg_count = array("I")
+        self.by_price: List[array] = []
+        self.category_rows: List[Dict[int, array]] = []
+        # Restaurant names and their short forms, word-normalized; looked up by query n-grams.
+        self._aliases: Dict[str, int] = {}
+        self._max_alias_words = 0
+        # Distinctive restaurant-name token -> ids of the restaurants whose name has it.
+        self._token_restaurants: Dict[str, List[int]] = {}
+        self._tokens_by_length: Dict[int, List[str]] = {}
+        self._close_tokens: Dict[Tuple[str, float], List[str]] = {}
+        self._sources: Dict[str, int] = {}
+        # Normalized dish name -> row, per restaurant, and -> rows across all restaurants.
+        self._rows_by_name: Dict[int, Dict[str, int]] = {}
+        self._rows_by_any_name: Dict[str, List[int]] = {}
+
+    @classmethod
+    def from_directory(cls, data_dir: str = DATA_DIR) -> "MenuIndex":
+        """
+        Builds the index from every `<restaurant>/structured_data.json` under `data_dir`.
+
+        Args:
+            data_dir (str): Scraped data directory.
+
+        Returns:
+            MenuIndex: The populated index.
+        """
+        index = cls()
+        for folder in sorted(os.listdir(data_dir)):
+            path = os.path.join(data_dir, folder, "structured_data.json")
+            if not os.path.isfile(path):
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Error loading {path}: {e}")
+                continue
+            index.add_restaurant(folder, data)
+        return index
+
+    @classmethod
+    def load(cls, directory: str = MENU_STORE_DIR) -> "MenuIndex":
+        """
+        Opens a menu store written by `preprocess.build_menu_store`.
+
+        Args:
+            directory (str): Store directory.
+
+        Returns:
+            MenuIndex: The populated index.
+        """
+        arrays, meta = load_arrays(directory, MENU_STORE_ARRAYS)
+        if meta.get("version") != MENU_STORE_VERSION:
+            raise ValueError(f"Menu store at {directory} has format {meta.get('version')}, expected {MENU_STORE_VERSION}.")
+        return cls.from_arrays(arrays, meta)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> "MenuIndex":
+        """
+        Builds the index from preprocessed columns (see `preprocess.preprocess_directory`).
+
+        Numeric columns are copied in bulk, the precomputed price and
+        category orders are sliced per restaurant, and only the string
+        columns and restaurant aliases are materialized as Python objects.
+
+        Args:
+            arrays (Dict[str, np.ndarray]): The MENU_STORE_ARRAYS columns.
+            meta (Dict[str, Any]): Store metadata with the category names.
+
+        Returns:
+            MenuIndex: The populated index.
+        """
+        index = cls()
+        index.categories = list(meta["categories"])
+        index._category_ids = {category: i for i, category in enumerate(index.categories)}
+        index.restaurant_col = _column("H", arrays["restaurant_ids"])
+        index.price_col = _column("i", arrays["price"])
+        index.veg_col = _column("b", arrays["veg"])
+        index.bestseller_col = _column("b", arrays["bestseller"])
+        index.category_col = _column("H", arrays["category"])
+        index.names = decode_strings(arrays["name_offsets"], arrays["names"])
+        index.normalized_names = decode_strings(arrays["normalized_name_offsets"], arrays["normalized_names"])
+        index.descriptions = decode_strings(arrays["description_offsets"], arrays["descriptions"])
+        index.min_price = _column("i", arrays["min_price"])
+        index.max_price = _column("i", arrays["max_price"])
+        index.veg_count = _column("I", arrays["veg_count"])
+        index.non_veg_count = _column("I", arrays["non_veg_count"])
+
+        row_offsets = arrays["row_offsets"].tolist()
+        by_price = np.asarray(arrays["by_price"], dtype=np.uint32)
+        by_category = np.asarray(arrays["by_category"], dtype=np.uint32)
+        category = np.asarray(arrays["category"])
+        for rid, info in enumerate(decode_strings(arrays["info_offsets"], arrays["info"])):
+            start, end = row_offsets[rid], row_offsets[rid + 1]
+            index.restaurants.append(json.loads(info))
+            index.row_ranges.append(range(start, end))
+            index.by_price.append(_column("I", by_price[start:end]))
+            # Rows of one restaurant stable-sorted by category: split where the category changes.
+            rows = by_category[start:end]
+            bounds = [0, *(np.flatnonzero(np.diff(category[rows])) + 1).tolist(), len(rows)]
+            index.category_rows.append({
+                int(category[rows[a]]): _column("I", rows[a:b]) for a, b in zip(bounds, bounds[1:]) if b > a
+            })
+            index._register_aliases(rid)
+            index._register_names(rid)
+            index._sources[index.restaurants[rid]["source"]] = rid
+        return index
+
+    def add_restaurant(self, source: str, data: Dict[str, Any]) -> int:
+        """
+        Appends one restaurant's structured data to the index.
+
+        Args:
+            source (str): Folder name the data came from.
+            data (Dict[str, Any]): Parsed structured_data.json.
+
+        Returns:
+            int: The restaurant id.
+        """
+        items = (data.get("menu") or {}).get("hasMenuItem", [])
+        rid = len(self.restaurants)
+        self.restaurants.append(restaurant_info(source, data))
+
+        start = len(self.names)
+        buckets: Dict[int, array] = {}
+        veg = non_veg = 0
+        for item in items:
+            row = len(self.names)
+            price = item.get("price")
+            price = int(price) if isinstance(price, (int, float)) else 0
+            is_veg = {"veg": 1, "non-veg": 0}.get(item.get("isVeg"), -1)
+            category = self._category_id(item.get("menu_category") or "other")
+            self.restaurant_col.append(rid)
+            self.price_col.append(price)
+            self.veg_col.append(is_veg)
+            self.bestseller_col.append(1 if item.get("isBestseller") else 0)
+            self.category_col.append(category)
+            self.names.append(item.get("name") or "")
+            self.normalized_names.append(item.get("normalized_name") or normalize_name(item.get("name")))
+            self.descriptions.append(item.get("description") or "")
+            buckets.setdefault(category, array("I")).append(row)
+            veg += is_veg == 1
+            non_veg += is_veg == 0
+
+        rows = range(start, len(self.names))
+        priced = [self.price_col[r] for r in rows if self.price_col[r] > 0]
+        self.row_ranges.append(rows)
+        self.min_price.append(min(priced) if priced else 0)
+        self.max_price.append(max(priced) if priced else 0)
+        self.veg_count.append(veg)
+        self.non_veg_count.append(non_veg)
+        self.by_price.append(array("I", sorted(rows, key=lambda r: self.price_col[r])))
+        self.category_rows.append(buckets)
+        self._register_aliases(rid)
+        self._register_names(rid)
+        self._sources[source] = rid
+        return rid
+
+    def restaurant_for_source(self, source: Optional[str]) -> Optional[int]:
+        """Returns the id of the restaurant ingested from a data folder, if known."""
+        return self._sources.get(source) if source else None
+
+    def find_item(self, restaurant: int, name: str) -> Optional[int]:
+        """
+        Finds a menu row of one restaurant by exact (normalized) dish name.
+
+        Args:
+            restaurant (int): Restaurant id.
+            name (str): Dish name as it appears in the scraped data.
+
+        Returns:
+            Optional[int]: The row id, or None.
+        """
+        return self._rows_by_name[restaurant].get(" ".join(normalize_name(name).split()))
+
+    def mentioned_items(self, text: str, restaurant: Optional[int] = None) -> List[int]:
+        """
+        Finds dishes named verbatim in a query, e.g. "how much is the McChicken".
+
+        Every run of up to MAX_NAME_WORDS consecutive words is looked up as an
+        exact (normalized) dish name; names shorter than four characters are
+        ignored.
+
+        Args:
+            text (str): Free-text query.
+            restaurant (int): Only match this restaurant's dishes.
+
+        Returns:
+            List[int]: Matching menu rows.
+        """
+        phrases = [phrase for phrase in _phrases(normalize_name(text).split(), MAX_NAME_WORDS) if len(phrase) >= 4]
+        rows = set()
+        if restaurant is not None:
+            names = self._rows_by_name[restaurant]
+            rows.update(names[phrase] for phrase in phrases if phrase in names)
+        else:
+            for phrase in phrases:
+                rows.update(self._rows_by_any_name.get(phrase, ()))
+        return sorted(rows)
+
+    def resolve_restaurant(self, text: str) -> Optional[int]:
+        """
+        Finds the restaurant a free-text name or query refers to.
+
+        Exact alias matches win; otherwise the restaurant sharing the most
+        distinctive name tokens with the text (allowing small misspellings
+        such as "Barakaas") is chosen.
+
+        Args:
+            text (str): Restaurant name or a whole query.
+
+        Returns:
+            Optional[int]: Restaurant id, or None if nothing matches.
+        """
+        words = normalize_name(text).split()
+        mentioned = self._mentioned_aliases(words)
+        if mentioned:
+            # The longest alias named wins, e.g. "royal cafe" over "royal".
+            return self._aliases[max(mentioned, key=len)]
+
+        tokens = [t for t in words if t not in GENERIC_NAME_WORDS]
+        scores: Dict[int, int] = {}
+        for token in tokens:
+            for rid in self._restaurants_for_token(token, cutoff=0.8):
+                scores[rid] = scores.get(rid, 0) + 1
+        if not scores:
+            return None
+        return min(scores, key=lambda rid: (-scores[rid], rid))
+
+    def find_restaurants(self, text: str) -> List[int]:
+        """
+        Lists every restaurant a query mentions, for telling single-restaurant
+        questions apart from comparisons.
+
+        Matching is stricter than `resolve_restaurant`: fuzzy matches need a
+        token of at least five characters, and tokens shorter than three are
+        ignored.
+
+        Args:
+            text (str): Free-text query.
+
+        Returns:
+            List[int]: Restaurant ids in id order.
+        """
+        words = normalize_name(text).split()
+        found = {self._aliases[alias] for alias in self._mentioned_aliases(words)}
+        tokens = [t for t in words if len(t) >= 3 and t not in GENERIC_NAME_WORDS]
+        for token in tokens:
+            found.update(self._restaurants_for_token(token, cutoff=0.85, fuzzy=len(token) >= 5))
+        return sorted(found)
+
+    def query(
+        self,
+        restaurant: Optional[int] = None,
+        veg: Optional[bool] = None,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        category: Optional[str] = None,
+        bestseller: Optional[bool] = None,
+        dish: Optional[str] = None,
+        sort_by_price: bool = False,
+        limit: Optional[int] = None,
+    ) -> List[int]:
+        """
+        Returns the row ids of menu items matching every given filter.
+
+        Args:
+            restaurant (int): Restaurant id; all restaurants if None.
+            veg (bool): True for veg only, False for non-veg only.
+            min_price (int): Inclusive lower price bound.
+            max_price (int): Inclusive upper price bound.
+            category (str): menu_category value (or a common alias like "starters").
+            bestseller (bool): Filter on the bestseller flag.
+            dish (str): Substring that must appear in the normalized dish name.
+            sort_by_price (bool): Sort ascending by price (cheapest first).
+            limit (int): Maximum number of rows to return.
+
+        Returns:
+            List[int]: Matching row ids.
+        """
+        restaurant_ids = [restaurant] if restaurant is not None else range(len(self.restaurants))
+        category_id = None
+        if category:
+            category = CATEGORY_ALIASES.get(category.lower().strip(), category.lower().strip())
+            category_id = self._category_ids.get(category)
+            if category_id is None:
+                return []
+        dish = normalize_name(dish) if dish else None
+        veg_flag = None if veg is None else int(veg)
+
+        rows: List[int] = []
+        for rid in restaurant_ids:
+            if max_price is not None and self.min_price[rid] > max_price:
+                continue
+            if min_price is not None and self.max_price[rid] < min_price:
+                continue
+            if category_id is not None:
+                candidates = self.category_rows[rid].get(category_id, ())
+            elif sort_by_price:
+                candidates = self.by_price[rid]
+            else:
+                candidates = self.row_ranges[rid]
+            for row in candidates:
+                price = self.price_col[row]
+                if veg_flag is not None and self.veg_col[row] != veg_flag:
+                    continue
+                if max_price is not None and price > max_price:
+                    continue
+                if min_price is not None and price < min_price:
+                    continue
+                if bestseller is not None and bool(self.bestseller_col[row]) != bestseller:
+                    continue
+                if dish and dish not in self.normalized_names[row]:
+                    continue
+                rows.append(row)
+
+        if sort_by_price:
+            rows.sort(key=lambda r: self.price_col[r])
+        return rows[:limit] if limit else rows
+
+    def price_range(self, restaurant: int) -> str:
+        return f"₹{self.min_price[restaurant]} - ₹{self.max_price[restaurant]}"
+
+    def item(self, row: int) -> Dict[str, Any]:
+        return {
+            "restaurant": self.restaurants[self.restaurant_col[row]]["name"],
+            "name": self.names[row],
+            "price": self.price_col[row],
+            "isVeg": {1: "veg", 0: "non-veg"}.get(self.veg_col[row], "unknown"),
+            "isBestseller": bool(self.bestseller_col[row]),
+            "menu_category": self.categories[self.category_col[row]],
+        }
+
+    def summary(self, restaurant: int) -> str:
+        """Formats the precomputed restaurant-level facts as compact text."""
+        info = self.restaurants[restaurant]
+        lines = [f"Restaurant: {info['name']}", f"Price range: {self.price_range(restaurant)}"]
+        for key, label in (
+            ("rating", "Rating"),
+            ("servesCuisine", "Cuisine"),
+            ("openingHours", "Opening hours"),
+            ("address", "Address"),
+            ("telephone", "Telephone"),
+        ):
+            if info.get(key):
+                lines.append(f"{label}: {info[key]}")
+        lines.append(f"Menu items: {len(self.row_ranges[restaurant])} "
+                     f"({self.veg_count[restaurant]} veg, {self.non_veg_count[restaurant]} non-veg)")
+        return "\n".join(lines)
+
+    def format_rows(self, rows: Sequence[int], include_restaurant: bool = True) -> str:
+        """Formats item rows as a compact pipe-separated table, optionally without the restaurant column."""
+        lines = ["Restaurant | Dish | Price | Veg | Bestseller | Category" if include_restaurant
+                 else "Dish | Price | Veg | Bestseller | Category"]
+        for row in rows:
+            item = self.item(row)
+            line = (f"{item['name']} | ₹{item['price']} | {item['isVeg']} | "
+                    f"{'yes' if item['isBestseller'] else 'no'} | {item['menu_category']}")
+            lines.append(f"{item['restaurant']} | {line}" if include_restaurant else line)
+        return "\n".join(lines)
+
+    def _category_id(self, category: str) -> int:
+        if category not in self._category_ids:
+            self._category_ids[category] = len(self.categories)
+            self.categories.append(category)
+        return self._category_ids[category]
+
+    def _register_aliases(self, rid: int) -> None:
+        name = self.restaurants[rid]["name"]
+        full = normalize_name(name)
+        aliases = {full, full.replace(" ", "")}
+        # "Royal Cafe - Royal Inn" -> "royal cafe"
+        head = normalize_name(re.split(r"\s[-–]\s", name)[0])
+        aliases.update({head, head.replace(" ", "")})
+        for alias in aliases:
+            alias = " ".join(alias.split())
+            if alias:
+                self._aliases.setdefault(alias, rid)
+                self._max_alias_words = max(self._max_alias_words, alias.count(" ") + 1)
+        for token in {t for t in full.split() if t not in GENERIC_NAME_WORDS}:
+            if token not in self._token_restaurants:
+                self._token_restaurants[token] = []
+                self._tokens_by_length.setdefault(len(token), []).append(token)
+            self._token_restaurants[token].append(rid)
+        self._close_tokens.clear()
+
+    def _register_names(self, rid: int) -> None:
+        rows: Dict[str, int] = {}
+        for row in self.row_ranges[rid]:
+            name = " ".join(normalize_name(self.names[row]).split())
+            if name not in rows:
+                rows[name] = row
+                self._rows_by_any_name.setdefault(name, []).append(row)
+        self._rows_by_name[rid] = rows
+
+    def _mentioned_aliases(self, words: Sequence[str]) -> List[str]:
+        """Returns the aliases that appear as whole words in `words`, in the order they occur."""
+        return [phrase for phrase in _phrases(words, self._max_alias_words) if phrase in self._aliases]
+
+    def _restaurants_for_token(self, token: str, cutoff: float, fuzzy: bool = True) -> List[int]:
+        """
+        Returns the restaurants whose name has `token`, or, failing that, a
+        token within `cutoff` similarity of it (a misspelling).
+
+        Only name tokens of a length that could reach `cutoff` are compared
+        with difflib, and their matches are remembered per token.
+        """
+        if token in self._token_restaurants:
+            return self._token_restaurants[token]
+        if not fuzzy:
+            return []
+        key = (token, cutoff)
+        if key not in self._close_tokens:
+            # difflib's ratio is at most 2 * min(a, b) / (a + b), which bounds the lengths worth comparing.
+            shortest = int(len(token) * cutoff / (2 - cutoff))
+            longest = int(len(token) * (2 - cutoff) / cutoff) + 1
+            candidates = [
+                name_token
+                for length in range(max(shortest, 1), longest + 1)
+                for name_token in self._tokens_by_length.get(length, ())
+            ]
+            if len(self._close_tokens) >= MAX_CLOSE_TOKENS:
+                self._close_tokens.clear()
+            self._close_tokens[key] = (
+                difflib.get_close_matches(token, candidates, n=len(candidates), cutoff=cutoff) if candidates else []
+            )
+        rids = {rid for name_token in self._close_tokens[key] for rid in self._token_restaurants[name_token]}
+        return sorted(rids)
+
+
+def _phrases(words: Sequence[str], max_words: int) -> List[str]:
+    """Every run of up to `max_words` consecutive words, joined by single spaces."""
+    return [
+        " ".join(words[i:j])
+        for i in range(len(words))
+        for j in range(i + 1, min(len(words), i + max_words) + 1)
+    ]
+
+
+def format_menu_answer(
+    index: MenuIndex,
+    restaurant: str,
+    veg: Optional[str] = None,
+    max_price: Optional[int] = None,
+    category: Optional[str] = None,
+    bestseller_only: bool = False,
+    dish: Optional[str] = None,
+    cheapest_first: bool = False,
+    limit: int = 25,
+    include_items: bool = True,
+) -> str:
+    """
+    Runs a structured menu lookup and formats the result for the LLM.
+
+    Args:
+        index (MenuIndex): Menu index to query.
+        restaurant (str): Restaurant name as written by the user.
+        veg (str): "veg" or "non-veg" to filter on dietary type.
+        max_price (int): Upper price bound in INR.
+        category (str): Menu category such as dessert, beverage, main_course, appetizer.
+        bestseller_only (bool): Only return bestsellers.
+        dish (str): Dish name fragment, e.g. "biryani".
+        cheapest_first (bool): Sort by ascending price.
+        limit (int): Maximum number of items listed.
+        include_items (bool): False to return only the restaurant summary.
+
+    Returns:
+        str: Restaurant summary followed by matching items.
+    """
+    rid = index.resolve_restaurant(restaurant)
+    if rid is None:
+        return f"No restaurant matching '{restaurant}' was found."
+    if not include_items:
+        return index.summary(rid)
+    veg_filter = None
+    if veg:
+        veg_filter = normalize_name(veg).replace(" ", "") not in ("nonveg", "nonvegetarian")
+    rows = index.query(
+        restaurant=rid,
+        veg=veg_filter,
+        max_price=max_price,
+        category=category,
+        bestseller=True if bestseller_only else None,
+        dish=dish,
+        sort_by_price=cheapest_first,
+    )
+    text = index.summary(rid)
+    if not rows:
+        return text + "\nNo menu items match the requested filters."
+    shown = rows[:limit]
+    text += f"\nMatching items: {len(rows)}" + (f" (showing {len(shown)})" if len(shown) < len(rows) else "")
+    return text + "\n" + index.format_rows(shown)
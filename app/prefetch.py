@@ -0,0 +1,171 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from tracing import METRICS_ENABLED, metrics, observe
+
+
+class Prefetch:
+    """One speculative retrieval for a user message, shared by the call_db calls planned for it."""
+
+    __slots__ = ("query", "embedding", "source", "task", "started_at", "finished_at", "claims", "used")
+
+    def __init__(self, query: str, embedding: Sequence[float], source: Optional[str], task: asyncio.Task):
+        self.query = query
+        self.embedding = np.asarray(embedding, dtype=np.float32)
+        self.source = source
+        self.task = task
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.claims = 0
+        self.used = False
+
+
+class PrefetchCache:
+    """
+    Per-turn cache of speculative retrievals.
+
+    `chatbot` starts a search for the raw user message while the planning LLM
+    runs, then `assign`s it to the call_db tool calls the LLM planned (or
+    drops it when there are none). `call_db` `take`s it by tool call id and
+    reuses the hits when its query searches the same restaurant scope and
+    its embedding has cosine similarity of at least `threshold` with the
+    user message; otherwise the speculative result is discarded. Entries no
+    call_db answers without a vector search (from the query cache or the
+    lexical index) are `release`d; any left behind expire after `ttl_seconds`.
+
+    Reported: hits, misses, unused and failed prefetches, and the retrieval
+    time taken off the critical path (search time minus the time call_db
+    still had to wait for it).
+    """
+
+    def __init__(self, threshold: float = 0.85, ttl_seconds: float = 60.0):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._by_tool_call: Dict[str, Prefetch] = {}
+        self._counts: Dict[str, int] = {"started": 0, "hit": 0, "miss": 0, "unused": 0, "failed": 0}
+        self._saved_seconds = 0.0
+        self._wasted_seconds = 0.0
+
+    def start(self, query: str, embedding: Sequence[float], source: Optional[str], search: Awaitable[List[Dict[str, Any]]]) -> Prefetch:
+        """
+        Starts `search` (the retrieval for `query`) as a background task.
+
+        Args:
+            query (str): The user message.
+            embedding (Sequence[float]): Its normalized embedding.
+            source (str): Restaurant the search is scoped to, None for all.
+            search (Awaitable): The retrieval coroutine.
+
+        Returns:
+            Prefetch: Handle to pass to `assign` or `discard`.
+        """
+        self._expire()
+        prefetch = Prefetch(query, embedding, source, asyncio.ensure_future(search))
+        prefetch.task.add_done_callback(lambda task: self._finished(prefetch, task))
+        self._count("started")
+        return prefetch
+
+    def assign(self, prefetch: Prefetch, tool_call_ids: Sequence[str]) -> None:
+        """Makes the prefetch available to these call_db tool calls; with none it is discarded."""
+        if not tool_call_ids:
+            self.discard(prefetch)
+            return
+        prefetch.claims = len(tool_call_ids)
+        for tool_call_id in tool_call_ids:
+            self._by_tool_call[tool_call_id] = prefetch
+
+    def discard(self, prefetch: Prefetch, outcome: str = "unused") -> None:
+        """Cancels a prefetch nobody will use."""
+        if not prefetch.task.done():
+            prefetch.task.cancel()
+        self._wasted_seconds += (prefetch.finished_at or time.perf_counter()) - prefetch.started_at
+        self._count(outcome)
+
+    def release(self, tool_call_id: str) -> None:
+        """Drops a tool call's claim without using it; the last claim cancels an unused prefetch."""
+        prefetch = self._by_tool_call.pop(tool_call_id, None)
+        if prefetch is None:
+            return
+        prefetch.claims -= 1
+        if prefetch.claims == 0 and not prefetch.used:
+            self.discard(prefetch)
+
+    async def take(
+        self,
+        tool_call_id: str,
+        query: str,
+        embedding: Sequence[float],
+        source: Optional[str],
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the prefetched hits for a call_db call when they fit its query.
+
+        Args:
+            tool_call_id (str): The call_db tool call id.
+            query (str): The call_db query.
+            embedding (Sequence[float]): Its normalized embedding.
+            source (str): Restaurant its search would be scoped to.
+
+        Returns:
+            Optional[List[Dict]]: The hits, or None to run the search normally.
+        """
+        prefetch = self._by_tool_call.pop(tool_call_id, None)
+        if prefetch is None:
+            return None
+        prefetch.claims -= 1
+        similarity = float(np.dot(prefetch.embedding, np.asarray(embedding, dtype=np.float32)))
+        if prefetch.source != source or (query != prefetch.query and similarity < self.threshold):
+            if prefetch.claims == 0 and not prefetch.used:
+                self.discard(prefetch, "miss")
+            else:
+                self._count("miss")
+            return None
+
+        waited_from = time.perf_counter()
+        try:
+            hits = await asyncio.shield(prefetch.task)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("Prefetched retrieval failed, searching again:", e)
+            self._count("failed")
+            return None
+        waited = time.perf_counter() - waited_from
+        saved = max(0.0, (prefetch.finished_at or time.perf_counter()) - prefetch.started_at - waited)
+        prefetch.used = True
+        self._saved_seconds += saved
+        self._count("hit")
+        if METRICS_ENABLED:
+            observe("prefetch.saved", saved)
+        return hits
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns prefetch outcomes, the hit rate over taken prefetches and the time saved."""
+        decided = self._counts["hit"] + self._counts["miss"]
+        return {
+            **self._counts,
+            "pending": len(self._by_tool_call),
+            "hit_rate": round(self._counts["hit"] / decided, 4) if decided else 0.0,
+            "saved_seconds": round(self._saved_seconds, 4),
+            "saved_ms_per_hit": round(1000.0 * self._saved_seconds / self._counts["hit"], 2) if self._counts["hit"] else 0.0,
+            "wasted_search_seconds": round(self._wasted_seconds, 4),
+        }
+
+    def _finished(self, prefetch: Prefetch, task: asyncio.Task) -> None:
+        prefetch.finished_at = time.perf_counter()
+        if not task.cancelled():
+            task.exception()  # retrieved here so a failed speculative search is never logged as unhandled
+
+    def _expire(self) -> None:
+        now = time.perf_counter()
+        expired = [key for key, prefetch in self._by_tool_call.items() if now - prefetch.started_at > self.ttl_seconds]
+        for key in expired:
+            self.release(key)
+
+    def _count(self, outcome: str) -> None:
+        self._counts[outcome] += 1
+        if METRICS_ENABLED:
+            metrics.inc("prefetch_total", outcome=outcome)
@@ -0,0 +1,344 @@
+"""
+Single-pass menu preprocessing into the columnar menu store.
+
+Replaces the price range and menu tagging cells of Training.ipynb, which
+rewrote every structured_data.json twice and scanned each item once per
+keyword list. Here every structured_data.json is read once. Each item's
+name and description go through one compiled matcher that finds the
+dietary and category keywords together, and the results are written for
+all restaurants into one directory of NumPy columns with string tables
+(see `arraystore`). The server opens it with `MenuIndex.load`. Work is
+linear in the number of menu items.
+
+The JSON files are left as scraped; the store holds the derived fields
+(dietary tags, menu category, normalized name, ingredients, spice level,
+price range) that the notebook used to write back into them.
+
+Usage:
+    python app/preprocess.py [--data-dir DIR] [--output DIR]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from arraystore import encode_strings, exists, load_meta, save_arrays
+from menu_index import DATA_DIR, MENU_STORE_DIR, MENU_STORE_VERSION, MenuIndex, data_fingerprint, restaurant_info
+
+INGREDIENTS_PATTERNS = [
+    re.compile(r"(?:contains|made with|ingredients)[:\s]*(.*?)(?:[.;]|$)", re.IGNORECASE),
+]
+SPICE_LEVEL_PATTERN = re.compile(r"spice level[:\s]*([0-5])(?:/5)?", re.IGNORECASE)
+
+# Matched against the description only.
+DIETARY_KEYWORDS: Dict[str, List[str]] = {
+    "vegetarian": ["veg", "plant based", "no meat"],
+    "vegan": ["vegan", "dairy free", "no animal"],
+    "gluten-free": ["gluten-free", "gf", "no gluten"],
+    "spicy": ["spicy", "hot", "chili"],
+}
+
+# Matched against name and description; the first category in this order wins.
+MENU_CATEGORIES: Dict[str, List[str]] = {
+    "appetizer": ["platter", "starter", "soup", "salad", "bruschetta"],
+    "main_course": ["curry", "rice", "noodles", "burger", "pizza", "pasta"],
+    "dessert": ["ice cream", "cake", "sweet", "pastry", "pie"],
+    "beverage": ["juice", "coffee", "tea", "smoothie"],
+}
+OTHER_CATEGORY = "other"
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"[^\w\s]", "", text or "").lower().strip()
+
+
+class KeywordMatcher:
+    """
+    Finds which of many labeled keyword lists occur in a text, in one regex scan.
+
+    All keywords are compiled into a single zero-width lookahead over a
+    prefix-trie alternation (e.g. "p(?:ast(?:a|ry)|ie)"), so a match is
+    attempted at every position, overlapping keywords are all seen, and a
+    position that starts no keyword fails on its first character. A shorter keyword starting at the same position as
+    a longer one (e.g. "veg" inside "vegan") is hidden by the longer match,
+    so each keyword's label mask also carries the labels of its prefixes.
+    The result is the same as testing `keyword in text` for every keyword.
+    """
+
+    def __init__(self, keywords: Dict[str, Sequence[str]]):
+        self.labels = list(keywords)
+        masks: Dict[str, int] = {}
+        for bit, label in enumerate(self.labels):
+            for keyword in keywords[label]:
+                masks[keyword] = masks.get(keyword, 0) | (1 << bit)
+        self._masks = {
+            keyword: _or_all(mask for other, mask in masks.items() if keyword.startswith(other))
+            for keyword in masks
+        }
+        self._pattern = re.compile(f"(?=({_trie_pattern(masks)}))")
+
+    def label_mask(self, labels: Iterable[str]) -> int:
+        return _or_all(1 << self.labels.index(label) for label in labels)
+
+    def scan(self, text: str, boundary: int = 0, before_mask: int = -1) -> int:
+        """
+        Returns the bitmask of labels whose keywords occur in `text`.
+
+        Matches starting before `boundary` only count towards the labels in
+        `before_mask`, so one scan over "name description" can serve labels
+        that look at both fields and labels that look at the description only.
+        """
+        found = 0
+        for match in self._pattern.finditer(text):
+            mask = self._masks[match.group(1)]
+            found |= mask if match.start() >= boundary else mask & before_mask
+        return found
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex matching the longest of `words` at a position, factored by common prefixes."""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if "" in node:
+            return "(?:" + "|".join(branches) + ")?"  # greedy, so the longer word wins
+        return branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+
+    return emit(trie)
+
+
+def _or_all(masks: Iterable[int]) -> int:
+    result = 0
+    for mask in masks:
+        result |= mask
+    return result
+
+
+MATCHER = KeywordMatcher({**{f"diet:{k}": v for k, v in DIETARY_KEYWORDS.items()},
+                          **{f"category:{k}": v for k, v in MENU_CATEGORIES.items()}})
+DIETARY_TAGS = sorted(DIETARY_KEYWORDS)
+CATEGORIES = list(MENU_CATEGORIES) + [OTHER_CATEGORY]
+_DIETARY_BITS = [MATCHER.label_mask([f"diet:{tag}"]) for tag in DIETARY_TAGS]
+_CATEGORY_BITS = [MATCHER.label_mask([f"category:{category}"]) for category in MENU_CATEGORIES]
+_CATEGORY_MASK = _or_all(_CATEGORY_BITS)
+
+
+def extract_ingredients(description: str) -> List[str]:
+    for pattern in INGREDIENTS_PATTERNS:
+        match = pattern.search(description or "")
+        if match:
+            parts = re.split(r",\s*| and ", match.group(1))
+            return [p.lower().strip() for p in parts if p.strip()]
+    return []
+
+
+def extract_spice_level(description: str) -> Optional[int]:
+    match = SPICE_LEVEL_PATTERN.search(description or "")
+    return int(match.group(1)) if match else None
+
+
+def process_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Derives the notebook's preprocessing fields for one menu item.
+
+    Args:
+        item (Dict[str, Any]): A `menu.hasMenuItem` entry.
+
+    Returns:
+        Dict[str, Any]: `dietary_tags`, `menu_category`, `normalized_name`,
+        `ingredients` and `spice_level`, as the notebook computed them.
+    """
+    description = item.get("description") or ""
+    name = normalize_text(item.get("name") or "")
+    found = MATCHER.scan(f"{name} {normalize_text(description)}", boundary=len(name) + 1, before_mask=_CATEGORY_MASK)
+    category = next((c for c, bit in zip(MENU_CATEGORIES, _CATEGORY_BITS) if found & bit), OTHER_CATEGORY)
+    return {
+        "dietary_tags": [tag for tag, bit in zip(DIETARY_TAGS, _DIETARY_BITS) if found & bit],
+        "menu_category": category,
+        "normalized_name": name,
+        "ingredients": extract_ingredients(description),
+        "spice_level": extract_spice_level(description),
+    }
+
+
+def price_range(prices: Iterable[int]) -> str:
+    priced = [p for p in prices if p > 0]
+    return f"₹{min(priced)} - ₹{max(priced)}" if priced else ""
+
+
+def read_restaurants(data_dir: str = DATA_DIR) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """Yields `(folder, structured_data)` for every restaurant folder, skipping unreadable files."""
+    for folder in sorted(os.listdir(data_dir)):
+        path = os.path.join(data_dir, folder, "structured_data.json")
+        if not os.path.isfile(path):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                yield folder, json.load(f)
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+
+
+def preprocess_restaurants(restaurants: Iterable[Tuple[str, Dict[str, Any]]]) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Turns restaurants' structured data into the menu store columns in one pass.
+
+    Args:
+        restaurants (Iterable[Tuple[str, Dict[str, Any]]]): `(folder, structured_data)` pairs.
+
+    Returns:
+        Tuple[Dict[str, np.ndarray], Dict[str, Any]]: The MENU_STORE_ARRAYS
+        columns and the store metadata, ready for `arraystore.save_arrays` or
+        `MenuIndex.from_arrays`.
+    """
+    category_ids = {category: i for i, category in enumerate(CATEGORIES)}
+    restaurant_ids: List[int] = []
+    prices: List[int] = []
+    veg: List[int] = []
+    bestseller: List[int] = []
+    categories: List[int] = []
+    dietary: List[int] = []
+    spice: List[int] = []
+    names: List[str] = []
+    normalized_names: List[str] = []
+    descriptions: List[str] = []
+    ingredients: List[str] = []
+    row_offsets = [0]
+    infos: List[str] = []
+
+    for rid, (source, data) in enumerate(restaurants):
+        start = len(names)
+        for item in (data.get("menu") or {}).get("hasMenuItem", []):
+            derived = process_item(item)
+            price = item.get("price")
+            restaurant_ids.append(rid)
+            prices.append(int(price) if isinstance(price, (int, float)) else 0)
+            veg.append({"veg": 1, "non-veg": 0}.get(item.get("isVeg"), -1))
+            bestseller.append(1 if item.get("isBestseller") else 0)
+            categories.append(category_ids[derived["menu_category"]])
+            dietary.append(_or_all(1 << DIETARY_TAGS.index(tag) for tag in derived["dietary_tags"]))
+            spice.append(-1 if derived["spice_level"] is None else derived["spice_level"])
+            names.append(item.get("name") or "")
+            normalized_names.append(derived["normalized_name"])
+            descriptions.append(item.get("description") or "")
+            ingredients.append("\n".join(derived["ingredients"]))
+        info = restaurant_info(source, data)
+        info["priceRange"] = price_range(prices[start:])
+        infos.append(json.dumps(info, ensure_ascii=False))
+        row_offsets.append(len(names))
+
+    restaurant_col = np.array(restaurant_ids, dtype=np.uint16)
+    price_col = np.array(prices, dtype=np.int32)
+    veg_col = np.array(veg, dtype=np.int8)
+    category_col = np.array(categories, dtype=np.uint16)
+    count = len(infos)
+    # Price bounds over priced items only; restaurants without any keep 0, as in MenuIndex.
+    priced = price_col > 0
+    unset = np.iinfo(np.int32).max
+    min_price = np.full(count, unset, dtype=np.int32)
+    max_price = np.zeros(count, dtype=np.int32)
+    np.minimum.at(min_price, restaurant_col[priced], price_col[priced])
+    np.maximum.at(max_price, restaurant_col[priced], price_col[priced])
+    min_price[min_price == unset] = 0
+
+    arrays: Dict[str, np.ndarray] = {
+        "restaurant_ids": restaurant_col,
+        "price": price_col,
+        "veg": veg_col,
+        "bestseller": np.array(bestseller, dtype=np.int8),
+        "category": category_col,
+        "dietary": np.array(dietary, dtype=np.uint8),
+        "spice_level": np.array(spice, dtype=np.int8),
+        # Stable sorts keep row order within equal keys, as MenuIndex's own `sorted` does.
+        "by_price": np.lexsort((price_col, restaurant_col)).astype(np.uint32),
+        "by_category": np.lexsort((category_col, restaurant_col)).astype(np.uint32),
+        "row_offsets": np.array(row_offsets, dtype=np.int64),
+        "min_price": min_price,
+        "max_price": max_price,
+        "veg_count": np.bincount(restaurant_col[veg_col == 1], minlength=count).astype(np.uint32),
+        "non_veg_count": np.bincount(restaurant_col[veg_col == 0], minlength=count).astype(np.uint32),
+    }
+    for offsets_name, name, values in (
+        ("name_offsets", "names", names),
+        ("normalized_name_offsets", "normalized_names", normalized_names),
+        ("description_offsets", "descriptions", descriptions),
+        ("ingredient_offsets", "ingredients", ingredients),
+        ("info_offsets", "info", infos),
+    ):
+        arrays[offsets_name], arrays[name] = encode_strings(values)
+    meta = {
+        "version": MENU_STORE_VERSION,
+        "categories": CATEGORIES,
+        "dietary_tags": DIETARY_TAGS,
+        "num_restaurants": count,
+        "num_items": len(names),
+        "processed_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    return arrays, meta
+
+
+def preprocess_directory(data_dir: str = DATA_DIR) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Preprocesses every restaurant under `data_dir`; the metadata records the data fingerprint."""
+    fingerprint = data_fingerprint(data_dir)
+    arrays, meta = preprocess_restaurants(read_restaurants(data_dir))
+    meta["data_fingerprint"] = fingerprint
+    return arrays, meta
+
+
+def build_menu_store(data_dir: str = DATA_DIR, directory: str = MENU_STORE_DIR) -> Dict[str, Any]:
+    """
+    Preprocesses `data_dir` and writes the menu store to `directory`.
+
+    Returns:
+        Dict[str, Any]: The store metadata plus the elapsed seconds.
+    """
+    started = time.perf_counter()
+    arrays, meta = preprocess_directory(data_dir)
+    save_arrays(directory, arrays, meta)
+    return {**meta, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def is_fresh(directory: str = MENU_STORE_DIR, data_dir: str = DATA_DIR) -> bool:
+    """True when a menu store exists and was built from the current data (or the data is not around to compare)."""
+    if not exists(directory):
+        return False
+    if not os.path.isdir(data_dir):
+        return True
+    return load_meta(directory).get("data_fingerprint") == data_fingerprint(data_dir)
+
+
+def load_menu_index(directory: str = MENU_STORE_DIR, data_dir: str = DATA_DIR) -> MenuIndex:
+    """
+    Opens the menu store, or preprocesses `data_dir` in memory when the store
+    is missing or older than the data.
+    """
+    if is_fresh(directory, data_dir):
+        return MenuIndex.load(directory)
+    print(f"Menu store at {directory} is missing or older than {data_dir}; preprocessing in memory. "
+          "Run app/preprocess.py to persist it.")
+    return MenuIndex.from_arrays(*preprocess_directory(data_dir))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Preprocess the scraped menus into the columnar menu store.")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--output", default=MENU_STORE_DIR)
+    args = parser.parse_args()
+    print(json.dumps(build_menu_store(args.data_dir, args.output), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
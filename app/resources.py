@@ -0,0 +1,342 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Set
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COLLECTION_NAME = "knowledge_base"
+WARMUP_ORDER = ("menu_index", "lexical_index", "query_router", "query_cache", "prefetch_cache", "collection", "searcher", "embedding_model", "embedder", "llm", "llm_client")
+# Safe to build before a pre-forking server forks: no threads, sockets or connections.
+PRELOAD_ORDER = ("menu_index", "lexical_index", "embedding_model")
+# Built from on-disk indexes that a re-ingest replaces; reopened in this order by `reload_indexes`.
+RELOAD_ORDER = ("menu_index", "query_router", "lexical_index")
+
+
+class Resources:
+    """
+    Lazily created heavy dependencies: Gemini clients, the Milvus collection (or
+    the local vector index), the embedding model and the in-memory indexes.
+
+    Nothing is imported, downloaded or connected until a resource is first used
+    or `warmup` runs, so importing the graph and server modules stays cheap.
+    Each resource is built once under its own lock; concurrent callers wait for
+    the in-flight build instead of starting another one.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in self._factories()}
+        self._status: Dict[str, str] = {name: "pending" for name in self._factories()}
+        self._errors: Dict[str, str] = {}
+        self._timings: Dict[str, float] = {}
+        self._provided: Set[str] = set()
+        self.warmup_started_at = None
+        self.warmup_finished_at = None
+
+    def get(self, name: str) -> Any:
+        """
+        Returns a resource, building it on first use.
+
+        Args:
+            name (str): Resource name, one of WARMUP_ORDER or "llm2".
+
+        Returns:
+            Any: The resource.
+        """
+        value = self._values.get(name)
+        if value is not None:
+            return value
+        with self._locks[name]:
+            if name not in self._values:
+                self._status[name] = "loading"
+                started = time.perf_counter()
+                try:
+                    self._values[name] = self._factories()[name](self)
+                except Exception as e:
+                    self._status[name] = "failed"
+                    self._errors[name] = str(e)
+                    raise
+                self._timings[name] = round(time.perf_counter() - started, 3)
+                self._status[name] = "ready"
+                self._errors.pop(name, None)
+            return self._values[name]
+
+    async def aget(self, name: str) -> Any:
+        """Async variant of `get` that builds missing resources off the event loop."""
+        value = self._values.get(name)
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self.get, name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._values
+
+    def provide(self, name: str, value: Any) -> None:
+        """Installs a ready-made resource in place of the factory, e.g. a stand-in for benchmarks."""
+        with self._locks[name]:
+            self._values[name] = value
+            self._provided.add(name)
+            self._status[name] = "ready"
+            self._errors.pop(name, None)
+
+    def reload(self, name: str) -> None:
+        """
+        Rebuilds a loaded resource and swaps it in; callers already holding the
+        old value finish with it. Resources that are not loaded yet, or were
+        installed with `provide`, are left alone.
+        """
+        if name not in self._values or name in self._provided:
+            return
+        started = time.perf_counter()
+        value = self._factories()[name](self)
+        with self._locks[name]:
+            self._values[name] = value
+        self._timings[name] = round(time.perf_counter() - started, 3)
+
+    def reload_indexes(self) -> None:
+        """
+        Reopens the on-disk indexes (menu store, BM25 index and, with the local
+        backend, the vector index) after a re-ingest wrote new versions, so this
+        worker stops serving the arrays it mapped at startup. A failed reload
+        keeps the loaded index.
+        """
+        from vector_store import VECTOR_BACKEND
+
+        names = RELOAD_ORDER + (("collection", "searcher") if VECTOR_BACKEND == "local" else ())
+        for name in names:
+            try:
+                self.reload(name)
+            except Exception as e:
+                print(f"Reloading {name} failed, keeping the loaded one: {e}")
+
+    @property
+    def llm(self):
+        return self.get("llm")
+
+    @property
+    def llm2(self):
+        return self.get("llm2")
+
+    @property
+    def llm_client(self):
+        return self.get("llm_client")
+
+    @property
+    def collection(self):
+        return self.get("collection")
+
+    @property
+    def searcher(self):
+        return self.get("searcher")
+
+    @property
+    def embedder(self):
+        return self.get("embedder")
+
+    @property
+    def query_cache(self):
+        return self.get("query_cache")
+
+    @property
+    def prefetch_cache(self):
+        return self.get("prefetch_cache")
+
+    @property
+    def menu_index(self):
+        return self.get("menu_index")
+
+    @property
+    def lexical_index(self):
+        return self.get("lexical_index")
+
+    @property
+    def query_router(self):
+        return self.get("query_router")
+
+    def preload(self) -> None:
+        """Builds the fork-safe resources in PRELOAD_ORDER."""
+        for name in PRELOAD_ORDER:
+            self.get(name)
+
+    def warmup(self) -> None:
+        """Builds every resource in WARMUP_ORDER, recording failures instead of raising."""
+        self.warmup_started_at = time.time()
+        for name in WARMUP_ORDER:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Warmup of {name} failed: {e}")
+        if "embedder" in self._values:
+            # One throwaway forward pass so the first real query skips lazy kernel setup.
+            try:
+                self._values["embedder"].embed("warmup")
+            except Exception as e:
+                print(f"Embedder warmup pass failed: {e}")
+        self.warmup_finished_at = time.time()
+
+    async def awarmup(self) -> None:
+        await asyncio.to_thread(self.warmup)
+
+    @property
+    def ready(self) -> bool:
+        return all(self._status[name] == "ready" for name in WARMUP_ORDER)
+
+    def status(self) -> Dict[str, Any]:
+        """Returns per-resource state ("pending", "loading", "ready", "failed"), load times and errors."""
+        return {
+            "ready": self.ready,
+            "resources": dict(self._status),
+            "load_seconds": dict(self._timings),
+            "errors": dict(self._errors),
+            "warmup_started_at": self.warmup_started_at,
+            "warmup_finished_at": self.warmup_finished_at,
+        }
+
+    def close(self) -> None:
+        embedder = self._values.get("embedder")
+        if embedder is not None:
+            embedder.close()
+
+    @staticmethod
+    def _factories() -> Dict[str, Callable[["Resources"], Any]]:
+        return {
+            "llm": _build_llm,
+            "llm2": _build_llm2,
+            "llm_client": _build_llm_client,
+            "collection": _build_collection,
+            "searcher": _build_searcher,
+            "embedding_model": _build_embedding_model,
+            "embedder": _build_embedder,
+            "query_cache": _build_query_cache,
+            "prefetch_cache": _build_prefetch_cache,
+            "menu_index": _build_menu_index,
+            "lexical_index": _build_lexical_index,
+            "query_router": _build_query_router,
+        }
+
+
+def _build_llm(_: Resources):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY", "")
+    # Timeouts and retries are applied by `llm_client`; client-side retries would multiply them.
+    return ChatGoogleGenerativeAI(model=os.getenv("LLM_MODEL", "gemini-2.5-flash-preview-04-17"), temperature=0.7, max_retries=0)
+
+
+def _build_llm2(_: Resources):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY", "")
+    return ChatGoogleGenerativeAI(model=os.getenv("LLM2_MODEL", "gemini-2.5-pro-preview-03-25"), temperature=0.7, max_retries=0)
+
+
+def _build_llm_client(resources: Resources):
+    from llm_client import LLMClient
+
+    # llm2 is only built once the primary saturates or keeps failing.
+    return LLMClient(resources.llm, fallback=lambda: resources.get("llm2"))
+
+
+def _build_collection(_: Resources):
+    from vector_store import VECTOR_BACKEND, VECTOR_INDEX_DIR, LocalVectorStore
+
+    if VECTOR_BACKEND == "local":
+        store = LocalVectorStore.open(VECTOR_INDEX_DIR)
+        print(f"✅ Local vector index loaded ({store.num_entities} chunks, {store.meta['dtype']}).")
+        return store
+
+    from pymilvus import Collection, connections
+
+    connections.connect("default", uri=os.getenv("MILVUS_URI"), token=os.getenv("MILVUS_TOKEN"))
+    collection = Collection(COLLECTION_NAME)
+
+    # Create index if not present
+    if not collection.has_index():
+        index_params = {
+            "metric_type": "IP",
+            "index_type": "IVF_FLAT",
+            "params": {"nlist": 1024}
+        }
+        collection.create_index(field_name="embedding", index_params=index_params)
+
+    collection.load()
+    print("✅ Milvus collection loaded and ready.")
+    return collection
+
+
+def _build_searcher(resources: Resources):
+    from retrieval import MilvusSearchBatcher
+
+    searcher = MilvusSearchBatcher(resources.collection)
+    if not searcher.has_field("restaurant"):
+        print("⚠️ knowledge_base has no restaurant field; searches are not scoped. Re-ingest with --rebuild to enable scoping.")
+    return searcher
+
+
+def _build_embedding_model(_: Resources):
+    from embedding import load_embedding_model
+
+    return load_embedding_model()
+
+
+def _build_embedder(resources: Resources):
+    from embedding import EmbeddingService, make_embed_fn
+
+    return EmbeddingService(
+        make_embed_fn(resources.get("embedding_model"), normalize=True),
+        max_batch_size=int(os.getenv("EMBED_MAX_BATCH_SIZE", "32")),
+        max_wait_ms=float(os.getenv("EMBED_MAX_WAIT_MS", "5")),
+        num_workers=int(os.getenv("EMBED_WORKERS", "1")),
+    )
+
+
+def _build_query_cache(_: Resources):
+    from cache import SemanticCache
+
+    return SemanticCache(
+        threshold=float(os.getenv("CACHE_SIMILARITY_THRESHOLD", "0.95")),
+        max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")),
+        ttl_seconds=float(os.getenv("CACHE_TTL_SECONDS", "3600")),
+        max_bytes=int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    )
+
+
+def _build_prefetch_cache(_: Resources):
+    from prefetch import PrefetchCache
+
+    return PrefetchCache(
+        threshold=float(os.getenv("PREFETCH_SIMILARITY_THRESHOLD", "0.85")),
+        ttl_seconds=float(os.getenv("PREFETCH_TTL_SECONDS", "60")),
+    )
+
+
+def _build_menu_index(_: Resources):
+    from preprocess import load_menu_index
+
+    return load_menu_index()
+
+
+def _build_lexical_index(_: Resources):
+    from arraystore import exists
+    from lexical import LEXICAL_INDEX_DIR, BM25Index
+
+    if exists(LEXICAL_INDEX_DIR):
+        return BM25Index.load(LEXICAL_INDEX_DIR)
+    # Not written yet (ingestion predates it): build from the scraped data, as the menu index is.
+    from ingest import build_lexical_index
+
+    print(f"No lexical index at {LEXICAL_INDEX_DIR}; building it in memory. Run app/ingest.py to persist it.")
+    return build_lexical_index(workers=1)
+
+
+def _build_query_router(resources: Resources):
+    from router import QueryRouter
+
+    return QueryRouter(resources.menu_index)
+
+
+resources = Resources()
@@ -0,0 +1,270 @@
+import asyncio
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from tracing import observe, span
+
+DEFAULT_SEARCH_PARAMS = {"metric_type": "IP", "params": {"nprobe": 10}}
+# `id in [...]`, the delete expression ingestion issues; resolved by key lookups instead of a scan.
+ID_IN_EXPR = re.compile(r"^\s*id\s+in\s+(\[[^\]]*\])\s*$")
+
+
+def _hit_to_dict(hit, output_fields: Sequence[str]) -> Dict[str, Any]:
+    """Converts a pymilvus Hit (or stand-in hit) into a plain dict."""
+    result = {"id": hit.id, "score": hit.distance}
+    for field in output_fields:
+        result[field] = hit.get(field)
+    return result
+
+
+class MilvusSearchBatcher:
+    """
+    Async front end for `Collection.search`.
+
+    Searches run on a worker thread so the event loop is never blocked. Query
+    vectors that arrive within `max_wait_ms` of each other and share the same
+    search settings are merged into one multi-vector `collection.search` call,
+    and each caller gets back only its own hits.
+    """
+
+    def __init__(
+        self,
+        collection,
+        anns_field: str = "embedding",
+        max_batch_size: int = 16,
+        max_wait_ms: float = 2.0,
+    ):
+        self.collection = collection
+        self.anns_field = anns_field
+        # Read once: a collection ingested before chunks carried restaurant metadata
+        # lacks that field. Stand-ins without a schema hold every field ingestion writes.
+        schema = getattr(collection, "schema", None)
+        self.fields: Optional[Set[str]] = {field.name for field in schema.fields} if schema is not None else None
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending: Dict[str, List] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        # The loop only keeps weak references to tasks; an in-flight batch must not be collected.
+        self._tasks: Set[asyncio.Task] = set()
+        self._searches = 0
+        self._round_trips = 0
+        self._search_seconds = 0.0
+
+    async def search(
+        self,
+        vector: Sequence[float],
+        limit: int = 10,
+        param: Optional[Dict[str, Any]] = None,
+        output_fields: Sequence[str] = ("content",),
+        expr: Optional[str] = None,
+        partition_names: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Searches the collection for a single query vector.
+
+        Args:
+            vector (Sequence[float]): Query embedding.
+            limit (int): Number of hits to return.
+            param (Dict): Milvus search params; defaults to IP with nprobe=10.
+            output_fields (Sequence[str]): Scalar fields to return with each hit.
+            expr (str): Optional boolean filter expression.
+            partition_names (Sequence[str]): Optional partitions to restrict the search to.
+
+        Returns:
+            List[Dict[str, Any]]: Hits ranked by score, each with `id`, `score` and the output fields.
+        """
+        param = param or DEFAULT_SEARCH_PARAMS
+        output_fields = list(output_fields)
+        partitions = sorted(partition_names) if partition_names else None
+        # Only searches with identical settings can share one round-trip.
+        key = json.dumps([limit, param, output_fields, expr, partitions], sort_keys=True, default=str)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._searches += 1
+
+        bucket = self._pending.setdefault(key, [])
+        bucket.append((list(vector), future))
+        if len(bucket) >= self.max_batch_size:
+            self._flush(key, limit, param, output_fields, expr, partitions)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(
+                self.max_wait, self._flush, key, limit, param, output_fields, expr, partitions
+            )
+        with span("milvus.search"):
+            return await future
+
+    def _flush(self, key, limit, param, output_fields, expr, partitions) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, [])
+        if batch:
+            task = asyncio.ensure_future(self._run(batch, limit, param, output_fields, expr, partitions))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch, limit, param, output_fields, expr, partitions) -> None:
+        vectors = [vector for vector, _ in batch]
+        kwargs = {}
+        if expr:
+            kwargs["expr"] = expr
+        if partitions:
+            kwargs["partition_names"] = partitions
+        started = time.perf_counter()
+        self._round_trips += 1
+        try:
+            results = await asyncio.to_thread(
+                self.collection.search,
+                vectors,
+                anns_field=self.anns_field,
+                param=param,
+                limit=limit,
+                output_fields=output_fields,
+                **kwargs,
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            elapsed = time.perf_counter() - started
+            self._search_seconds += elapsed
+            observe("milvus.round_trip", elapsed)
+
+        for (_, future), hits in zip(batch, results):
+            if not future.done():
+                future.set_result([_hit_to_dict(hit, output_fields) for hit in hits])
+
+    def has_field(self, name: str) -> bool:
+        """Whether the collection's schema has a scalar field, so it can be filtered on and returned."""
+        return self.fields is None or name in self.fields
+
+    def stats(self) -> Dict[str, float]:
+        """Returns search counters; `vectors_per_round_trip` above 1 means batching is paying off."""
+        return {
+            "searches": self._searches,
+            "round_trips": self._round_trips,
+            "vectors_per_round_trip": self._searches / self._round_trips if self._round_trips else 0.0,
+            "search_seconds": self._search_seconds,
+        }
+
+
+class InMemoryHit:
+    """Minimal stand-in for a pymilvus Hit."""
+
+    def __init__(self, id: int, distance: float, entity: Dict[str, Any]):
+        self.id = id
+        self.distance = distance
+        self.score = distance
+        self.entity = entity
+
+    def get(self, field: str):
+        return self.entity.get(field)
+
+
+class InMemoryCollection:
+    """
+    In-process stand-in for a Milvus collection with an exact inner-product search.
+
+    Implements the subset of the `Collection` API that the app uses (`insert`,
+    `upsert`, `delete`, `query`, `search`, `flush`, `load`, `num_entities`), so
+    retrieval and ingestion code can be exercised without a Milvus server.
+    """
+
+    def __init__(self, name: str = "knowledge_base", vector_field: str = "embedding"):
+        self.name = name
+        self.vector_field = vector_field
+        # Rows by primary key, in insertion order; upserts replace in O(batch).
+        self._rows: Dict[Any, Dict[str, Any]] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._row_list: List[Dict[str, Any]] = []
+        self.search_calls = 0
+
+    @property
+    def num_entities(self) -> int:
+        return len(self._rows)
+
+    def insert(self, rows: List[Dict[str, Any]], partition_name: Optional[str] = None) -> None:
+        for row in rows:
+            row = dict(row)
+            row.setdefault("id", len(self._rows) + 1)
+            row["_partition"] = partition_name or "_default"
+            self._rows[row["id"]] = row
+        self._matrix = None
+
+    def upsert(self, rows: List[Dict[str, Any]], partition_name: Optional[str] = None) -> None:
+        for row in rows:
+            self._rows.pop(row["id"], None)
+        self.insert(rows, partition_name)
+
+    def delete(self, expr: str, partition_name: Optional[str] = None) -> None:
+        match = ID_IN_EXPR.match(expr)
+        if match:
+            for key in json.loads(match.group(1)):
+                self._rows.pop(key, None)
+        else:
+            self._rows = {key: row for key, row in self._rows.items() if not matches_expr(expr, row)}
+        self._matrix = None
+
+    def flush(self) -> None:
+        pass
+
+    def load(self) -> None:
+        pass
+
+    def query(self, expr: str = "", output_fields: Optional[Sequence[str]] = None, **kwargs) -> List[Dict[str, Any]]:
+        """Returns the stored rows matching `expr` (every row when empty), limited to `output_fields`."""
+        rows = [row for row in self._rows.values() if not expr or matches_expr(expr, row)]
+        if output_fields is None:
+            return [{k: v for k, v in row.items() if not k.startswith("_")} for row in rows]
+        return [{field: row.get(field) for field in output_fields} for row in rows]
+
+    def search(self, data, anns_field, param=None, limit=10, output_fields=None, expr=None, partition_names=None, **kwargs):
+        self.search_calls += 1
+        if not self._rows:
+            return [[] for _ in data]
+        if self._matrix is None:
+            self._row_list = list(self._rows.values())
+            self._matrix = np.asarray([row[anns_field] for row in self._row_list], dtype=np.float32)
+        rows = self._row_list
+        positions = np.arange(len(rows))
+        if partition_names or expr:
+            positions = np.asarray([
+                i for i, row in enumerate(rows)
+                if (not partition_names or row["_partition"] in partition_names) and (not expr or matches_expr(expr, row))
+            ], dtype=np.int64)
+        if positions.size == 0:
+            return [[] for _ in data]
+        results = []
+        scores = np.asarray(data, dtype=np.float32) @ self._matrix[positions].T
+        for query_scores in scores:
+            top = np.argsort(-query_scores, kind="stable")[:limit]
+            results.append([
+                InMemoryHit(rows[positions[i]]["id"], float(query_scores[i]),
+                            {f: rows[positions[i]].get(f) for f in (output_fields or [])})
+                for i in top
+            ])
+        return results
+
+
+def matches_expr(expr: str, row: Dict[str, Any]) -> bool:
+    """Evaluates simple `field == "value"` / `field in [...]` clauses joined by `and`/`&&`."""
+    for clause in expr.replace("&&", " and ").split(" and "):
+        clause = clause.strip()
+        if not clause:
+            continue
+        if " in [" in clause:
+            field, _, values = clause.partition(" in ")
+            allowed = {str(v) for v in json.loads(values.replace("'", '"'))}
+            if str(row.get(field.strip())) not in allowed:
+                return False
+            continue
+        field, _, value = clause.partition("==")
+        if str(row.get(field.strip())) != value.strip().strip("'\""):
+            return False
+    return True
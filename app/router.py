@@ -0,0 +1,176 @@
+import re
+import threading
+from typing import Any, Dict, Optional
+
+from menu_index import MenuIndex, normalize_name
+
+SMALL_TALK_TEMPLATES = {
+    "greeting": "Hi! I can help you explore restaurants in Lucknow: menus, prices, veg options, bestsellers, "
+                "timings, addresses and more. What would you like to know?",
+    "thanks": "You're welcome! Let me know if there's anything else you'd like to know about these restaurants.",
+    "goodbye": "Goodbye! Enjoy your meal.",
+    "capabilities": "I answer questions about restaurants in Lucknow using their menus and details: dishes and "
+                    "prices, veg and non-veg options, bestsellers, price ranges, ratings, timings and contact info. "
+                    "You can also ask me to compare restaurants or suggest places for a budget or diet.",
+}
+
+SMALL_TALK_PATTERNS = [
+    ("greeting", re.compile(r"^(hi+|hello+|hey+|hola|namaste|good (morning|afternoon|evening)|yo)( there)?( bot)?$")),
+    ("thanks", re.compile(r"^(thanks?|thank you|thankyou|thx|ty)( (so|very) much)?( a lot)?$")),
+    ("goodbye", re.compile(r"^(bye+|goodbye|good bye|see you|see ya|cya)$")),
+    ("capabilities", re.compile(r"^(what (can|do) you do|who are you|what are you|help)$")),
+]
+
+VEG_PATTERN = re.compile(r"\b(veg|vegetarian|veggie)\b")
+NON_VEG_PATTERN = re.compile(r"\b(non ?veg|nonveg|non vegetarian|nonvegetarian)\b")
+CHEAPEST_PATTERN = re.compile(r"\b(cheapest|cheap|lowest|least expensive|affordable|budget|inexpensive)\b")
+BESTSELLER_PATTERN = re.compile(r"\b(bestsellers?|best sellers?|best selling|popular|most ordered)\b")
+MAX_PRICE_PATTERN = re.compile(r"\b(?:under|below|less than|within|upto|up to|cheaper than)\s*(?:rs|inr)?\s*(\d+)")
+INFO_PATTERN = re.compile(
+    r"\b(price range|address|located|location|where is|phone|telephone|contact|number|"
+    r"timings?|hours|open|opening|close|closing|rating|ratings|rated|cuisine)\b"
+)
+CATEGORY_PATTERNS = [
+    ("dessert", re.compile(r"\b(desserts?|sweets?)\b")),
+    ("beverage", re.compile(r"\b(beverages?|drinks?|shakes?|coffee|tea|juices?)\b")),
+    ("appetizer", re.compile(r"\b(starters?|appetizers?|appetisers?|snacks?)\b")),
+    ("main_course", re.compile(r"\b(main course|mains)\b")),
+]
+# Signals that the question needs reasoning or context beyond one structured lookup.
+LLM_ONLY_PATTERN = re.compile(
+    r"\b(compare|comparison|versus|vs|better|best|recommend|suggest|which|it|its|they|their|there|that|those|"
+    r"diabetic|healthy|spicy|gluten|vegan|why|how|good|worth|should|restaurants|places)\b"
+)
+QUERY_STOPWORDS = {
+    "what", "are", "is", "the", "a", "an", "of", "at", "in", "from", "for", "show", "me", "list", "all", "items",
+    "item", "dishes", "dish", "menu", "food", "options", "do", "does", "have", "has", "serve", "serves", "get",
+    "can", "i", "please", "tell", "about", "any", "with", "and", "or", "on", "to", "price", "prices", "rs",
+    "inr", "give", "available", "some", "their", "there",
+}
+
+
+class RouteDecision:
+    """
+    Outcome of routing one user message.
+
+    kind is "small_talk" (reply holds a template answer), "menu_query" or
+    "call_db" (tool_args holds the synthesized tool arguments), or "llm" when
+    the router is not confident and the chatbot LLM should plan instead.
+    """
+
+    def __init__(self, kind: str, reply: Optional[str] = None, tool_args: Optional[Dict[str, Any]] = None):
+        self.kind = kind
+        self.reply = reply
+        self.tool_args = tool_args or {}
+
+    def __repr__(self) -> str:
+        return f"RouteDecision(kind={self.kind!r}, reply={self.reply!r}, tool_args={self.tool_args!r})"
+
+
+class QueryRouter:
+    """
+    Local, rule-based router placed in front of the tool-planning LLM call.
+
+    Greetings and similar small talk are answered from templates. A question
+    that names exactly one known restaurant and carries no comparison,
+    recommendation or follow-up wording is turned directly into a tool call:
+    `menu_query_tool` when structured intent words (veg, cheapest, under ₹N,
+    bestseller, a category, a dish on that menu, price range, timings, ...)
+    are present, `call_db_tool` otherwise. Everything else falls back to the LLM.
+    """
+
+    def __init__(self, menu_index: MenuIndex):
+        self.menu_index = menu_index
+        self._vocabularies: Dict[int, set] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {"small_talk": 0, "menu_query": 0, "call_db": 0, "llm": 0}
+
+    def route(self, text: str) -> RouteDecision:
+        """
+        Decides how to handle a user message.
+
+        Args:
+            text (str): The user's message.
+
+        Returns:
+            RouteDecision: The routing decision.
+        """
+        decision = self._decide(text)
+        with self._lock:
+            self._counts[decision.kind] += 1
+        return decision
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns decision counts and the share of turns that skipped the planning LLM."""
+        with self._lock:
+            total = sum(self._counts.values())
+            handled = total - self._counts["llm"]
+            return {
+                "decisions": dict(self._counts),
+                "total": total,
+                "short_circuit_rate": handled / total if total else 0.0,
+            }
+
+    def _decide(self, text: str) -> RouteDecision:
+        normalized = re.sub(r"\s+", " ", normalize_name(text.replace("-", " ")))
+        if not normalized:
+            return RouteDecision("llm")
+
+        for intent, pattern in SMALL_TALK_PATTERNS:
+            if pattern.match(normalized):
+                return RouteDecision("small_talk", reply=SMALL_TALK_TEMPLATES[intent])
+
+        restaurants = self.menu_index.find_restaurants(text)
+        if len(restaurants) != 1 or LLM_ONLY_PATTERN.search(normalized):
+            return RouteDecision("llm")
+        rid = restaurants[0]
+        name = self.menu_index.restaurants[rid]["name"]
+
+        args: Dict[str, Any] = {"restaurant": name}
+        if NON_VEG_PATTERN.search(normalized):
+            args["veg"] = "non-veg"
+        elif VEG_PATTERN.search(normalized):
+            args["veg"] = "veg"
+        if CHEAPEST_PATTERN.search(normalized):
+            args["cheapest_first"] = True
+        if BESTSELLER_PATTERN.search(normalized):
+            args["bestseller_only"] = True
+        price = MAX_PRICE_PATTERN.search(normalized)
+        if price:
+            args["max_price"] = int(price.group(1))
+            args["cheapest_first"] = True
+        for category, pattern in CATEGORY_PATTERNS:
+            if pattern.search(normalized):
+                args["category"] = category
+                break
+        dish = self._dish_term(normalized, rid)
+        if dish:
+            args["dish"] = dish
+
+        if len(args) > 1:
+            return RouteDecision("menu_query", tool_args=args)
+        if INFO_PATTERN.search(normalized):
+            return RouteDecision("menu_query", tool_args={**args, "include_items": False})
+        return RouteDecision("call_db", tool_args={"query": text.strip()})
+
+    def _dish_term(self, normalized: str, rid: int) -> Optional[str]:
+        """Returns the first query word that appears in this restaurant's dish names."""
+        vocabulary = self._vocabularies.get(rid)
+        if vocabulary is None:
+            vocabulary = set()
+            for row in self.menu_index.row_ranges[rid]:
+                vocabulary.update(self.menu_index.normalized_names[row].split())
+            self._vocabularies[rid] = vocabulary
+        restaurant_words = set(normalize_name(self.menu_index.restaurants[rid]["name"]).split())
+        for word in normalized.split():
+            if len(word) < 4 or word in QUERY_STOPWORDS or word in restaurant_words:
+                continue
+            if VEG_PATTERN.fullmatch(word) or CHEAPEST_PATTERN.fullmatch(word) or BESTSELLER_PATTERN.fullmatch(word):
+                continue
+            if any(pattern.fullmatch(word) for _, pattern in CATEGORY_PATTERNS):
+                continue
+            if word in vocabulary:
+                return word
+            if word.endswith("s") and word[:-1] in vocabulary:
+                return word[:-1]
+        return None
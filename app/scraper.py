@@ -0,0 +1,566 @@
+"""
+Parallel, resumable scraper for the Zomato restaurant pages.
+
+Replaces the Selenium cell of Training.ipynb. Every page is first fetched
+with a plain HTTP request (conditional on the ETag / Last-Modified of the
+previous run) and parsed once: the restaurant and menu come from the DOM
+menu cards when the HTML is rendered, otherwise from the schema.org
+JSON-LD. Only pages whose plain HTML yields no restaurant or no menu items
+go to a small pool of headless Chrome drivers. Pages are fetched
+concurrently with a minimum interval between requests to the same host,
+and parsing runs in a process pool.
+
+Change detection happens at three levels: a 304 answer, identical HTML
+bytes, or an identical extracted restaurant/menu all leave the restaurant
+folder untouched, so `ingest.py` does not re-embed it. Per-page state is
+saved after every page, so an interrupted run resumes (see --max-age-hours).
+
+Writes page.html, page.md and structured_data.json per restaurant, as the
+notebook did. --fixtures re-scrapes saved page.html files through the same
+pipeline without any network access.
+
+Usage:
+    python app/scraper.py [--urls FILE] [--output-dir DIR] [--concurrency N] [--host-interval S]
+                          [--browsers N] [--workers N] [--max-age-hours H] [--force]
+                          [--fixtures DIR]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from menu_index import DATA_DIR
+
+URLS = [
+    "https://www.zomato.com/lucknow/punjab-grill-gomti-nagar/order",
+    "https://www.zomato.com/lucknow/royal-cafe-royal-inn-sapru-marg/order",
+    "https://www.zomato.com/lucknow/barkaas-indo-arabic-restaurant-1-aliganj/order",
+    "https://www.zomato.com/lucknow/hazratganj-social-hazratganj/order",
+    "https://www.zomato.com/lucknow/cafe-hons-house-of-no-sugar-gomti-nagar/order",
+    "https://www.zomato.com/lucknow/kake-da-hotel-since-1931-jankipuram/order",
+    "https://www.zomato.com/lucknow/cafe-delhi-heights-sadar-bazaar/order",
+    "https://www.zomato.com/lucknow/mcdonalds-2-hazratganj/order",
+    "https://www.zomato.com/lucknow/grand-patio-hotel-savvy-grand-gomti-nagar/order",
+    "https://www.zomato.com/lucknow/abongzaa-multi-cuisine-cafe-restaurant-gomti-nagar/order",
+]
+
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "8"))
+# Minimum gap between two requests to the same host.
+SCRAPE_HOST_INTERVAL_SECONDS = float(os.getenv("SCRAPE_HOST_INTERVAL_SECONDS", "1.0"))
+SCRAPE_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_TIMEOUT_SECONDS", "20"))
+SCRAPE_BROWSERS = int(os.getenv("SCRAPE_BROWSERS", "2"))
+# Time given to the page's JavaScript before the rendered HTML is read.
+BROWSER_RENDER_SECONDS = float(os.getenv("BROWSER_RENDER_SECONDS", "5"))
+SCRAPE_STATE_PATH = os.getenv("SCRAPE_STATE", os.path.join(DATA_DIR, "scrape_state.json"))
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/89.0.4389.82 Safari/537.36"
+)
+
+# Class names of the rendered menu cards (see the notebook's `extract_structured_data`).
+MENU_CARD_CLASS = "sc-iAVDmT bWpTfk"
+MENU_NAME_CLASS = "sc-cGCqpu chKhYc"
+MENU_BESTSELLER_CLASS = "sc-2gamf4-0 fSJGVb"
+MENU_TYPE_CLASS = "sc-eOnLuU dlDRKy"
+MENU_PRICE_CLASS = "sc-17hyc2s-1 cCiQWA"
+MENU_DESCRIPTION_CLASS = "sc-gsxalj jqiNmO"
+
+
+def folder_name(title: str) -> str:
+    """Restaurant folder name for a page title, e.g. "Punjab_Grill_Gomti_Nagar_order_online_Zomato"."""
+    return re.sub(r"[^a-zA-Z0-9]+", "_", title).strip("_")
+
+
+def _json_ld_blocks(soup) -> List[Dict[str, Any]]:
+    blocks = []
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads((script.string or "").strip())
+        except Exception as e:
+            print("Error parsing ld+json:", e)
+            continue
+        blocks.extend(d for d in (data if isinstance(data, list) else [data]) if isinstance(d, dict))
+    return blocks
+
+
+def _menu_cards(soup) -> List[Dict[str, Any]]:
+    menu_items = []
+    for item in soup.find_all("div", class_=MENU_CARD_CLASS):
+        try:
+            name_tag = item.find("h4", class_=MENU_NAME_CLASS)
+            bestseller_tag = item.find("div", class_=MENU_BESTSELLER_CLASS)
+            type_svg = item.find("svg", class_=MENU_TYPE_CLASS)
+            price_tag = item.find("span", class_=MENU_PRICE_CLASS)
+            desc_tag = item.find("p", class_=MENU_DESCRIPTION_CLASS)
+
+            dish_type = "unknown"
+            if type_svg:
+                svg_str = str(type_svg)
+                if "#veg-icon" in svg_str:
+                    dish_type = "veg"
+                elif "#non-veg-icon" in svg_str:
+                    dish_type = "non-veg"
+            price_text = price_tag.text.strip().replace("₹", "") if price_tag else "0"
+            digits = re.sub(r"[^\d]", "", price_text)
+
+            menu_items.append({
+                "name": name_tag.text.strip() if name_tag else "No name available",
+                "isBestseller": "BESTSELLER" in bestseller_tag.text.upper() if bestseller_tag else False,
+                "price": int(digits) if digits else 0,
+                "priceCurrency": "INR",
+                "description": desc_tag.text.strip() if desc_tag else "No description available",
+                "isVeg": dish_type,
+            })
+        except Exception as e:
+            print("Error extracting item:", e)
+    return menu_items
+
+
+def _json_ld_menu(menu: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flattens a schema.org Menu into menu items; entries without a name are skipped."""
+    menu_items = []
+    sections = [menu]
+    while sections:
+        section = sections.pop(0)
+        sections.extend(s for s in section.get("hasMenuSection") or [] if isinstance(s, dict))
+        for item in section.get("hasMenuItem") or []:
+            name = (item.get("name") or "").strip()
+            if not name:
+                continue
+            offers = item.get("offers") or {}
+            offers = offers[0] if isinstance(offers, list) and offers else offers
+            try:
+                price = int(float(offers.get("price") or 0))
+            except (TypeError, ValueError):
+                price = 0
+            diet = str(item.get("suitableForDiet") or "")
+            menu_items.append({
+                "name": name,
+                "isBestseller": False,
+                "price": price,
+                "priceCurrency": offers.get("priceCurrency") or "INR",
+                "description": (item.get("description") or "").strip() or "No description available",
+                "isVeg": "veg" if "Vegetarian" in diet or "Vegan" in diet else "unknown",
+            })
+    return menu_items
+
+
+def parse_page(html: str) -> Dict[str, Any]:
+    """
+    Parses one restaurant page with a single BeautifulSoup pass. Runs inside a worker process.
+
+    Menu items are read from the rendered menu cards when present, else
+    from the JSON-LD Menu (which plain HTTP responses carry).
+
+    Args:
+        html (str): Page HTML.
+
+    Returns:
+        Dict[str, Any]: `title`, `markdown` (the page text, as page.md),
+        `structured_data` ({"restaurant", "menu"} as structured_data.json),
+        `menu_source` ("cards", "json_ld" or None) and `complete`, which is
+        False when a browser render is needed.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string.strip() if soup.title and soup.title.string else "untitled"
+    blocks = _json_ld_blocks(soup)
+    restaurant = next((b for b in blocks if b.get("@type") == "Restaurant"), None)
+
+    menu_items, menu_source = _menu_cards(soup), "cards"
+    if not menu_items:
+        menu = next((b for b in blocks if b.get("@type") == "Menu"), None)
+        menu_items, menu_source = (_json_ld_menu(menu) if menu else []), "json_ld"
+    return {
+        "title": title,
+        "markdown": soup.get_text(separator="\n"),
+        "structured_data": {"restaurant": restaurant, "menu": {"@type": "Menu", "hasMenuItem": menu_items}},
+        "menu_source": menu_source if menu_items else None,
+        "complete": bool(restaurant and menu_items),
+    }
+
+
+def data_hash(structured_data: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(structured_data, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def load_state(path: str) -> Dict[str, Any]:
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"pages": {}}
+
+
+def save_state(state: Dict[str, Any], path: str) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _write(path: str, content: str) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _file_hash(path: str) -> Optional[str]:
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class HostRateLimiter:
+    """Spaces requests to the same host at least `interval` seconds apart; different hosts do not wait on each other."""
+
+    def __init__(self, interval: float = SCRAPE_HOST_INTERVAL_SECONDS):
+        self.interval = interval
+        self._next: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def wait(self, host: str) -> None:
+        if self.interval <= 0 or not host:  # local files have no host to protect
+            return
+        async with self._locks.setdefault(host, asyncio.Lock()):
+            delay = self._next.get(host, 0.0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next[host] = time.monotonic() + self.interval
+
+
+class HttpFetcher:
+    """
+    Conditional GETs with `requests`, run in threads.
+
+    `file://` URLs are read from disk, with the file size and mtime standing
+    in for the ETag, so saved pages exercise the same path offline.
+    """
+
+    def __init__(self, timeout: float = SCRAPE_TIMEOUT_SECONDS, pool_size: int = SCRAPE_CONCURRENCY):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            import requests
+
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            self._session = session
+        return self._session
+
+    async def fetch(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Fetches a page.
+
+        Returns:
+            Dict[str, Any]: `status` (304 when unchanged), `html`, `etag` and `last_modified`.
+        """
+        return await asyncio.to_thread(self._fetch, url, etag, last_modified)
+
+    def _fetch(self, url: str, etag: Optional[str], last_modified: Optional[str]) -> Dict[str, Any]:
+        parsed = urlparse(url)
+        if parsed.scheme == "file":
+            path = url2pathname(parsed.path)
+            stat = os.stat(path)
+            file_etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+            if etag == file_etag:
+                return {"status": 304, "html": None, "etag": etag, "last_modified": last_modified}
+            with open(path, "r", encoding="utf-8") as f:
+                return {"status": 200, "html": f.read(), "etag": file_etag, "last_modified": None}
+
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        response = self._get_session().get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return {"status": 304, "html": None, "etag": etag, "last_modified": last_modified}
+        response.raise_for_status()
+        return {
+            "status": response.status_code,
+            "html": response.content.decode(response.encoding or "utf-8", errors="replace"),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+
+
+class BrowserPool:
+    """
+    Up to `size` headless Chrome drivers, started on first use and shared by
+    the pages that need JavaScript rendering.
+    """
+
+    def __init__(self, size: int = SCRAPE_BROWSERS, render_seconds: float = BROWSER_RENDER_SECONDS):
+        self.size = size
+        self.render_seconds = render_seconds
+        self._drivers: List[Any] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    @staticmethod
+    def _start_driver():
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
+        options = Options()
+        for argument in ("--headless", "--disable-gpu", "--no-sandbox", "--disable-dev-shm-usage", f"--user-agent={USER_AGENT}"):
+            options.add_argument(argument)
+        return webdriver.Chrome(options=options)
+
+    async def _acquire(self):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+        if self._idle.empty() and len(self._drivers) < self.size:
+            self._drivers.append(None)  # reserve the slot before the slow start
+            try:
+                driver = await asyncio.to_thread(self._start_driver)
+            except Exception:
+                self._drivers.remove(None)
+                raise
+            self._drivers[self._drivers.index(None)] = driver
+            return driver
+        return await self._idle.get()
+
+    async def fetch(self, url: str) -> str:
+        """Loads `url` in a browser and returns the rendered HTML."""
+        if self.size <= 0:
+            raise RuntimeError("browser fallback is disabled")
+        driver = await self._acquire()
+        try:
+            return await asyncio.to_thread(self._render, driver, url)
+        finally:
+            self._idle.put_nowait(driver)
+
+    def _render(self, driver, url: str) -> str:
+        driver.get(url)
+        time.sleep(self.render_seconds)
+        return driver.page_source
+
+    def close(self) -> None:
+        for driver in self._drivers:
+            if driver is not None:
+                driver.quit()
+        self._drivers = []
+        self._idle = None
+
+
+class Scraper:
+    """
+    Scrapes restaurant pages into `output_dir`, at most `concurrency` pages at a time.
+
+    Each page goes through: conditional HTTP fetch -> (304: done) -> same
+    HTML bytes as last time (done) -> parse once in the process pool ->
+    browser render and re-parse when the HTML lacked the restaurant or menu
+    -> same restaurant/menu as last time (done) -> write the folder.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = DATA_DIR,
+        state_path: str = SCRAPE_STATE_PATH,
+        concurrency: int = SCRAPE_CONCURRENCY,
+        host_interval: float = SCRAPE_HOST_INTERVAL_SECONDS,
+        browsers: int = SCRAPE_BROWSERS,
+        workers: Optional[int] = None,
+        max_age_hours: float = 0.0,
+        force: bool = False,
+    ):
+        self.output_dir = output_dir
+        self.state_path = state_path
+        self.concurrency = concurrency
+        self.max_age = max_age_hours * 3600.0
+        self.force = force
+        self.workers = workers
+        self.http = HttpFetcher(pool_size=concurrency)
+        self.browsers = BrowserPool(browsers)
+        self.rate_limiter = HostRateLimiter(host_interval)
+        self.state = {"pages": {}} if force else load_state(state_path)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def run(self, urls: Sequence[str]) -> Dict[str, Any]:
+        """
+        Scrapes `urls`.
+
+        Returns:
+            Dict[str, Any]: Run summary with a count per outcome ("written",
+            "not_modified", "unchanged", "fresh", "failed") and per fetch path.
+        """
+        started = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        outcomes: Dict[str, int] = {}
+        via: Dict[str, int] = {}
+
+        async def one(url: str) -> None:
+            async with semaphore:
+                try:
+                    outcome, path = await self.scrape_page(url)
+                except Exception as e:
+                    print(f"Error scraping {url}: {e}")
+                    outcome, path = "failed", None
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            if path:
+                via[path] = via.get(path, 0) + 1
+
+        self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            await asyncio.gather(*(one(url) for url in dict.fromkeys(urls)))
+        finally:
+            self._pool.shutdown()
+            self._pool = None
+            self.http.close()
+            await asyncio.to_thread(self.browsers.close)
+        return {
+            "pages": len(set(urls)),
+            **{key: outcomes.get(key, 0) for key in ("written", "not_modified", "unchanged", "fresh", "failed")},
+            "via": via,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    async def _parse(self, html: str) -> Dict[str, Any]:
+        return await asyncio.get_running_loop().run_in_executor(self._pool, parse_page, html)
+
+    async def scrape_page(self, url: str):
+        """Scrapes one page; returns its outcome and fetch path ("http", "browser" or None)."""
+        pages = self.state["pages"]
+        previous = pages.get(url, {})
+        if previous and self.max_age and time.time() - previous.get("scraped_at", 0) < self.max_age:
+            return "fresh", None
+
+        host = urlparse(url).netloc
+        await self.rate_limiter.wait(host)
+        try:
+            response = await self.http.fetch(url, previous.get("etag"), previous.get("last_modified"))
+        except Exception as e:
+            print(f"HTTP fetch failed for {url} ({e}); rendering in a browser")
+            response = {"status": None, "html": None, "etag": None, "last_modified": None}
+
+        record = {**previous, "etag": response["etag"], "last_modified": response["last_modified"], "scraped_at": time.time()}
+        if response["status"] == 304:
+            pages[url] = record
+            self._save_state()
+            return "not_modified", "http"
+
+        html, page, path = response["html"], None, "http"
+        if html is not None:
+            html_hash = hashlib.sha256(html.encode("utf-8")).hexdigest()
+            if html_hash == previous.get("html_hash") and previous.get("complete"):
+                pages[url] = record
+                self._save_state()
+                return "unchanged", path
+            page = await self._parse(html)
+        if page is None or not page["complete"]:
+            await self.rate_limiter.wait(host)
+            html, path = await self.browsers.fetch(url), "browser"
+            page = await self._parse(html)
+            if not page["complete"]:
+                print(f"No restaurant or menu items found on {url}")
+
+        folder = os.path.join(self.output_dir, folder_name(page["title"]))
+        html_hash = hashlib.sha256(html.encode("utf-8")).hexdigest()
+        content_hash = data_hash(page["structured_data"])
+        record.update({
+            "folder": os.path.basename(folder),
+            "html_hash": html_hash,
+            "data_hash": content_hash,
+            "menu_items": len(page["structured_data"]["menu"]["hasMenuItem"]),
+            "menu_source": page["menu_source"],
+            "complete": page["complete"],
+            "via": path,
+        })
+        unchanged = (
+            os.path.isdir(folder)
+            and not self.force
+            and (content_hash == previous.get("data_hash") or html_hash == _file_hash(os.path.join(folder, "page.html")))
+        )
+        if not unchanged:
+            os.makedirs(folder, exist_ok=True)
+            _write(os.path.join(folder, "page.html"), html)
+            _write(os.path.join(folder, "page.md"), page["markdown"])
+            _write(os.path.join(folder, "structured_data.json"), json.dumps(page["structured_data"], indent=2, ensure_ascii=False))
+            print(f"Scraped {record['menu_items']} menu items for {record['folder']} via {path}")
+        pages[url] = record
+        self._save_state()
+        return ("unchanged" if unchanged else "written"), path
+
+    def _save_state(self) -> None:
+        # Runs on the event loop between awaits, so concurrent pages never interleave writes.
+        save_state(self.state, self.state_path)
+
+
+def fixture_urls(fixtures_dir: str) -> List[str]:
+    """`file://` URLs of the saved page.html files under `fixtures_dir`."""
+    urls = []
+    for name in sorted(os.listdir(fixtures_dir)):
+        path = os.path.abspath(os.path.join(fixtures_dir, name, "page.html"))
+        if os.path.isfile(path):
+            urls.append("file://" + path)
+    return urls
+
+
+def read_urls(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def scrape(urls: Iterable[str], **kwargs) -> Dict[str, Any]:
+    """Runs a `Scraper` over `urls`; keyword arguments go to `Scraper`."""
+    return asyncio.run(Scraper(**kwargs).run(list(urls)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scrape restaurant pages into the data directory.")
+    parser.add_argument("--urls", default=None, help="File with one URL per line; defaults to the built-in list.")
+    parser.add_argument("--output-dir", default=DATA_DIR)
+    parser.add_argument("--state", default=None, help="Scrape state file; defaults to scrape_state.json in the output dir.")
+    parser.add_argument("--concurrency", type=int, default=SCRAPE_CONCURRENCY)
+    parser.add_argument("--host-interval", type=float, default=SCRAPE_HOST_INTERVAL_SECONDS, help="Seconds between requests to one host.")
+    parser.add_argument("--browsers", type=int, default=SCRAPE_BROWSERS, help="Headless Chrome drivers for the fallback; 0 disables it.")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes.")
+    parser.add_argument("--max-age-hours", type=float, default=0.0, help="Skip pages scraped more recently than this (resume).")
+    parser.add_argument("--force", action="store_true", help="Ignore the saved state and rewrite every page.")
+    parser.add_argument("--fixtures", default=None, help="Scrape the saved page.html files under DIR instead of the network.")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        urls = fixture_urls(args.fixtures)
+        browsers = 0
+    else:
+        urls = read_urls(args.urls) if args.urls else URLS
+        browsers = args.browsers
+    summary = scrape(
+        urls,
+        output_dir=args.output_dir,
+        state_path=args.state or os.path.join(args.output_dir, "scrape_state.json"),
+        concurrency=args.concurrency,
+        host_interval=args.host_interval,
+        browsers=browsers,
+        workers=args.workers,
+        max_age_hours=args.max_age_hours,
+        force=args.force,
+    )
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
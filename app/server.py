@@ -1,16 +1,54 @@
 # server.py
 
+import asyncio
+import json
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from graph import graph
-from typing import Any, Dict
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from graph import graph, memory
+from llm_client import LLMOverloaded, LLMUnavailable
+from resources import resources
+from sessions import SessionManager, open_checkpointer
+from tracing import METRICS_ENABLED, format_server_timing, metrics, start_trace
+from typing import Any, AsyncIterator, Dict
+
+# "background" warms models and connections after startup, "eager" blocks startup
+# until they are ready, "lazy" builds each one on first use.
+WARMUP_MODE = os.getenv("WARMUP_MODE", "background")
+# Attach a per-request span breakdown to every response, not only to requests sending "X-Trace: 1".
+TRACE_ALL_REQUESTS = os.getenv("TRACE_ALL_REQUESTS", "0") == "1"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Opens the conversation checkpointer, starts resource warmup on startup and releases workers on shutdown."""
+    async with open_checkpointer(memory) as checkpointer:
+        graph.checkpointer = checkpointer
+        await sessions.attach(checkpointer)
+        warmup_task = None
+        if WARMUP_MODE == "eager":
+            await resources.awarmup()
+        elif WARMUP_MODE == "background":
+            warmup_task = asyncio.create_task(resources.awarmup())
+        yield
+        if warmup_task is not None and not warmup_task.done():
+            await warmup_task
+        resources.close()
+        graph.checkpointer = memory
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="LangGraph API",
     description="An API for interacting with the LangGraph agent.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Setup CORS middleware to allow requests from any origin
@@ -22,43 +60,269 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@app.post("/agent", summary="Run the LangGraph agent", response_description="Agent response message")
-async def run_agent(request: Request) -> str:
-    """
-    POST endpoint to interact with the LangGraph agent.
+sessions = SessionManager(memory)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Records request latency by route and status; streamed bodies are timed until headers are sent."""
+    started = time.perf_counter()
+    response = await call_next(request)
+    if METRICS_ENABLED:
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        metrics.observe("http_request_seconds", time.perf_counter() - started, path=path, status=str(response.status_code))
+    return response
+
+if os.getenv("PRELOAD_RESOURCES") == "1":
+    # Load in the master before forking so workers share the weights copy-on-write.
+    resources.preload()
+
+# Graph nodes reported as progress events by the streaming endpoint.
+STREAMED_NODES = {"route_query", "chatbot", "call_db", "menu_query", "generate_response"}
+# Nodes whose LLM tokens are forwarded to the client as they are produced.
+TOKEN_NODES = {"generate_response"}
+
+
+def trace_requested(request: Request) -> bool:
+    return TRACE_ALL_REQUESTS or request.headers.get("X-Trace") == "1"
+
 
-    Expects a JSON body containing a 'query' field.
-    Returns the latest message content from the agent's response.
+def admit_request() -> None:
     """
+    Refuses a request up front with 429 when the LLM call queue is already full,
+    before any embedding or retrieval work is spent on it.
+    """
+    if not resources.is_loaded("llm_client"):
+        return
+    try:
+        resources.get("llm_client").check_admission()
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)}) from e
+
+
+def llm_error_response(error: Exception) -> HTTPException:
+    """Maps LLM admission and availability errors to 429/503 with Retry-After, anything else to 500."""
+    if isinstance(error, LLMOverloaded):
+        return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+    if isinstance(error, LLMUnavailable):
+        return HTTPException(status_code=503, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+    return HTTPException(status_code=500, detail=f"Error invoking LangGraph agent: {str(error)}")
+
+
+def resolve_session_id(request: Request, body: Dict[str, Any]) -> str:
+    """Returns the client's session id from the body or X-Session-ID header, or a new one."""
+    return str(body.get("session_id") or request.headers.get("X-Session-ID") or uuid.uuid4().hex)
+
+
+async def read_query(request: Request) -> Dict[str, Any]:
+    """Parses the JSON body and validates that it carries a 'query'."""
     try:
         body: Dict[str, Any] = await request.json()
     except Exception as e:
         raise HTTPException(status_code=400, detail="Invalid JSON body") from e
 
-    query = body.get("query")
-    
-    if not query:
+    if not body.get("query"):
         raise HTTPException(status_code=400, detail="The 'query' field is required.")
+    return body
+
+
+@app.post("/agent", summary="Run the LangGraph agent", response_description="Agent response message")
+async def run_agent(request: Request, response: Response) -> str:
+    """
+    POST endpoint to interact with the LangGraph agent.
+
+    Expects a JSON body containing a 'query' field and optionally a 'session_id'
+    (or an X-Session-ID header). Each session gets its own conversation thread;
+    the session id is echoed back in the X-Session-ID response header.
+    Returns the latest message content from the agent's response. With an
+    "X-Trace: 1" request header the per-node and external call timings are
+    returned in a Server-Timing response header. Answers 429 when the LLM
+    queue is full and 503 when the LLM keeps failing, both with Retry-After.
+    """
+    body = await read_query(request)
+    query = body["query"]
+    admit_request()
+
+    session_id = resolve_session_id(request, body)
+    response.headers["X-Session-ID"] = session_id
+    await sessions.touch(session_id)
 
     input_data = {
         "messages": query
     }
 
+    trace = start_trace() if trace_requested(request) else None
+    started = time.perf_counter()
     try:
-        response = await graph.ainvoke(input_data, config={"thread_id": "1"})
+        result = await graph.ainvoke(input_data, config={"configurable": {"thread_id": session_id}})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error invoking LangGraph agent: {str(e)}") from e
+        raise llm_error_response(e) from e
+    if trace is not None:
+        response.headers["Server-Timing"] = format_server_timing(trace, time.perf_counter() - started)
 
-    if not response or 'messages' not in response or not response['messages']:
+    if not result or 'messages' not in result or not result['messages']:
         raise HTTPException(status_code=500, detail="Invalid response structure from LangGraph agent.")
 
     # Return the content of the last message
-    return response['messages'][-1].content
+    return result['messages'][-1].content
+
+
+async def stream_events(input_data: Dict[str, Any], session_id: str, trace: bool = False) -> AsyncIterator[str]:
+    """
+    Runs the graph and yields NDJSON events.
+
+    Event types: "session", "node_start", "node_end", "token" (generate_response
+    output as it is produced), "reset" (discard the tokens received so far: a
+    retried or fallback LLM call is streaming the answer again), "trace" (span timings in ms, only when `trace`
+    is set), "done" (final message content) and "error" (with the HTTP-style
+    `status`, and `retry_after` seconds for 429/503).
+    """
+    config = {"configurable": {"thread_id": session_id}}
+    spans = start_trace() if trace else None
+    started = time.perf_counter()
+    yield json.dumps({"type": "session", "session_id": session_id}) + "\n"
+    # Model call whose tokens were last sent, per token-streaming node.
+    streamed_runs: Dict[str, str] = {}
+    try:
+        async for event in graph.astream_events(input_data, config=config, version="v2"):
+            kind = event["event"]
+            node = event.get("metadata", {}).get("langgraph_node")
+            if kind in ("on_chain_start", "on_chain_end") and event["name"] in STREAMED_NODES and node == event["name"]:
+                phase = "node_start" if kind == "on_chain_start" else "node_end"
+                yield json.dumps({"type": phase, "node": node}) + "\n"
+            elif kind == "on_chat_model_stream" and node in TOKEN_NODES:
+                content = event["data"]["chunk"].content
+                if isinstance(content, str) and content:
+                    # A retried or fallback LLM call streams its answer again from the start.
+                    if streamed_runs.get(node, event["run_id"]) != event["run_id"]:
+                        yield json.dumps({"type": "reset", "node": node}) + "\n"
+                    streamed_runs[node] = event["run_id"]
+                    yield json.dumps({"type": "token", "content": content}) + "\n"
+        state = await graph.aget_state(config)
+        messages = state.values.get("messages", [])
+        final = messages[-1].content if messages else ""
+        if spans is not None:
+            timings = [{"span": name, "ms": round(seconds * 1000, 1)} for name, seconds in spans]
+            timings.append({"span": "total", "ms": round((time.perf_counter() - started) * 1000, 1)})
+            yield json.dumps({"type": "trace", "spans": timings}) + "\n"
+        yield json.dumps({"type": "done", "content": final}) + "\n"
+    except Exception as e:
+        error = llm_error_response(e)
+        event = {"type": "error", "status": error.status_code, "detail": error.detail}
+        if error.headers:
+            event["retry_after"] = int(error.headers["Retry-After"])
+        yield json.dumps(event) + "\n"
+
+
+@app.post("/agent/stream", summary="Run the LangGraph agent with streaming", response_description="NDJSON event stream")
+async def stream_agent(request: Request) -> StreamingResponse:
+    """
+    POST endpoint that streams the agent's progress and answer as newline-delimited JSON.
+
+    Accepts the same body as /agent. Node progress events are emitted as the graph
+    moves through chatbot, call_db/menu_query and generate_response, and the final
+    answer's tokens are streamed as soon as the LLM produces them.
+    """
+    body = await read_query(request)
+    admit_request()
+    session_id = resolve_session_id(request, body)
+    await sessions.touch(session_id)
+    return StreamingResponse(
+        stream_events({"messages": body["query"]}, session_id, trace=trace_requested(request)),
+        media_type="application/x-ndjson",
+        headers={"X-Session-ID": session_id, "Cache-Control": "no-cache"},
+    )
+
+
+@app.get("/stats", summary="Runtime metrics", response_description="Embedding, search and cache counters")
+async def stats() -> Dict[str, Any]:
+    """
+    GET endpoint exposing batching and cache metrics for capacity planning and threshold tuning.
+    """
+    component_stats: Dict[str, Any] = {"sessions": sessions.stats()}
+    # Report only what is already loaded; a metrics scrape must not trigger a cold start.
+    for key, name in (
+        ("embedding", "embedder"),
+        ("search", "searcher"),
+        ("cache", "query_cache"),
+        ("prefetch", "prefetch_cache"),
+        ("router", "query_router"),
+        ("llm", "llm_client"),
+    ):
+        if resources.is_loaded(name):
+            component_stats[key] = resources.get(name).stats()
+    return component_stats
+
+
+@app.get("/metrics", summary="Prometheus metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    """
+    GET endpoint exposing span latencies, payload sizes, LLM token counts and
+    the /stats counters in the Prometheus text exposition format.
+    """
+    gauges: Dict[str, Any] = {
+        "active_sessions": ("Conversation sessions currently tracked.", {(): sessions.stats()["active_sessions"]}),
+        "evicted_sessions": ("Sessions evicted since startup.", {(): sessions.stats()["evicted_sessions"]}),
+        "resource_ready": (
+            "1 when a lazily built resource is loaded.",
+            {(("resource", name),): int(state == "ready") for name, state in resources.status()["resources"].items()},
+        ),
+    }
+    if resources.is_loaded("embedder"):
+        embedding = resources.get("embedder").stats()
+        gauges["embed_queue_pending"] = ("Texts waiting for an embedding batch.", {(): embedding["pending"]})
+        gauges["embed_mean_batch_size"] = ("Mean embedding batch size since startup.", {(): embedding["mean_batch_size"]})
+    if resources.is_loaded("searcher"):
+        search = resources.get("searcher").stats()
+        gauges["search_vectors_per_round_trip"] = ("Query vectors per Milvus round-trip.", {(): search["vectors_per_round_trip"]})
+    if resources.is_loaded("query_cache"):
+        cache = resources.get("query_cache").stats()
+        gauges["cache_lookups"] = ("Semantic cache lookups since startup.", {
+            (("namespace", ns), ("result", result)): counts[field]
+            for ns, counts in cache["namespaces"].items()
+            for result, field in (("hit", "hits"), ("miss", "misses"))
+        })
+        gauges["cache_entries"] = ("Entries in the semantic cache.", {(): cache["entries"]})
+    if resources.is_loaded("query_router"):
+        router = resources.get("query_router").stats()
+        gauges["router_decisions"] = ("Router decisions since startup.", {
+            (("kind", kind),): count for kind, count in router["decisions"].items()
+        })
+    if resources.is_loaded("llm_client"):
+        llm = resources.get("llm_client").stats()
+        gauges["llm_in_flight"] = ("LLM calls running, by model pool.", {
+            (("model", pool),): running for pool, running in llm["running"].items()
+        })
+        gauges["llm_queue_length"] = ("LLM calls waiting for a slot.", {(): llm["queued"]})
+    return PlainTextResponse(metrics.render(gauges), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/healthz", summary="Liveness probe")
+async def healthz() -> Dict[str, str]:
+    """Returns 200 as long as the process is serving requests."""
+    return {"status": "alive"}
+
+
+@app.get("/readyz", summary="Readiness probe")
+async def readyz() -> JSONResponse:
+    """Returns 200 once every resource has warmed up, 503 with per-resource status until then."""
+    status = resources.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 
 def main() -> None:
-    """Entrypoint for running the FastAPI application with Uvicorn."""
-    uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True)
+    """
+    Entrypoint for running the FastAPI application with Uvicorn.
+
+    UVICORN_RELOAD=1 (default) enables auto-reload for development. With
+    UVICORN_WORKERS > 1 each worker process warms its own copy of the models;
+    to share one copy-on-write copy, run a pre-forking server instead, e.g.
+    `PRELOAD_RESOURCES=1 gunicorn -k uvicorn.workers.UvicornWorker --preload -w 4 server:app`.
+    """
+    workers = int(os.getenv("UVICORN_WORKERS", "1"))
+    reload = os.getenv("UVICORN_RELOAD", "1") == "1" and workers == 1
+    uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=reload, workers=workers)
 
 
 if __name__ == "__main__":
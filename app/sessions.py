@@ -0,0 +1,219 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage, SystemMessage
+from langgraph.checkpoint.base.id import UUID
+from langgraph.checkpoint.memory import MemorySaver
+
+CHECKPOINTER = os.getenv("CHECKPOINTER", "memory")  # "memory" or "sqlite"
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite")
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+SESSION_IDLE_TTL_SECONDS = float(os.getenv("SESSION_IDLE_TTL_SECONDS", "3600"))
+MAX_CHECKPOINTS_PER_SESSION = int(os.getenv("MAX_CHECKPOINTS_PER_SESSION", "8"))
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "6"))
+HISTORY_MAX_STORED_TURNS = int(os.getenv("HISTORY_MAX_STORED_TURNS", "20"))
+HISTORY_MODE = os.getenv("HISTORY_MODE", "window")  # "window" or "summary"
+# 100 ns intervals between the UUID epoch (1582-10-15) and the Unix epoch.
+UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+def checkpoint_time(checkpoint_id: str) -> float:
+    """Returns when a checkpoint was written (Unix seconds), read from its uuid6 id; now if the id is not a uuid6."""
+    try:
+        uuid = UUID(checkpoint_id)
+    except ValueError:
+        return time.time()
+    if uuid.version != 6:
+        return time.time()
+    return (uuid.time - UUID_EPOCH_OFFSET) / 1e7
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver that keeps only the newest `max_checkpoints` checkpoints per thread.
+
+    The stock MemorySaver keeps every checkpoint of every step forever. Older
+    checkpoints, their pending writes and any channel blobs no longer
+    referenced by a kept checkpoint are dropped on each `put`.
+    """
+
+    def __init__(self, max_checkpoints: int = MAX_CHECKPOINTS_PER_SESSION, **kwargs):
+        super().__init__(**kwargs)
+        self.max_checkpoints = max(1, max_checkpoints)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = result["configurable"]["thread_id"]
+        checkpoint_ns = result["configurable"]["checkpoint_ns"]
+        self._prune(thread_id, checkpoint_ns)
+        return result
+
+    def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints:
+            return
+        # Checkpoint ids are time-ordered (uuid6), so sorting gives age order.
+        ordered = sorted(checkpoints)
+        for checkpoint_id in ordered[:-self.max_checkpoints]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        blobs = getattr(self, "blobs", None)
+        if blobs is None:
+            return
+        referenced = set()
+        for serialized, _, _ in checkpoints.values():
+            for channel, version in self.serde.loads_typed(serialized).get("channel_versions", {}).items():
+                referenced.add((thread_id, checkpoint_ns, channel, version))
+        for key in [k for k in blobs if k[0] == thread_id and k[1] == checkpoint_ns and k not in referenced]:
+            del blobs[key]
+
+    async def athread_activity(self) -> Dict[str, float]:
+        """Returns each stored thread's last checkpoint time (Unix seconds)."""
+        return {
+            thread_id: checkpoint_time(max(max(checkpoints) for checkpoints in namespaces.values() if checkpoints))
+            for thread_id, namespaces in self.storage.items()
+            if any(namespaces.values())
+        }
+
+
+@asynccontextmanager
+async def open_checkpointer(default) -> AsyncIterator:
+    """
+    Opens the graph checkpointer selected by the CHECKPOINTER env var for the server's lifetime.
+
+    "memory" (default) yields `default`, the in-process saver the graph was
+    compiled with. "sqlite" persists state to CHECKPOINT_DB so conversations
+    survive restarts; the connection is closed on exit.
+
+    Args:
+        default: The in-process checkpointer.
+
+    Yields:
+        The checkpointer to run the graph with.
+    """
+    if CHECKPOINTER != "sqlite":
+        yield default
+        return
+    from sqlite_checkpointer import BoundedSqliteSaver
+
+    async with BoundedSqliteSaver.from_conn_string(CHECKPOINT_DB) as saver:
+        await saver.setup()
+        yield saver
+
+
+class SessionManager:
+    """
+    Tracks live conversation threads and evicts them from the checkpointer.
+
+    Sessions are kept in least-recently-used order. Touching a session evicts
+    any that have been idle longer than `idle_ttl_seconds`, then the least
+    recently used ones until at most `max_sessions` remain. `attach` starts
+    tracking the sessions a persistent checkpointer already holds, aged by
+    their last checkpoint.
+    """
+
+    def __init__(self, checkpointer, max_sessions: int = MAX_SESSIONS, idle_ttl_seconds: float = SESSION_IDLE_TTL_SECONDS):
+        self.checkpointer = checkpointer
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._evicted = 0
+
+    async def attach(self, checkpointer) -> None:
+        """Switches to `checkpointer`, tracks the sessions it already stores and evicts idle or excess ones."""
+        activity = await checkpointer.athread_activity() if hasattr(checkpointer, "athread_activity") else {}
+        async with self._lock:
+            self.checkpointer = checkpointer
+            # Wall-clock checkpoint times mapped onto the monotonic clock `touch` uses.
+            offset = time.monotonic() - time.time()
+            for sid, seen in sorted(activity.items(), key=lambda pair: pair[1]):
+                if sid not in self._last_seen:
+                    self._last_seen[sid] = seen + offset
+            self._last_seen = OrderedDict(sorted(self._last_seen.items(), key=lambda pair: pair[1]))
+            await self._evict(time.monotonic())
+
+    async def touch(self, session_id: str) -> None:
+        """Marks a session as active and evicts idle or excess sessions."""
+        async with self._lock:
+            now = time.monotonic()
+            self._last_seen[session_id] = now
+            self._last_seen.move_to_end(session_id)
+            await self._evict(now, keep=session_id)
+
+    async def _evict(self, now: float, keep: Optional[str] = None) -> None:
+        evict: List[str] = []
+        for sid, seen in self._last_seen.items():
+            if sid == keep:
+                continue
+            if now - seen > self.idle_ttl_seconds or len(self._last_seen) - len(evict) > self.max_sessions:
+                evict.append(sid)
+            else:
+                break
+        for sid in evict:
+            del self._last_seen[sid]
+            await self.checkpointer.adelete_thread(sid)
+            self._evicted += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"active_sessions": len(self._last_seen), "evicted_sessions": self._evicted}
+
+
+def _turn_starts(messages: Sequence[BaseMessage]) -> List[int]:
+    return [i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)]
+
+
+def window_messages(
+    messages: Sequence[BaseMessage],
+    max_turns: int = HISTORY_MAX_TURNS,
+    mode: str = HISTORY_MODE,
+) -> List[BaseMessage]:
+    """
+    Bounds the history sent to the LLM to the last `max_turns` user turns.
+
+    The cut is always made at a HumanMessage so tool calls and their
+    ToolMessages are never separated. In "summary" mode the questions from the
+    dropped turns are prepended as a one-line recap instead of being lost.
+
+    Args:
+        messages (Sequence[BaseMessage]): Full conversation.
+        max_turns (int): Number of most recent user turns to keep.
+        mode (str): "window" or "summary".
+
+    Returns:
+        List[BaseMessage]: The bounded message list.
+    """
+    starts = _turn_starts(messages)
+    if max_turns <= 0 or len(starts) <= max_turns:
+        return list(messages)
+    cut = starts[-max_turns]
+    kept = list(messages[cut:])
+    if mode == "summary":
+        earlier = [msg.content for msg in messages[:cut] if isinstance(msg, HumanMessage) and isinstance(msg.content, str)]
+        if earlier:
+            recap = "Earlier in this conversation the user asked: " + " | ".join(q[:200] for q in earlier[-10:])
+            kept.insert(0, SystemMessage(recap))
+    return kept
+
+
+def stale_message_removals(messages: Sequence[BaseMessage], keep_turns: int = HISTORY_MAX_STORED_TURNS) -> List[RemoveMessage]:
+    """
+    Returns RemoveMessage updates that trim stored state to the last `keep_turns` user turns.
+
+    Args:
+        messages (Sequence[BaseMessage]): Current state messages.
+        keep_turns (int): Number of most recent user turns to retain in state.
+
+    Returns:
+        List[RemoveMessage]: Removals to merge into a node's returned messages.
+    """
+    starts = _turn_starts(messages)
+    if keep_turns <= 0 or len(starts) <= keep_turns:
+        return []
+    cut = starts[-keep_turns]
+    return [RemoveMessage(id=msg.id) for msg in messages[:cut] if msg.id]
@@ -0,0 +1,51 @@
+from typing import Dict
+
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from sessions import MAX_CHECKPOINTS_PER_SESSION, checkpoint_time
+
+
+class BoundedSqliteSaver(AsyncSqliteSaver):
+    """
+    AsyncSqliteSaver that keeps only the newest `max_checkpoints` checkpoints per thread.
+
+    The sqlite counterpart of `sessions.BoundedMemorySaver`: after each `aput`
+    older checkpoints of the thread, and the pending writes of checkpoints no
+    longer kept, are deleted. Open it with `from_conn_string` so the
+    connection is awaited and closed with the server.
+    """
+
+    def __init__(self, conn, max_checkpoints: int = MAX_CHECKPOINTS_PER_SESSION, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.max_checkpoints = max(1, max_checkpoints)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        result = await super().aput(config, checkpoint, metadata, new_versions)
+        await self._prune(result["configurable"]["thread_id"], result["configurable"]["checkpoint_ns"])
+        return result
+
+    async def athread_activity(self) -> Dict[str, float]:
+        """Returns each stored thread's last checkpoint time (Unix seconds)."""
+        await self.setup()
+        async with self.lock, self.conn.execute(
+            "SELECT thread_id, MAX(checkpoint_id) FROM checkpoints GROUP BY thread_id"
+        ) as cursor:
+            rows = await cursor.fetchall()
+        return {thread_id: checkpoint_time(checkpoint_id) for thread_id, checkpoint_id in rows}
+
+    async def _prune(self, thread_id: str, checkpoint_ns: str) -> None:
+        # Checkpoint ids are time-ordered (uuid6), so the newest sort last.
+        async with self.lock, self.conn.cursor() as cursor:
+            await cursor.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT ?)",
+                (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.max_checkpoints),
+            )
+            if cursor.rowcount:
+                await cursor.execute(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                    "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)",
+                    (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+                )
+            await self.conn.commit()
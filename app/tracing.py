@@ -0,0 +1,225 @@
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRIC_PREFIX = "genai_"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+METRIC_HELP = {
+    "span_seconds": ("histogram", "Duration of instrumented graph nodes and external calls."),
+    "payload_bytes": ("histogram", "Size of prompts, retrieved context and responses."),
+    "llm_calls_total": ("counter", "LLM calls by graph node."),
+    "llm_tokens_total": ("counter", "LLM tokens by graph node and direction, as reported by the provider."),
+    "http_request_seconds": ("histogram", "HTTP request duration by route and status."),
+    "errors_total": ("counter", "Spans that ended with an exception."),
+    "llm_admission_total": ("counter", "LLM call admission outcomes: admitted, queued, fallback_saturated, fallback_error, rejected."),
+    "llm_retries_total": ("counter", "Retried LLM attempts by node, model and error."),
+    "retrieval_total": ("counter", "call_db retrievals by path: exact_name (lexical index only) or vector."),
+    "prefetch_total": ("counter", "Speculative retrievals by outcome: started, hit, miss, unused or failed."),
+    "context_chunks_total": ("counter", "Retrieved chunks by context packing outcome: packed, duplicate or over_budget."),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Spans finished during the current request, when a trace was requested; see `start_trace`.
+_trace: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("trace", default=None)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms rendered in the Prometheus text format.
+
+    Recording is a dict lookup and a few additions under one lock, cheap
+    enough to leave on for every request. Bucket counts are stored
+    per bucket and accumulated only when rendered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, LabelKey], _Histogram] = {}
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def render(self, gauges: Optional[Dict[str, Tuple[str, Dict[Tuple[Tuple[str, str], ...], float]]]] = None) -> str:
+        """
+        Formats every metric in the Prometheus text exposition format.
+
+        Args:
+            gauges (Dict): Extra point-in-time values, name -> (help, {label key: value}).
+
+        Returns:
+            str: The exposition text.
+        """
+        with self._lock:
+            histograms = {key: (h.buckets, list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines: List[str] = []
+        described = set()
+
+        def describe(name: str, kind: str, text: str) -> None:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {METRIC_PREFIX}{name} {text}")
+                lines.append(f"# TYPE {METRIC_PREFIX}{name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            describe(name, *METRIC_HELP.get(name, ("counter", name)))
+            lines.append(f"{METRIC_PREFIX}{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+            describe(name, *METRIC_HELP.get(name, ("histogram", name)))
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels(labels + (('le', _number(bound)),))} {cumulative}")
+            lines.append(f"{METRIC_PREFIX}{name}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{METRIC_PREFIX}{name}_sum{_labels(labels)} {_number(total)}")
+            lines.append(f"{METRIC_PREFIX}{name}_count{_labels(labels)} {count}")
+        for name, (text, values) in sorted((gauges or {}).items()):
+            describe(name, "gauge", text)
+            for labels, value in sorted(values.items()):
+                lines.append(f"{METRIC_PREFIX}{name}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = MetricsRegistry()
+
+
+def observe(span_name: str, seconds: float) -> None:
+    """Records a duration measured elsewhere, without adding it to the request trace."""
+    if METRICS_ENABLED:
+        metrics.observe("span_seconds", seconds, span=span_name)
+
+
+def record_size(kind: str, size: int) -> None:
+    """Records a payload size in bytes (or characters for text)."""
+    if METRICS_ENABLED:
+        metrics.observe("payload_bytes", size, buckets=SIZE_BUCKETS, kind=kind)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Times the enclosed block.
+
+    The duration goes to the `span_seconds` histogram and, when the current
+    request asked for a trace, to that trace as well. Works in both sync and
+    async code; in worker threads without a trace only the metric is kept.
+    """
+    if not METRICS_ENABLED and _trace.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        if METRICS_ENABLED:
+            metrics.inc("errors_total", span=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        if METRICS_ENABLED:
+            metrics.observe("span_seconds", elapsed, span=name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, elapsed))
+
+
+def traced_node(name: str) -> Callable:
+    """Decorator wrapping an async graph node in a `node.<name>` span."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(f"node.{name}"):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_llm_call(node: str, prompt_chars: int, response: Any) -> None:
+    """
+    Counts an LLM call with its prompt size and the provider's token usage.
+
+    Args:
+        node (str): Graph node that made the call.
+        prompt_chars (int): Total characters sent.
+        response: The returned message; `usage_metadata` is read when present.
+    """
+    if not METRICS_ENABLED:
+        return
+    metrics.inc("llm_calls_total", node=node)
+    metrics.observe("payload_bytes", prompt_chars, buckets=SIZE_BUCKETS, kind=f"llm_prompt.{node}")
+    usage = getattr(response, "usage_metadata", None) or {}
+    for direction, field in (("input", "input_tokens"), ("output", "output_tokens")):
+        if usage.get(field):
+            metrics.inc("llm_tokens_total", usage[field], node=node, direction=direction)
+
+
+def start_trace() -> List[Tuple[str, float]]:
+    """Starts collecting the spans of the current request and returns the list they are added to."""
+    trace: List[Tuple[str, float]] = []
+    _trace.set(trace)
+    return trace
+
+
+def format_server_timing(trace: Sequence[Tuple[str, float]], total_seconds: Optional[float] = None) -> str:
+    """
+    Formats a trace as a `Server-Timing` header value (durations in milliseconds).
+
+    Repeated spans (e.g. two parallel `call_db` calls) are listed once each,
+    in the order they finished.
+    """
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in trace]
+    if total_seconds is not None:
+        entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
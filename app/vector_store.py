@@ -0,0 +1,393 @@
+import json
+import os
+import re
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from arraystore import decode_string, encode_strings, exists, fixed_width, load_arrays, save_arrays
+from retrieval import ID_IN_EXPR, InMemoryHit, matches_expr
+
+# "milvus" (remote collection) or "local" (memory-mapped index on disk).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "milvus")
+VECTOR_INDEX_DIR = os.getenv(
+    "VECTOR_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "indexes", "vectors"),
+)
+# float16 halves the file size and page-cache footprint; scores are computed in float32 either way.
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float16")
+# Number of IVF lists; 0 keeps exact search, which is the right choice below roughly 100k chunks.
+VECTOR_INDEX_NLIST = int(os.getenv("VECTOR_INDEX_NLIST", "0"))
+# Rows scored per block when the stored vectors need converting to float32.
+SCORE_BLOCK_ROWS = 8192
+KMEANS_ITERATIONS = 20
+FORMAT_VERSION = 1
+ARRAY_NAMES = ("embeddings", "ids", "restaurant_ids", "restaurants", "restaurant_offsets", "content_offsets", "content")
+IVF_ARRAY_NAMES = ("centroids", "list_offsets", "list_rows")
+RESTAURANT_EXPR = re.compile(r'^\s*restaurant\s*==\s*"((?:[^"\\]|\\.)*)"\s*$')
+
+
+class LocalVectorStore:
+    """
+    Read-only, memory-mapped stand-in for the Milvus knowledge_base collection.
+
+    Chunk vectors are one (rows x dim) float16 or float32 matrix, rows grouped
+    by restaurant so a restaurant filter is a contiguous slice, with ids,
+    restaurant ids and a UTF-8 content blob alongside. Search is an exact
+    NumPy inner product with `argpartition` top-k. When the index was written
+    with IVF lists, unfiltered searches only score the `nprobe` lists whose
+    centroids are closest to the query.
+
+    The arrays are opened with `mmap_mode="r"`: every uvicorn worker maps the
+    same files, so the matrix lives once in the page cache however many
+    workers serve it. Implements the part of the `Collection` API used by
+    `MilvusSearchBatcher` and the app (`search`, `query`, `load`, `flush`,
+    `num_entities`).
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        self.name = meta.get("name", "knowledge_base")
+        self.meta = meta
+        for name in ARRAY_NAMES + IVF_ARRAY_NAMES:
+            setattr(self, name, arrays.get(name))
+        self._restaurant_ids_by_source = {
+            source.decode("utf-8"): i for i, source in enumerate(self.restaurants.tolist())
+        }
+        self.search_calls = 0
+
+    @classmethod
+    def open(cls, directory: str = VECTOR_INDEX_DIR, mmap: bool = True) -> "LocalVectorStore":
+        """
+        Opens an index written by `LocalVectorWriter`.
+
+        Args:
+            directory (str): Index directory.
+            mmap (bool): Memory-map the arrays instead of reading them into memory.
+
+        Returns:
+            LocalVectorStore: The store.
+        """
+        arrays, meta = load_arrays(directory, ARRAY_NAMES, mmap)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Vector index at {directory} has format {meta.get('version')}, expected {FORMAT_VERSION}.")
+        if meta.get("nlist"):
+            arrays.update(load_arrays(directory, IVF_ARRAY_NAMES, mmap)[0])
+        return cls(arrays, meta)
+
+    @staticmethod
+    def build_arrays(
+        rows: Sequence[Dict[str, Any]],
+        dtype: str = VECTOR_INDEX_DTYPE,
+        nlist: int = VECTOR_INDEX_NLIST,
+        vector_field: str = "embedding",
+    ) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """
+        Lays out chunk rows as index arrays.
+
+        Args:
+            rows (Sequence[Dict[str, Any]]): Chunks with `id`, `content`, `restaurant` and a vector.
+            dtype (str): "float16" or "float32" storage for the vectors.
+            nlist (int): IVF lists to train; 0 for exact search only.
+            vector_field (str): Key of the vector in each row.
+
+        Returns:
+            Tuple[Dict[str, np.ndarray], Dict[str, Any]]: Arrays and metadata for `save_arrays`.
+        """
+        matrix = np.asarray([row[vector_field] for row in rows], dtype=np.float32)
+        return LocalVectorStore.build_column_arrays(
+            [row["id"] for row in rows],
+            [row.get("content") or "" for row in rows],
+            [row.get("restaurant") or "" for row in rows],
+            matrix.reshape(len(rows), -1),
+            dtype,
+            nlist,
+        )
+
+    @staticmethod
+    def build_column_arrays(
+        ids: Sequence[int],
+        contents: Sequence[str],
+        restaurants: Sequence[str],
+        matrix: np.ndarray,
+        dtype: str = VECTOR_INDEX_DTYPE,
+        nlist: int = VECTOR_INDEX_NLIST,
+    ) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """
+        Column-wise `build_arrays`: chunk ids, contents and restaurants as parallel
+        sequences and the vectors as one (rows x dim) matrix.
+
+        Returns:
+            Tuple[Dict[str, np.ndarray], Dict[str, Any]]: Arrays and metadata for `save_arrays`.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        sources = sorted(set(restaurants))
+        source_ids = {source: i for i, source in enumerate(sources)}
+        unsorted_rids = np.array([source_ids[source] for source in restaurants], dtype=np.int32)
+        order = np.lexsort((ids, unsorted_rids))
+        restaurant_ids = unsorted_rids[order]
+        matrix = np.asarray(matrix, dtype=np.float32)[order] if len(order) else np.zeros((0, 0), dtype=np.float32)
+        content_offsets, content = encode_strings([contents[i] for i in order.tolist()])
+        arrays = {
+            "embeddings": matrix.astype(dtype),
+            "ids": ids[order],
+            "restaurant_ids": restaurant_ids,
+            "restaurants": fixed_width(sources),
+            "restaurant_offsets": np.searchsorted(restaurant_ids, np.arange(len(sources) + 1)).astype(np.int64),
+            "content_offsets": content_offsets,
+            "content": content,
+        }
+        nlist = min(nlist, len(order))
+        if nlist:
+            centroids, assignments = _train_ivf(matrix, nlist)
+            arrays["centroids"] = centroids
+            arrays["list_rows"] = np.argsort(assignments, kind="stable").astype(np.int32)
+            arrays["list_offsets"] = np.searchsorted(assignments[arrays["list_rows"]], np.arange(nlist + 1)).astype(np.int64)
+        meta = {"version": FORMAT_VERSION, "rows": len(order), "dim": int(matrix.shape[1]), "dtype": dtype, "nlist": nlist}
+        return arrays, meta
+
+    @property
+    def num_entities(self) -> int:
+        return len(self.ids)
+
+    def load(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+    def content_of(self, row: int) -> str:
+        return decode_string(self.content_offsets, self.content, row)
+
+    def _entity(self, row: int, output_fields: Sequence[str]) -> Dict[str, Any]:
+        entity = {}
+        for field in output_fields:
+            if field == "content":
+                entity[field] = self.content_of(row)
+            elif field == "restaurant":
+                entity[field] = self.restaurants[self.restaurant_ids[row]].decode("utf-8")
+            elif field == "id":
+                entity[field] = int(self.ids[row])
+        return entity
+
+    def _row_range(self, expr: Optional[str]) -> Optional[Tuple[int, int]]:
+        """Resolves a filter expression to the rows it selects; only `restaurant == "<source>"` is supported."""
+        if not expr:
+            return 0, self.num_entities
+        match = RESTAURANT_EXPR.match(expr)
+        if match is None:
+            raise ValueError(f"Unsupported filter expression for the local vector index: {expr}")
+        rid = self._restaurant_ids_by_source.get(re.sub(r"\\(.)", r"\1", match.group(1)))
+        if rid is None:
+            return None
+        return int(self.restaurant_offsets[rid]), int(self.restaurant_offsets[rid + 1])
+
+    def _score_rows(self, queries: np.ndarray, start: int, end: int) -> np.ndarray:
+        """Inner products of `queries` with rows [start, end), converting stored vectors blockwise when needed."""
+        if self.embeddings.dtype == np.float32:
+            return queries @ self.embeddings[start:end].T
+        scores = np.empty((len(queries), end - start), dtype=np.float32)
+        for block in range(start, end, SCORE_BLOCK_ROWS):
+            stop = min(block + SCORE_BLOCK_ROWS, end)
+            scores[:, block - start:stop - start] = queries @ self.embeddings[block:stop].astype(np.float32).T
+        return scores
+
+    def _candidate_rows(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        list_scores = self.centroids @ query
+        probes = np.argpartition(-list_scores, min(nprobe, len(list_scores)) - 1)[:nprobe]
+        return np.sort(np.concatenate([
+            self.list_rows[int(self.list_offsets[p]):int(self.list_offsets[p + 1])] for p in probes
+        ]))
+
+    def search(self, data, anns_field="embedding", param=None, limit=10, output_fields=None, expr=None, partition_names=None, **kwargs):
+        """
+        Top-`limit` inner-product search for each query vector.
+
+        Filtered searches scan the filter's rows exactly; unfiltered searches
+        probe `param["params"]["nprobe"]` IVF lists when the index has them.
+
+        Returns:
+            List[List[InMemoryHit]]: Hits per query vector, best first.
+        """
+        self.search_calls += 1
+        output_fields = list(output_fields or [])
+        queries = np.asarray(data, dtype=np.float32).reshape(len(data), -1)
+        row_range = self._row_range(expr)
+        if row_range is None or row_range[0] == row_range[1]:
+            return [[] for _ in data]
+
+        nprobe = int(((param or {}).get("params") or {}).get("nprobe", 10))
+        results = []
+        if self.meta.get("nlist") and not expr:
+            for query in queries:
+                candidates = self._candidate_rows(query, nprobe)
+                scores = self.embeddings[candidates].astype(np.float32) @ query
+                results.append(self._top_hits(scores, candidates, limit, output_fields))
+            return results
+
+        start, end = row_range
+        rows = np.arange(start, end)
+        for scores in self._score_rows(queries, start, end):
+            results.append(self._top_hits(scores, rows, limit, output_fields))
+        return results
+
+    def _top_hits(self, scores: np.ndarray, rows: np.ndarray, limit: int, output_fields: Sequence[str]) -> List[InMemoryHit]:
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            InMemoryHit(int(self.ids[rows[i]]), float(scores[i]), self._entity(int(rows[i]), output_fields))
+            for i in top.tolist()
+        ]
+
+    def query(self, expr: str = "", output_fields: Optional[Sequence[str]] = None, **kwargs) -> List[Dict[str, Any]]:
+        """Returns the rows matching `expr` (every row when empty) with `output_fields` (id, content, restaurant)."""
+        row_range = self._row_range(expr)
+        if row_range is None:
+            return []
+        fields = list(output_fields or ("id", "content", "restaurant"))
+        return [self._entity(row, fields) for row in range(*row_range)]
+
+
+class LocalVectorWriter:
+    """
+    Collection that `ingest.ingest` writes to for the local vector backend.
+
+    Starts from the rows of the existing index (or empty with `rebuild`) and
+    buffers upserts and deletes column-wise: ids in an `array`, vectors in
+    NumPy batches, replaced and deleted rows marked dead by position. The
+    index directory (and IVF lists) is built once, on `flush`. Because nothing
+    persists before then, `ingest` saves its manifest only after that flush
+    (see `buffers_writes`), so the manifest never records a restaurant the
+    index does not hold.
+    """
+
+    buffers_writes = True
+
+    def __init__(
+        self,
+        directory: str = VECTOR_INDEX_DIR,
+        dtype: str = VECTOR_INDEX_DTYPE,
+        nlist: int = VECTOR_INDEX_NLIST,
+        rebuild: bool = False,
+        vector_field: str = "embedding",
+    ):
+        self.name = "knowledge_base"
+        self.directory = directory
+        self.dtype = dtype
+        self.nlist = nlist
+        self.vector_field = vector_field
+        self._ids = array("q")
+        self._contents: List[str] = []
+        self._restaurants: List[str] = []
+        self._vectors: List[np.ndarray] = []
+        self._alive = bytearray()
+        self._row_of: Dict[int, int] = {}
+        self._dirty = rebuild
+        if exists(directory) and not rebuild:
+            store = LocalVectorStore.open(directory, mmap=False)
+            names = [source.decode("utf-8") for source in store.restaurants.tolist()]
+            self._append(
+                store.ids.tolist(),
+                [store.content_of(row) for row in range(store.num_entities)],
+                [names[rid] for rid in store.restaurant_ids.tolist()],
+                store.embeddings.astype(np.float32),
+            )
+            # A new storage type or IVF size rewrites the index even when no chunk changed.
+            self._dirty = (store.meta.get("dtype"), store.meta.get("nlist")) != (dtype, min(nlist, store.num_entities))
+
+    @property
+    def num_entities(self) -> int:
+        return len(self._row_of)
+
+    def _append(self, ids: Sequence[int], contents: Sequence[str], restaurants: Sequence[str], vectors: np.ndarray) -> None:
+        for chunk_id in ids:
+            previous = self._row_of.get(chunk_id)
+            if previous is not None:
+                self._alive[previous] = 0
+            self._row_of[chunk_id] = len(self._ids)
+            self._ids.append(chunk_id)
+            self._alive.append(1)
+        self._contents.extend(contents)
+        self._restaurants.extend(restaurants)
+        self._vectors.append(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1))
+
+    def upsert(self, rows: List[Dict[str, Any]], partition_name: Optional[str] = None) -> None:
+        """Adds rows, replacing any stored rows with the same ids."""
+        if not rows:
+            return
+        self._append(
+            [row["id"] for row in rows],
+            [row.get("content") or "" for row in rows],
+            [row.get("restaurant") or "" for row in rows],
+            np.asarray([row[self.vector_field] for row in rows], dtype=np.float32),
+        )
+        self._dirty = True
+
+    insert = upsert
+
+    def delete(self, expr: str, partition_name: Optional[str] = None) -> None:
+        """Deletes the rows matching `expr`; `id in [...]` is resolved without a scan."""
+        match = ID_IN_EXPR.match(expr)
+        if match:
+            doomed = [self._row_of.get(int(value)) for value in json.loads(match.group(1))]
+        else:
+            doomed = [row for row in self._row_of.values() if matches_expr(expr, self._row(row))]
+        for row in doomed:
+            if row is not None and self._alive[row]:
+                self._alive[row] = 0
+                del self._row_of[self._ids[row]]
+                self._dirty = True
+
+    def query(self, expr: str = "", output_fields: Optional[Sequence[str]] = None, **kwargs) -> List[Dict[str, Any]]:
+        """Returns the live rows matching `expr` (every row when empty) with `output_fields` (id, content, restaurant)."""
+        fields = list(output_fields or ("id", "content", "restaurant"))
+        rows = (self._row(row) for row in sorted(self._row_of.values()))
+        return [{field: row.get(field) for field in fields} for row in rows if not expr or matches_expr(expr, row)]
+
+    def _row(self, row: int) -> Dict[str, Any]:
+        return {"id": self._ids[row], "content": self._contents[row], "restaurant": self._restaurants[row]}
+
+    def load(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        """Builds and writes the index directory if anything changed since the last flush."""
+        if not self._dirty and exists(self.directory):
+            return
+        live = np.flatnonzero(np.frombuffer(bytes(self._alive), dtype=np.uint8)).tolist()
+        ids = [self._ids[row] for row in live]
+        contents = [self._contents[row] for row in live]
+        restaurants = [self._restaurants[row] for row in live]
+        matrix = np.concatenate(self._vectors)[live] if live else np.zeros((0, 0), dtype=np.float32)
+        arrays, meta = LocalVectorStore.build_column_arrays(ids, contents, restaurants, matrix, self.dtype, self.nlist)
+        save_arrays(self.directory, arrays, meta)
+        # Compact the buffers so replaced and deleted rows are not carried into the next flush.
+        self._ids, self._contents, self._restaurants = array("q"), [], []
+        self._vectors, self._alive, self._row_of = [], bytearray(), {}
+        if live:
+            self._append(ids, contents, restaurants, matrix)
+        self._dirty = False
+
+
+def _train_ivf(matrix: np.ndarray, nlist: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means over normalized vectors.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (nlist x dim) unit centroids and each row's list.
+    """
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), nlist, replace=False)].copy()
+    assignments = np.zeros(len(matrix), dtype=np.int64)
+    for _ in range(iterations):
+        assignments = np.argmax(matrix @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, matrix)
+        norms = np.linalg.norm(sums, axis=1)
+        # Lists that lost all their rows keep their previous centroid.
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, None]
+    return centroids.astype(np.float32), assignments
@@ -0,0 +1,42 @@
+from context import ContextPacker
+from menu_index import MenuIndex
+
+
+def packer(budget_tokens: int) -> ContextPacker:
+    index = MenuIndex()
+    for i, name in enumerate(["Punjab Grill", "Royal Cafe"]):
+        index.add_restaurant(f"source_{i}", {"restaurant": {"name": name}, "menu": {"hasMenuItem": []}})
+    return ContextPacker(index, budget_tokens=budget_tokens)
+
+
+def excerpts(prefix: str, count: int, words: int = 40):
+    return [
+        {"id": f"{prefix}{i}", "score": 1.0 - i / 10, "content": " ".join(f"{prefix}{i}w{j}" for j in range(words))}
+        for i in range(count)
+    ]
+
+
+def test_each_call_keeps_results_within_its_own_budget():
+    first, second = excerpts("a", 3), excerpts("b", 3)
+
+    text, counts = packer(budget_tokens=120).pack([], [first, second])
+
+    assert "a0w0" in text and "b0w0" in text
+    assert counts["packed"] == 4
+    assert counts["over_budget"] == 2
+    assert text.endswith("(2 further results omitted to fit the context budget.)")
+
+
+def test_best_chunk_is_kept_even_over_budget():
+    text, counts = packer(budget_tokens=10).pack(["menu_query answer"], [excerpts("a", 2), excerpts("b", 2)])
+
+    assert text.startswith("menu_query answer")
+    assert "a0w0" in text and "b0w0" in text
+    assert counts["over_budget"] == 2
+
+
+def test_nothing_omitted_means_no_note():
+    text, counts = packer(budget_tokens=1000).pack([], [excerpts("a", 2)])
+
+    assert counts["over_budget"] == 0
+    assert "omitted" not in text
@@ -0,0 +1,55 @@
+import json
+import os
+
+import numpy as np
+
+import ingest
+from lexical import ARRAY_NAMES
+
+
+def write_restaurant(data_dir, name, dishes):
+    folder = os.path.join(data_dir, name)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, "structured_data.json"), "w", encoding="utf-8") as f:
+        json.dump({"restaurant": {"name": name}, "menu": {"hasMenuItem": [{"name": dish} for dish in dishes]}}, f)
+
+
+def manifest_ids(index):
+    return {source: [row["id"] for row in rows] for source, rows in index.chunks().items()}
+
+
+def test_lexical_rebuild_parses_only_changed_restaurants(tmp_path, monkeypatch):
+    data_dir = str(tmp_path)
+    for name in ("alpha", "beta", "gamma"):
+        write_restaurant(data_dir, name, [f"{name} curry", f"{name} naan"])
+    previous = ingest.build_lexical_index(data_dir, workers=1)
+    expected_ids = manifest_ids(previous)
+
+    write_restaurant(data_dir, "beta", ["saffron kulfi"])
+    _, beta_chunks = ingest.parse_restaurant(os.path.join(data_dir, "beta"))
+    expected_ids["beta"] = [ingest.chunk_id("beta", i, chunk["content"]) for i, chunk in enumerate(beta_chunks)]
+    parses = []
+    real_parse = ingest.parse_restaurant
+    monkeypatch.setattr(ingest, "parse_restaurant", lambda path: parses.append(path) or real_parse(path))
+
+    rebuilt = ingest.build_lexical_index(data_dir, 1, {"beta": beta_chunks}, previous, expected_ids)
+
+    assert parses == []
+    scratch = ingest.build_lexical_index(data_dir, workers=1)
+    assert all(np.array_equal(getattr(rebuilt, name), getattr(scratch, name)) for name in ARRAY_NAMES)
+    assert rebuilt.search("saffron kulfi", limit=1)[0]["restaurant"] == "beta"
+
+
+def test_restaurants_out_of_step_with_the_manifest_are_parsed_again(tmp_path, monkeypatch):
+    data_dir = str(tmp_path)
+    for name in ("alpha", "beta"):
+        write_restaurant(data_dir, name, [f"{name} curry"])
+    previous = ingest.build_lexical_index(data_dir, workers=1)
+    expected_ids = {**manifest_ids(previous), "alpha": [1, 2]}
+    parses = []
+    real_parse = ingest.parse_restaurant
+    monkeypatch.setattr(ingest, "parse_restaurant", lambda path: parses.append(os.path.basename(path)) or real_parse(path))
+
+    ingest.build_lexical_index(data_dir, 1, None, previous, expected_ids)
+
+    assert parses == ["alpha"]
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from benchmark import StubChatModel, StubLLMError
+from llm_client import LLMClient, LLMOverloaded, LLMUnavailable
+
+MESSAGES = [HumanMessage(content="What is on the menu at Punjab Grill?")]
+
+
+class SlowFirstCall(StubChatModel):
+    """Stub whose first call hangs past any sensible timeout; later calls answer at once."""
+
+    def __init__(self, hang_seconds: float = 1.0):
+        super().__init__()
+        self.hang_seconds = hang_seconds
+        self.calls = 0
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            await asyncio.sleep(self.hang_seconds)
+        return await super().ainvoke(messages, *args, **kwargs)
+
+
+def client(primary, **kwargs) -> LLMClient:
+    kwargs.setdefault("fallback_concurrency", 0)
+    kwargs.setdefault("retry_base", 0.001)
+    kwargs.setdefault("retry_max", 0.01)
+    return LLMClient(primary, **kwargs)
+
+
+def test_full_queue_is_refused_with_retry_after():
+    async def scenario():
+        llm = client(StubChatModel(latency_ms=100), max_concurrency=1, max_queue=1)
+        running = asyncio.ensure_future(llm.ainvoke(MESSAGES))
+        queued = asyncio.ensure_future(llm.ainvoke(MESSAGES))
+        await asyncio.sleep(0.01)
+        with pytest.raises(LLMOverloaded) as refused:
+            await llm.ainvoke(MESSAGES)
+        with pytest.raises(LLMOverloaded):
+            llm.check_admission()
+        await asyncio.gather(running, queued)
+        return llm, refused.value
+
+    llm, error = asyncio.run(scenario())
+    assert error.retry_after >= 1
+    assert llm.stats()["counts"]["rejected"] == 2
+    assert llm.stats()["queued"] == 0
+
+
+def test_timeout_is_retried():
+    model = SlowFirstCall()
+    llm = client(model, timeout=0.05, max_retries=1)
+
+    response = asyncio.run(llm.ainvoke(MESSAGES))
+
+    assert response.content
+    assert model.calls == 2
+    assert llm.stats()["counts"]["retries"] == 1
+
+
+def test_persistent_errors_raise_unavailable_after_retries():
+    llm = client(StubChatModel(error_rate=1.0), max_retries=2)
+
+    with pytest.raises(LLMUnavailable) as error:
+        asyncio.run(llm.ainvoke(MESSAGES))
+
+    assert isinstance(error.value.__cause__, StubLLMError)
+    assert error.value.retry_after >= 1
+    assert llm.stats()["counts"]["retries"] == 3
+
+
+def test_saturated_primary_overflows_to_fallback():
+    primary, fallback = StubChatModel(latency_ms=50), StubChatModel(latency_ms=50)
+    llm = client(primary, fallback=lambda: fallback, max_concurrency=1, fallback_concurrency=1)
+
+    async def scenario():
+        return await asyncio.gather(llm.ainvoke(MESSAGES), llm.ainvoke(MESSAGES))
+
+    responses = asyncio.run(scenario())
+
+    counts = llm.stats()["counts"]
+    assert all(response.content for response in responses)
+    assert counts["admitted"] == 1
+    assert counts["fallback_saturated"] == 1
+    assert counts.get("queued", 0) == 0
+
+
+def test_failing_primary_falls_back_once():
+    llm = client(StubChatModel(error_rate=1.0), fallback=lambda: StubChatModel(), max_retries=1, fallback_concurrency=1)
+
+    response = asyncio.run(llm.ainvoke(MESSAGES))
+
+    assert response.content
+    assert llm.stats()["counts"]["fallback_error"] == 1
+
+
+def test_release_hands_the_slot_to_the_next_waiter():
+    async def scenario():
+        llm = client(StubChatModel(), max_concurrency=1, max_queue=4)
+        pool = await llm._acquire()
+        waiter = asyncio.ensure_future(llm._acquire())
+        await asyncio.sleep(0)
+        assert llm.stats()["queued"] == 1
+
+        llm._release(pool)
+        handed = await waiter
+        # The slot moved to the waiter without ever being free.
+        assert handed is pool
+        assert pool.running == 1
+        llm._release(handed)
+        return llm
+
+    llm = asyncio.run(scenario())
+    assert llm.stats()["running"] == {"primary": 0}
+    assert llm.stats()["queued"] == 0
+
+
+def test_queued_calls_all_complete():
+    async def scenario():
+        llm = client(StubChatModel(latency_ms=20), max_concurrency=1, max_queue=4)
+        return llm, await asyncio.gather(*(llm.ainvoke(MESSAGES) for _ in range(3)))
+
+    llm, responses = asyncio.run(scenario())
+
+    assert len(responses) == 3
+    assert llm.stats()["counts"]["queued"] == 2
+    assert llm.stats()["running"] == {"primary": 0}
@@ -0,0 +1,40 @@
+import pytest
+
+from menu_index import MenuIndex
+
+NAMES = ["Barkaas Indo Arabic Restaurant", "Punjab Grill", "Royal Cafe - Royal Inn", "Kake Da Hotel"]
+
+
+@pytest.fixture(scope="module")
+def index() -> MenuIndex:
+    index = MenuIndex()
+    for i, name in enumerate(NAMES):
+        items = [{"name": dish, "price": 100 + 10 * i} for dish in ("Butter Chicken", f"House Special {i}")]
+        index.add_restaurant(f"source_{i}", {"restaurant": {"name": name}, "menu": {"hasMenuItem": items}})
+    return index
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Punjab Grill", 1),
+    ("what is on the menu at royal cafe", 2),
+    ("Barakaas prices", 0),   # misspelled
+    ("punjb grill", 1),
+    ("the restaurant", None),  # generic words only
+    ("zzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzzz", None),
+])
+def test_resolve_restaurant(index, text, expected):
+    assert index.resolve_restaurant(text) == expected
+
+
+def test_find_restaurants_lists_every_mention(index):
+    assert index.find_restaurants("compare barkaas and kake da hotel") == [0, 3]
+    assert index.find_restaurants("compare barakaas and punjab") == [0, 1]
+    assert index.find_restaurants("punj menu") == []  # fuzzy matches need five characters
+    assert index.find_restaurants("hello there") == []
+
+
+def test_mentioned_items_across_and_within_restaurants(index):
+    everywhere = index.mentioned_items("how much is the BUTTER CHICKEN?")
+    assert [index.restaurant_col[row] for row in everywhere] == [0, 1, 2, 3]
+    assert index.mentioned_items("Butter Chicken and house special 2", restaurant=2) == [4, 5]
+    assert index.mentioned_items("house special 2", restaurant=1) == []
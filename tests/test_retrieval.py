@@ -0,0 +1,110 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from retrieval import InMemoryCollection, MilvusSearchBatcher
+
+
+def collection_with_basis(dim: int = 4) -> InMemoryCollection:
+    collection = InMemoryCollection()
+    collection.insert([
+        {"id": i + 1, "content": f"chunk {i}", "restaurant": f"r{i % 2}", "embedding": np.eye(dim)[i].tolist()}
+        for i in range(dim)
+    ])
+    return collection
+
+
+def test_concurrent_searches_share_one_round_trip():
+    collection = collection_with_basis()
+    batcher = MilvusSearchBatcher(collection, max_wait_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.search(np.eye(4)[i], limit=1) for i in range(3)))
+
+    results = asyncio.run(scenario())
+
+    assert collection.search_calls == 1
+    assert [hits[0]["id"] for hits in results] == [1, 2, 3]
+    assert [hits[0]["content"] for hits in results] == ["chunk 0", "chunk 1", "chunk 2"]
+    assert batcher.stats()["vectors_per_round_trip"] == 3
+    assert not batcher._tasks
+
+
+def test_searches_with_different_settings_are_not_merged():
+    collection = collection_with_basis()
+    batcher = MilvusSearchBatcher(collection, max_wait_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(
+            batcher.search(np.eye(4)[0], limit=1),
+            batcher.search(np.eye(4)[1], limit=2, expr='restaurant == "r1"'),
+        )
+
+    unfiltered, filtered = asyncio.run(scenario())
+
+    assert collection.search_calls == 2
+    assert [hit["id"] for hit in unfiltered] == [1]
+    assert {hit["id"] for hit in filtered} == {2, 4}
+
+
+def test_full_batch_is_sent_without_waiting():
+    collection = collection_with_basis()
+    batcher = MilvusSearchBatcher(collection, max_batch_size=2, max_wait_ms=10_000)
+
+    async def scenario():
+        return await asyncio.wait_for(
+            asyncio.gather(batcher.search(np.eye(4)[0], limit=1), batcher.search(np.eye(4)[3], limit=1)),
+            timeout=1,
+        )
+
+    results = asyncio.run(scenario())
+
+    assert [hits[0]["id"] for hits in results] == [1, 4]
+
+
+def test_search_errors_reach_every_caller():
+    class Broken(InMemoryCollection):
+        def search(self, *args, **kwargs):
+            raise ConnectionError("milvus down")
+
+    batcher = MilvusSearchBatcher(Broken(), max_wait_ms=5)
+
+    async def scenario():
+        return await asyncio.gather(
+            batcher.search(np.eye(4)[0]), batcher.search(np.eye(4)[1]), return_exceptions=True,
+        )
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(result, ConnectionError) for result in results)
+
+
+def test_schema_fields_are_read_once():
+    class Field:
+        def __init__(self, name):
+            self.name = name
+
+    class LegacyCollection(InMemoryCollection):
+        schema = type("Schema", (), {"fields": [Field("id"), Field("content"), Field("embedding")]})()
+
+    assert not MilvusSearchBatcher(LegacyCollection()).has_field("restaurant")
+    assert MilvusSearchBatcher(LegacyCollection()).has_field("content")
+    assert MilvusSearchBatcher(InMemoryCollection()).has_field("restaurant")
+
+
+def test_upsert_replaces_rows_by_id():
+    collection = collection_with_basis()
+    collection.upsert([{"id": 1, "content": "new chunk", "restaurant": "r0", "embedding": np.eye(4)[1].tolist()}])
+    collection.delete("id in [3]")
+
+    hits = collection.search([np.eye(4)[1]], "embedding", limit=4, output_fields=["content"])[0]
+
+    assert collection.num_entities == 3
+    assert {hit.id for hit in hits} == {1, 2, 4}
+    assert collection.query('id in [1]', output_fields=["content"]) == [{"content": "new chunk"}]
+
+
+@pytest.mark.parametrize("expr, expected", [('restaurant == "r0"', {1, 3}), ("id in [2, 4]", {2, 4})])
+def test_query_filters(expr, expected):
+    assert {row["id"] for row in collection_with_basis().query(expr, output_fields=["id"])} == expected
@@ -0,0 +1,51 @@
+import asyncio
+
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+
+from sessions import SessionManager
+from sqlite_checkpointer import BoundedSqliteSaver
+
+
+async def put_checkpoints(saver, thread_id, count):
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    checkpoint = empty_checkpoint()
+    for step in range(count):
+        checkpoint = create_checkpoint(checkpoint, None, step)
+        config = await saver.aput(config, checkpoint, {"step": step}, {})
+        await saver.aput_writes(config, [("messages", step)], task_id=f"task-{step}")
+
+
+async def stored_rows(saver, table, thread_id):
+    async with saver.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (thread_id,)) as cursor:
+        return (await cursor.fetchone())[0]
+
+
+def test_sqlite_saver_keeps_newest_checkpoints(tmp_path):
+    async def scenario():
+        async with BoundedSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.sqlite")) as saver:
+            saver.max_checkpoints = 3
+            await put_checkpoints(saver, "a", 6)
+            latest = await saver.aget_tuple({"configurable": {"thread_id": "a"}})
+            return await stored_rows(saver, "checkpoints", "a"), await stored_rows(saver, "writes", "a"), latest
+
+    checkpoints, writes, latest = asyncio.run(scenario())
+    assert (checkpoints, writes) == (3, 3)
+    assert latest.metadata["step"] == 5
+
+
+def test_attach_tracks_and_evicts_stored_sessions(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+
+    async def scenario(max_sessions, idle_ttl_seconds):
+        async with BoundedSqliteSaver.from_conn_string(path) as saver:
+            for thread_id in ("old", "new"):
+                await put_checkpoints(saver, thread_id, 1)
+        # A restarted server reopens the database with an empty session manager.
+        async with BoundedSqliteSaver.from_conn_string(path) as saver:
+            sessions = SessionManager(None, max_sessions=max_sessions, idle_ttl_seconds=idle_ttl_seconds)
+            await sessions.attach(saver)
+            return list(sessions._last_seen), sorted(await saver.athread_activity())
+
+    assert asyncio.run(scenario(max_sessions=10, idle_ttl_seconds=3600)) == (["old", "new"], ["new", "old"])
+    assert asyncio.run(scenario(max_sessions=1, idle_ttl_seconds=3600)) == (["new"], ["new"])
+    assert asyncio.run(scenario(max_sessions=10, idle_ttl_seconds=-1)) == ([], [])
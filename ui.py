@@ -1,3 +1,5 @@
+import json
+
 import streamlit as st
 import requests
 
@@ -6,10 +8,21 @@ st.set_page_config(page_title="AI Knowledge Base Chatbot 🤖", layout="wide")
 
 # Connect to your new Flask/FastAPI server
 SERVER_URL = "http://localhost:8000/agent"
+STREAM_URL = "http://localhost:8000/agent/stream"
+
+NODE_LABELS = {
+    "route_query": "Reading your question...",
+    "chatbot": "Understanding your question...",
+    "call_db": "Searching the knowledge base...",
+    "menu_query": "Looking up the menu...",
+    "generate_response": "Writing the answer...",
+}
 
 # Session state to store messages
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None
 
 st.title("AI Knowledge Base Chatbot 🤖")
 
@@ -38,22 +51,41 @@ for message in st.session_state.messages:
 
 # Chat input
 if prompt := st.chat_input("Ask your question..."):
-    # Store user message
+    # Store and show the user message right away
     st.session_state.messages.append({"role": "user", "content": prompt})
+    with st.chat_message("user"):
+        st.markdown(prompt, unsafe_allow_html=True)
 
-    # Call your new server
-    with st.spinner("Thinking..."):
+    # Stream the answer from the server, rendering tokens as they arrive
+    with st.chat_message("assistant"):
+        status = st.empty()
+        placeholder = st.empty()
+        bot_response = ""
         try:
             # Notice we wrap the prompt in a list here []
-            response = requests.post(SERVER_URL, json={"query": [prompt]})
-            print("response ",response)
-            response.raise_for_status()
-            bot_response = response.json()
+            payload = {"query": [prompt], "session_id": st.session_state.session_id}
+            with requests.post(STREAM_URL, json=payload, stream=True) as response:
+                response.raise_for_status()
+                st.session_state.session_id = response.headers.get("X-Session-ID", st.session_state.session_id)
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    if event["type"] == "node_start":
+                        status.caption(NODE_LABELS.get(event["node"], event["node"]))
+                    elif event["type"] == "reset":
+                        bot_response = ""
+                    elif event["type"] == "token":
+                        bot_response += event["content"]
+                        placeholder.markdown(bot_response + "▌", unsafe_allow_html=True)
+                    elif event["type"] == "done":
+                        bot_response = event["content"] or bot_response
+                    elif event["type"] == "error":
+                        bot_response = f"Error: {event['detail']}"
         except Exception as e:
             bot_response = f"Error: {e}"
+        status.empty()
+        placeholder.markdown(bot_response, unsafe_allow_html=True)
 
     # Store assistant message
     st.session_state.messages.append({"role": "assistant", "content": bot_response})
-
-    # Refresh page to show messages immediately
-    st.rerun()